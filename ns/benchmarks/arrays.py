@@ -0,0 +1,62 @@
+# Native array builtins (maiin/arrays.py) against a script function called
+# once per element. Both apply the same function to n numbers and add the
+# results up: the script through n calls written out in the source, the
+# builtins through array.map and array.reduce over an array literal, with
+# the scope of every call reused and made anew. Parsing is not timed.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.arrays [--sizes 1000,10000] [--repeat 3]
+import argparse
+
+from src.parser_1 import Parser
+from maiin.arrays import set_frame_reuse
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program
+from maiin.vm.machine import run_program
+from benchmarks.common import best_of, run_slots
+
+SCORE = "fn score(x) {\n    x * 3 / 4 + x % 7 - 2\n}\nfn add(acc, x) {\n    acc + x\n}"
+
+
+def scalar_source(n: int) -> str:
+    calls = "\n".join(f"    sum = sum + score({i})" for i in range(n))
+    return f"{SCORE}\nlet sum = 0;\nfn total() {{\n{calls}\n}}\ntotal()"
+
+
+def array_source(n: int) -> str:
+    items = ", ".join(str(i) for i in range(n))
+    return f"{SCORE}\nlet xs = [{items}];\narray.reduce(array.map(xs, score), add, 0)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Array builtins against one call per element")
+    parser.add_argument("--sizes", default="1000,10000", help="comma separated input sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    backends = (
+        ("tree", evaluate),
+        ("closure", lambda program, env: compile_program(program)(env)),
+        ("slots", run_slots),
+        ("vm", run_program),
+    )
+
+    for n in (int(size) for size in args.sizes.split(",")):
+        print(f"{n} inputs")
+        scalar = Parser().produceAST(scalar_source(n))
+        mapped = Parser().produceAST(array_source(n))
+        for name, run in backends:
+            results = [("per element", best_of(args.repeat, lambda: run(scalar, createGlobalEnv())))]
+            for case, enabled in (("map new scope", False), ("map reused", True)):
+                set_frame_reuse(enabled)
+                results.append((case, best_of(args.repeat, lambda: run(mapped, createGlobalEnv()))))
+            set_frame_reuse(True)
+
+            baseline = results[0][1]
+            for case, elapsed in results:
+                print(f"  {name:<8} {case:<13} {elapsed * 1000:10.2f} ms  x{baseline / elapsed:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
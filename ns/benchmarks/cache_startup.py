@@ -0,0 +1,91 @@
+# Startup cost of a script with a cold and a warm program cache: cold runs
+# tokenize, parse (optionally optimize and resolve) and write the cache
+# file, warm runs only read it back.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.cache_startup [--functions 2000] [--repeat 5] [--optimize] [--resolve]
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from src.parser_1 import Parser
+from src.cache import ProgramCache
+from src.optimizer import Optimizer
+from maiin.environment import createGlobalEnv
+from maiin.resolver import resolve_program
+from benchmarks.common import suffix
+
+
+def make_source(functions: int) -> str:
+    lines = ["const rate = 3;"]
+    for i in range(functions):
+        name = "calc" + suffix(i)
+        lines.append(f"fn {name}(a, b) {{")
+        lines.append(f"    let x = a * {i % 7 + 1} + b * rate - {i % 5};")
+        lines.append("    let y = { total: x, ratio: x / 2, scaled: (x + 1) * 60 * 60 };")
+        lines.append("    x * 2 + 24 * 60")
+        lines.append("}")
+        lines.append(f"let r{suffix(i)} = {name}({i % 13}, {i % 3 + 1});")
+    return "\n".join(lines)
+
+
+def prepare(filename: str, source: str, cache: ProgramCache, stages: list):
+    env = createGlobalEnv()
+    context = list(env.variables) if stages else []
+    program = cache.load(filename, source, stages, context)
+    if program is None:
+        program = Parser().produceAST(source)
+        if "optimize" in stages:
+            Optimizer(builtins=env.variables).optimize(program)
+        if "resolve" in stages:
+            resolve_program(program, env)
+        cache.store(filename, source, program, stages, context)
+    return program
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold vs warm program cache startup")
+    parser.add_argument("--functions", type=int, default=2000, help="function declarations in the script")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, best is reported")
+    parser.add_argument("--optimize", action="store_true", help="cache the optimized program")
+    parser.add_argument("--resolve", action="store_true", help="cache the resolved program")
+    args = parser.parse_args()
+
+    stages = []
+    if args.optimize:
+        stages.append("optimize")
+    if args.resolve:
+        stages.append("resolve")
+
+    source = make_source(args.functions)
+    directory = tempfile.mkdtemp(prefix="nscache-bench-")
+    filename = os.path.join(directory, "script.ns")
+    try:
+        cold = warm = float("inf")
+        for _ in range(args.repeat):
+            cache = ProgramCache(os.path.join(directory, "cache"))
+            shutil.rmtree(cache.directory, ignore_errors=True)
+
+            start = time.perf_counter()
+            prepare(filename, source, cache, stages)
+            cold = min(cold, time.perf_counter() - start)
+
+            start = time.perf_counter()
+            prepare(filename, source, cache, stages)
+            warm = min(warm, time.perf_counter() - start)
+            assert cache.hits == 1, "warm run missed the cache"
+
+        size = os.path.getsize(cache.path(filename, tuple(stages)))
+    finally:
+        shutil.rmtree(directory)
+
+    print(f"source:     {len(source) / 1024:.1f} KiB, stages: {', '.join(stages) or 'parse only'}")
+    print(f"cache file: {size / 1024:.1f} KiB")
+    print(f"cold:       {cold * 1000:.2f} ms")
+    print(f"warm:       {warm * 1000:.2f} ms ({cold / warm:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
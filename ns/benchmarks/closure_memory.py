@@ -0,0 +1,82 @@
+# Memory retained by closures with and without capture analysis
+# (maiin/captures.py). Every call walks down a chain of nested functions
+# whose scopes each hold a large object, and returns the innermost closure,
+# which only reads a parameter of the outermost function. The program keeps
+# all the closures it got.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.closure_memory [--depth 20] [--width 50] [--closures 200] [--repeat 3]
+import argparse
+import gc
+import time
+import tracemalloc
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program
+from maiin.captures import analyze_captures
+from benchmarks.common import suffix
+
+
+def make_source(depth: int, width: int, closures: int) -> str:
+    big = "{ " + ", ".join(f"p{suffix(i)}: {i}" for i in range(width)) + " }"
+    lines = []
+    for level in range(depth):
+        indent = "    " * level
+        lines.append(f"{indent}fn level{suffix(level)}(arg{suffix(level)}) {{")
+        lines.append(f"{indent}    let big = {big};")
+    indent = "    " * depth
+    lines.append(f"{indent}fn leaf(n) {{ n + arga }}")
+    lines.append(f"{indent}leaf")
+    for level in reversed(range(depth)):
+        if level + 1 < depth:
+            lines.append("    " * (level + 1) + f"level{suffix(level + 1)}(arg{suffix(level)} + 1)")
+        lines.append("    " * level + "}")
+    kept = ", ".join(f"c{suffix(i)}: level{suffix(0)}({i})" for i in range(closures))
+    lines.append(f"let kept = {{ {kept} }};")
+    return "\n".join(lines)
+
+
+def measure(program, run) -> tuple:
+    # (seconds, bytes still allocated while the global environment is alive)
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    env = createGlobalEnv()
+    run(program, env)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del env
+    return elapsed, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory retained by closures")
+    parser.add_argument("--depth", type=int, default=20, help="nested functions")
+    parser.add_argument("--width", type=int, default=50, help="properties of the object in every scope")
+    parser.add_argument("--closures", type=int, default=200, help="closures kept by the program")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best time is reported")
+    args = parser.parse_args()
+
+    source = make_source(args.depth, args.width, args.closures)
+    plain = Parser().produceAST(source)
+    captured = analyze_captures(Parser().produceAST(source))
+    closure = lambda program, env: compile_program(program)(env)  # noqa: E731
+
+    for name, program, run in (
+        ("tree", plain, evaluate),
+        ("tree captures", captured, evaluate),
+        ("closure", plain, closure),
+        ("closure captures", captured, closure),
+    ):
+        results = [measure(program, run) for _ in range(args.repeat)]
+        elapsed = min(seconds for seconds, _ in results)
+        retained = min(size for _, size in results)
+        print(f"{name:<17} {elapsed * 1000:9.2f} ms  {retained / 1024:10.1f} KiB retained")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# Compares the tree walking interpreter with closure compilation, with and
+# without resolved slot frames, on an arithmetic heavy script.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.closure_vs_tree [--calls 20000] [--repeat 3]
+import argparse
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program, compile_resolved_program
+from maiin.resolver import resolve_program
+from benchmarks.common import best_of
+
+FUNCTION = """
+fn score(a, b, c) {
+    let x = a * 3 + b * 7 - c % 5;
+    let y = (x + a) * (b - c) / 4 + 1;
+    let z = y * y % 97 + x / 2 - (a + b + c) * 2;
+    x = x + y * z % 13
+    x * 2 + y - z / 3
+}
+"""
+
+
+def make_source(calls: int) -> str:
+    lines = [FUNCTION, "let total = 0;"]
+    for i in range(calls):
+        lines.append(f"total = total + score({i % 17}, {i % 11 + 1}, {i % 7 + 2})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tree walker vs closure compilation")
+    parser.add_argument("--calls", type=int, default=20000, help="calls of the scoring function")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per backend, best is reported")
+    args = parser.parse_args()
+
+    program = Parser().produceAST(make_source(args.calls))
+
+    tree = best_of(args.repeat, lambda: evaluate(program, createGlobalEnv()))
+    compiled = compile_program(program)
+    closure = best_of(args.repeat, lambda: compiled(createGlobalEnv()))
+    compile_time = best_of(args.repeat, lambda: compile_program(program))
+    resolved = compile_resolved_program(resolve_program(program, createGlobalEnv()))
+    slots = best_of(args.repeat, lambda: resolved(createGlobalEnv()))
+
+    print(f"tree walker:   {tree:.4f}s")
+    print(f"closures:      {closure:.4f}s (compile {compile_time:.4f}s, {tree / closure:.2f}x)")
+    print(f"slot frames:   {slots:.4f}s ({tree / slots:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# Helpers shared by the benchmark scripts.
+import time
+
+from maiin.compiler import compile_resolved_program
+from maiin.resolver import resolve_program
+
+
+# NiScript identifiers are letters only, so names are numbered a, b, ... z, ba, ...
+def suffix(n: int) -> str:
+    letters = ""
+    while True:
+        letters = chr(ord("a") + n % 26) + letters
+        n //= 26
+        if not n:
+            return letters
+
+
+# Seconds of the fastest of repeat calls of fn.
+def best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+# Runs program on the slots backend, resolving it first.
+def run_slots(program, env):
+    return compile_resolved_program(resolve_program(program, env))(env)
@@ -0,0 +1,77 @@
+# Runs of one rule script against many inputs: parsing and building the
+# global environment for every run vs a CompiledProgram prepared once.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.embedding_throughput [--runs 20000] [--threads 4]
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.embedding import EMBEDDING_BACKENDS, CompiledProgram, to_runtime
+
+RULE = """
+const base = 60 * 60;
+fn score(amount, age) {
+    let weighted = amount * 3 + age % 7;
+    weighted * 2 - base / 100
+}
+fn limit(value) {
+    value % 1000
+}
+let result = limit(score(amount, age) + threshold);
+result
+"""
+
+
+GLOBALS = ("amount", "age", "threshold")
+
+
+def make_requests(runs: int):
+    return [{"amount": i % 500, "age": i % 90, "threshold": 10} for i in range(runs)]
+
+
+def naive(requests):
+    # What embedding code had to do before: everything per run.
+    for request in requests:
+        env = createGlobalEnv()
+        for name, value in request.items():
+            env.declareVar(name, to_runtime(value), True)
+        evaluate(Parser().produceAST(RULE), env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepared vs per-run parsed rule scripts")
+    parser.add_argument("--runs", type=int, default=20000, help="script executions per case")
+    parser.add_argument("--threads", type=int, default=4, help="threads for the shared program case")
+    args = parser.parse_args()
+
+    requests = make_requests(args.runs)
+
+    start = time.perf_counter()
+    naive(requests)
+    baseline = time.perf_counter() - start
+    print(f"parse + createGlobalEnv per run: {args.runs / baseline:10.0f} runs/s")
+
+    for backend in EMBEDDING_BACKENDS:
+        program = CompiledProgram(RULE, backend=backend, globals=GLOBALS)
+        start = time.perf_counter()
+        for request in requests:
+            program.run(request)
+        elapsed = time.perf_counter() - start
+        print(f"CompiledProgram, {backend:<7}:        {args.runs / elapsed:10.0f} runs/s ({baseline / elapsed:.1f}x)")
+
+    program = CompiledProgram(RULE, globals=GLOBALS)
+    expected = [program.run(request).value for request in requests]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        results = list(pool.map(lambda request: program.run(request).value, requests))
+    elapsed = time.perf_counter() - start
+    assert results == expected, "threaded runs disagree"
+    print(f"CompiledProgram, {args.threads} threads:      {args.runs / elapsed:10.0f} runs/s (same results)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Synthetic NiScript programs for benchmarks/suite.py. Every generator takes a
+# size and returns the same source for the same size, so results taken on
+# different commits measure the same program.
+from typing import Callable, Dict, Tuple
+from benchmarks.common import suffix
+
+
+
+def deep_nesting(size: int) -> str:
+    # One expression nested size parentheses deep.
+    expression = "1"
+    for i in range(size):
+        expression = f"({expression} {'+-*%'[i % 4]} {i % 9 + 1})"
+    return f"let deep = {expression};\ndeep"
+
+
+def many_functions(size: int) -> str:
+    # size small function declarations, each called once.
+    lines = ["const rate = 3;"]
+    for i in range(size):
+        name = "calc" + suffix(i)
+        lines.append(f"fn {name}(a, b) {{\n    let x = a * {i % 7 + 1} + b * rate;\n    x % 97\n}}")
+        lines.append(f"{name}({i % 13}, {i % 5})")
+    return "\n".join(lines)
+
+
+def call_chain(size: int) -> str:
+    # A chain of size different functions each calling the next, run 20
+    # times.
+    lines = []
+    for i in range(size):
+        call = f"step{suffix(i + 1)}(n + 1) + n" if i < size - 1 else "n * 2"
+        lines.append(f"fn step{suffix(i)}(n) {{\n    {call}\n}}")
+    lines.extend(f"step{suffix(0)}({i})" for i in range(20))
+    return "\n".join(lines)
+
+
+def deep_recursion(size: int) -> str:
+    # One function recursing size calls deep, run 20 times from a little
+    # less deep each time. NiScript has no conditionals, so the recursion
+    # stops by picking the next function from an array: for 0 <= n <= size,
+    # (x - x % m) / m with x = n + size and m = size + 1 is 0 only when n is
+    # 0, which calls stop instead of down.
+    lines = [
+        f"const depth = {size};",
+        "fn stop(n) {\n    0\n}",
+        "fn down(n) {\n    let x = n + depth;\n    let next = steps[(x - x % (depth + 1)) / (depth + 1)];\n"
+        "    next(n - 1) + 1\n}",
+        "const steps = [stop, down];",
+    ]
+    lines.extend(f"down({max(size - i, 0)})" for i in range(20))
+    return "\n".join(lines)
+
+
+def large_object(size: int) -> str:
+    # An object literal with size properties, half computed, half shorthand.
+    lines = [f"let v{suffix(i)} = {i};" for i in range(size // 2)]
+    properties = []
+    for i in range(size):
+        if i % 2:
+            properties.append(f"v{suffix(i // 2)}")
+        else:
+            properties.append(f"k{suffix(i)}: {i} * 2 + {i % 7}")
+    lines.append("let big = { " + ", ".join(properties) + " };")
+    lines.append("big")
+    return "\n".join(lines)
+
+
+def straight_line(size: int) -> str:
+    # size statements of arithmetic on a few variables.
+    lines = ["let a = 1;", "let b = 2;", "let c = 3;"]
+    for i in range(size):
+        target = "abc"[i % 3]
+        lines.append(f"{target} = (a * {i % 11 + 1} + b - c % {i % 5 + 2}) % 1000")
+    return "\n".join(lines)
+
+
+# name: (generator, default size)
+GENERATORS: Dict[str, Tuple[Callable[[int], str], int]] = {
+    "deep_nesting": (deep_nesting, 400),
+    "many_functions": (many_functions, 1000),
+    "call_chain": (call_chain, 150),
+    "deep_recursion": (deep_recursion, 300),
+    "large_object": (large_object, 2000),
+    "straight_line": (straight_line, 5000),
+}
@@ -0,0 +1,58 @@
+# Cost of the instrumentation in maiin/instrument.py: the plain evaluator,
+# an Interpreter without instruments (which runs the plain evaluator), an
+# Interpreter with an instrument that overrides no hook, each collector and
+# the resource limits of maiin/limits.py.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.instrumentation_overhead [--calls 20000] [--repeat 5]
+import argparse
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.instrument import AllocationCounter, CallProfile, Instrument, Interpreter, NodeTimer
+from maiin.limits import LimitedInterpreter, Limits
+from benchmarks.common import best_of
+
+FUNCTION = """
+fn step(a, b) {
+    let x = a * 2 + b % 3;
+    let y = { x, z: x - a / 4 + 1 };
+    x * 3 % 50
+}
+"""
+
+
+def make_source(calls: int) -> str:
+    lines = [FUNCTION, "let total = 0;"]
+    for i in range(calls):
+        lines.append(f"total = total + step({i % 17}, {i % 11 + 1}) % 7")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Overhead of the instrumentation hooks")
+    parser.add_argument("--calls", type=int, default=20000, help="function calls in the script")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    program = Parser().produceAST(make_source(args.calls))
+    cases = [
+        ("no hooks", lambda: Interpreter()),
+        ("empty instrument", lambda: Interpreter([Instrument()])),
+        ("CallProfile", lambda: Interpreter([CallProfile()])),
+        ("AllocationCounter", lambda: Interpreter([AllocationCounter()])),
+        ("NodeTimer", lambda: Interpreter([NodeTimer()])),
+        ("all three", lambda: Interpreter([CallProfile(), AllocationCounter(), NodeTimer()])),
+        ("Limits", lambda: LimitedInterpreter(Limits(steps=10 ** 9, depth=1000, memory=2 ** 40, seconds=3600))),
+    ]
+
+    baseline = best_of(args.repeat, lambda: evaluate(program, createGlobalEnv()))
+    print(f"{'evaluate':<20} {baseline * 1000:9.2f} ms")
+    for name, make in cases:
+        elapsed = best_of(args.repeat, lambda: make().run(program, createGlobalEnv()))
+        print(f"{name:<20} {elapsed * 1000:9.2f} ms ({(elapsed / baseline - 1) * 100:+.1f}%)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Exact ints against floats for integer heavy scripts. A chain of 2 ** levels
+# calls hashes a counter with a multiply-add-modulo step, once with a small
+# modulus (floats get it right too) and once FNV style modulo 2 ** 64,
+# where floats lose the low bits past 2 ** 53. The float runs evaluate the
+# same program with every literal turned into a float, which is how numbers
+# were parsed before ints were kept. Parsing is not timed.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.integers [--levels 14] [--repeat 3]
+import argparse
+
+from src.ast_1 import NumericLiteral, Stmt
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program
+from maiin.vm.machine import run_program
+from benchmarks.common import best_of, run_slots, suffix
+
+# (name, multiplier, modulus)
+HASHES = (
+    ("mod 1e9+7", 31, 1_000_000_007),
+    ("fnv 2**64", 1_099_511_628_211, 2 ** 64),
+)
+
+
+def make_source(levels: int, multiplier: int, modulus: int) -> str:
+    lines = [f"fn leaf(h) {{\n    (h * {multiplier} + 7) % {modulus}\n}}"]
+    for i in range(levels):
+        callee = f"level{suffix(i - 1)}" if i else "leaf"
+        lines.append(f"fn level{suffix(i)}(h) {{\n    {callee}({callee}(h))\n}}")
+    lines.append(f"level{suffix(levels - 1)}(1)")
+    return "\n".join(lines)
+
+
+def expected(levels: int, multiplier: int, modulus: int) -> int:
+    h = 1
+    for _ in range(2 ** levels):
+        h = (h * multiplier + 7) % modulus
+    return h
+
+
+def as_floats(node):
+    # Turns every literal below node into a float, in place.
+    if isinstance(node, NumericLiteral):
+        node.value = float(node.value)
+    elif isinstance(node, Stmt):
+        for value in vars(node).values():
+            as_floats(value)
+    elif isinstance(node, list):
+        for item in node:
+            as_floats(item)
+    return node
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exact ints against floats")
+    parser.add_argument("--levels", type=int, default=14, help="the chain makes 2 ** levels calls")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    backends = (
+        ("tree", evaluate),
+        ("closure", lambda program, env: compile_program(program)(env)),
+        ("slots", run_slots),
+        ("vm", run_program),
+    )
+
+    for name, multiplier, modulus in HASHES:
+        source = make_source(args.levels, multiplier, modulus)
+        exact = expected(args.levels, multiplier, modulus)
+        print(f"{2 ** args.levels} hash steps {name}")
+        for backend, run in backends:
+            results = []
+            for numbers, program in (
+                ("int", Parser().produceAST(source)),
+                ("float", as_floats(Parser().produceAST(source))),
+            ):
+                value = run(program, createGlobalEnv()).value
+                elapsed = best_of(args.repeat, lambda: run(program, createGlobalEnv()))
+                results.append((numbers, elapsed, value == exact))
+
+            baseline = results[0][1]
+            for numbers, elapsed, correct in results:
+                print(f"  {backend:<8} {numbers:<6} {elapsed * 1000:9.2f} ms  x{baseline / elapsed:5.2f}  "
+                      f"{'exact' if correct else 'WRONG'}")
+
+
+if __name__ == "__main__":
+    main()
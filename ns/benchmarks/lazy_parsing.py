@@ -0,0 +1,64 @@
+# Time to the first statement of a library style script, where only a few
+# of many helper functions get called, with eager and lazy parsing.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.lazy_parsing [--functions 2000] [--called 10] [--repeat 5]
+import argparse
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from benchmarks.common import best_of, suffix
+
+
+def make_source(functions: int, called: int) -> str:
+    lines = []
+    for i in range(functions):
+        lines.append(f"fn helper{suffix(i)}(a, b) {{")
+        lines.append(f"    let x = a * {i % 7 + 1} + b * 3 - {i % 5};")
+        lines.append("    let y = { total: x, ratio: x / 2, scaled: (x + 1) * 60 };")
+        lines.append("    fn inner(c) { c * x + y.total }")
+        lines.append("    x * 2 + a % 4")
+        lines.append("}")
+    step = max(functions // max(called, 1), 1)
+    for i in range(0, functions, step)[:called]:
+        lines.append(f"print(helper{suffix(i)}({i % 13}, {i % 3 + 1}))")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Eager vs lazy function body parsing")
+    parser.add_argument("--functions", type=int, default=2000, help="helper functions in the script")
+    parser.add_argument("--called", type=int, default=10, help="helpers the script calls")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per mode, best is reported")
+    args = parser.parse_args()
+
+    source = make_source(args.functions, args.called)
+
+    def run(lazy: bool):
+        program = Parser(lazy=lazy).produceAST(source)
+        # Declares every helper and calls the few that are used.
+        env = createGlobalEnv()
+        for stmt in program.body:
+            evaluate(stmt, env)
+
+    # The helpers print their results.
+    import contextlib
+    import io
+    with contextlib.redirect_stdout(io.StringIO()):
+        eager_parse = best_of(args.repeat, lambda: Parser().produceAST(source))
+        lazy_parse = best_of(args.repeat, lambda: Parser(lazy=True).produceAST(source))
+        eager = best_of(args.repeat, lambda: run(False))
+        lazy = best_of(args.repeat, lambda: run(True))
+        validate = best_of(args.repeat, lambda: Parser.validate(Parser(lazy=True).produceAST(source)))
+
+    print(f"source: {len(source) / 1024:.1f} KiB, {args.functions} functions, {args.called} called")
+    print(f"parse, eager:       {eager_parse * 1000:8.2f} ms")
+    print(f"parse, lazy:        {lazy_parse * 1000:8.2f} ms ({eager_parse / lazy_parse:.2f}x)")
+    print(f"parse + run, eager: {eager * 1000:8.2f} ms")
+    print(f"parse + run, lazy:  {lazy * 1000:8.2f} ms ({eager / lazy:.2f}x)")
+    print(f"lazy + validate:    {validate * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Measures how tokenize scales with the size of its input.
+# A linear lexer keeps a roughly constant throughput (MB/s) across sizes.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.lexer_scaling [--max-size 100MB] [--repeat 3]
+import argparse
+import time
+from typing import List
+
+from src.lexer import tokenize
+
+# A chunk of representative NiScript source which is repeated to reach
+# the requested input size.
+SAMPLE = (
+    "let counter = 0;\n"
+    "const limit = 1000 * (24 + 7);\n"
+    "fn add(a, b) {\n"
+    "    a + b\n"
+    "}\n"
+    "let point = { x: 10, y: add(limit, 2) % 3, counter };\n"
+    "counter = add(counter, point.x) / 2;\n"
+)
+
+UNITS = {"KB": 1024, "MB": 1024 * 1024}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for suffix, factor in UNITS.items():
+        if text.endswith(suffix):
+            return int(float(text[: -len(suffix)]) * factor)
+    return int(text)
+
+
+def make_source(size: int) -> str:
+    repeats = size // len(SAMPLE) + 1
+    return (SAMPLE * repeats)[:size].rsplit("\n", 1)[0] + "\n"
+
+
+def sizes_up_to(max_size: int) -> List[int]:
+    sizes = []
+    size = 1024
+    while size <= max_size:
+        sizes.append(size)
+        size *= 10
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lexer scaling benchmark")
+    parser.add_argument("--max-size", default="100MB", help="largest input size, e.g. 10MB")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per size, best is reported")
+    args = parser.parse_args()
+
+    print(f"{'size':>12} {'tokens':>12} {'best (s)':>10} {'MB/s':>8}")
+    for size in sizes_up_to(parse_size(args.max_size)):
+        source = make_source(size)
+        best = float("inf")
+        count = 0
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            count = len(tokenize(source))
+            best = min(best, time.perf_counter() - start)
+        rate = len(source) / best / UNITS["MB"]
+        print(f"{len(source):>12} {count:>12} {best:>10.4f} {rate:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# Memoization of pure functions (src/purity.py, maiin/memo.py): a pure
+# function with an expensive call tree is called many times with a few
+# distinct arguments, then with distinct arguments only, where the top
+# level calls always miss and only the calls inside the tree can hit.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.memoization [--depth 10] [--calls 300] [--distinct 20] [--size 1024] [--repeat 5]
+import argparse
+
+from src.parser_1 import Parser
+from src.purity import PurityAnalysis
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program
+from maiin.memo import DEFAULT_SIZE, memo_stats
+from benchmarks.common import best_of, suffix
+
+
+def make_source(depth: int, calls: int, distinct: int) -> str:
+    # Every level calls the next one twice, so a call of levela evaluates
+    # 2 ** depth bodies.
+    lines = []
+    for i in range(depth):
+        if i < depth - 1:
+            body = f"level{suffix(i + 1)}(n + 1) + level{suffix(i + 1)}(n * 2) % 1000"
+        else:
+            body = "n * 3 % 17"
+        lines.append(f"fn level{suffix(i)}(n) {{\n    {body}\n}}")
+    lines.append("fn run() {\n" + "\n".join(f"    level{suffix(0)}({i % distinct})" for i in range(calls)) + "\n}")
+    lines.append("run()")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoization of pure functions")
+    parser.add_argument("--depth", type=int, default=10, help="levels of the call tree")
+    parser.add_argument("--calls", type=int, default=300, help="calls of the top level function")
+    parser.add_argument("--distinct", type=int, default=20, help="distinct arguments among the calls")
+    parser.add_argument("--size", type=int, default=DEFAULT_SIZE, help="cache size per function")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    builtins = createGlobalEnv().variables
+    for distinct in (args.distinct, args.calls):
+        source = make_source(args.depth, args.calls, distinct)
+        plain = Parser().produceAST(source)
+        marked = Parser().produceAST(source)
+        pure = PurityAnalysis(builtins).mark(marked, args.size)
+        print(f"{args.calls} calls, {distinct} distinct arguments, {len(pure)} functions pure")
+
+        baseline = None
+        for name, program, run in (
+            ("tree", plain, evaluate),
+            ("tree memo", marked, evaluate),
+            ("closure", plain, lambda program, env: compile_program(program)(env)),
+            ("closure memo", marked, lambda program, env: compile_program(program)(env)),
+        ):
+            envs = []
+
+            def case():
+                env = createGlobalEnv()
+                envs.append(env)
+                run(program, env)
+
+            elapsed = best_of(args.repeat, case)
+            if baseline is None:
+                baseline = elapsed
+            stats = memo_stats(envs[-1]).get(f"level{suffix(0)}")
+            hits = f"  top level hits {stats['hits']}/{stats['hits'] + stats['misses']}" if stats else ""
+            print(f"  {name:<13} {elapsed * 1000:10.2f} ms  x{baseline / elapsed:7.2f}{hits}")
+
+
+if __name__ == "__main__":
+    main()
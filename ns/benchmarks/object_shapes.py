@@ -0,0 +1,147 @@
+# Shape based objects (maiin/values.py, maiin/shapes.py) against dict
+# backed objects, the representation ObjectVal used before.
+#
+# The runtime part builds millions of objects with the same keys both ways
+# and reads a property of every one: from the dict, through Shape.slots
+# (what member sites do with inline caches off) and through a MemberCache.
+# The script part runs object heavy NiScript reading objects of one shape
+# and of several shapes at the same site, with inline caches on and off.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.object_shapes [--objects 1000000] [--keys 4] [--levels 12] [--repeat 3]
+import argparse
+import gc
+import tracemalloc
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program
+from maiin.vm.machine import run_program
+from maiin.shapes import LiteralSite, MemberCache, set_inline_caches
+from maiin.values import MK_NUMBER, RuntimeVal
+from benchmarks.common import best_of, suffix
+
+
+class DictObject(RuntimeVal):
+    # The dict backed ObjectVal.
+    __slots__ = ("properties",)
+
+    def __init__(self, properties):
+        self.properties = properties
+
+
+def allocated(build) -> tuple:
+    # (result of build, bytes it allocated)
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def runtime(objects: int, key_count: int, repeat: int):
+    keys = [f"k{suffix(i)}" for i in range(key_count)]
+    read = keys[-1]
+    # Numbers differ per object, like the values of a real program.
+    numbers = [MK_NUMBER(float(i)) for i in range(objects)]
+    site = LiteralSite(keys)
+
+    def build_dicts():
+        return [DictObject({key: number for key in keys}) for number in numbers]
+
+    def build_shapes():
+        build = site.build
+        return [build([number] * key_count) for number in numbers]
+
+    dicts, dict_bytes = allocated(build_dicts)
+    shaped, shape_bytes = allocated(build_shapes)
+    print(f"{objects} objects with {key_count} keys")
+    for name, size, fn in (
+        ("dict", dict_bytes, build_dicts),
+        ("shape", shape_bytes, build_shapes),
+    ):
+        elapsed = best_of(repeat, fn)
+        print(f"  build {name:<6} {elapsed * 1000:9.1f} ms  {size / objects:6.1f} bytes/object")
+
+    def read_dicts():
+        for obj in dicts:
+            obj.properties.get(read)
+
+    def read_slots():
+        for obj in shaped:
+            index = obj.shape.slots.get(read)
+            None if index is None else obj.values[index]
+
+    def read_cached():
+        cache = MemberCache(read)
+        for obj in shaped:
+            cache.read(obj)
+
+    for name, fn in (
+        ("dict", read_dicts),
+        ("shape slots", read_slots),
+        ("inline cache", read_cached),
+    ):
+        elapsed = best_of(repeat, fn)
+        print(f"  read  {name:<13} {elapsed * 1000:9.1f} ms  {elapsed / objects * 1e9:6.1f} ns/read")
+
+
+def make_source(levels: int, polymorphic: bool) -> str:
+    # Every level calls the next one twice, the leaf builds objects and
+    # reads them back 2 ** levels times.
+    if polymorphic:
+        leaf = ("fn get(o) { o.x + o.y }\n"
+                "fn leaf(n) {\n"
+                "    get({ x: n, y: 1 }) + get({ y: n, x: 2 }) + get({ z: 1, x: n, y: 3 }) + get({ w: n, y: 4, x: 5 })\n"
+                "}")
+    else:
+        leaf = ("fn get(o) { o.x + o.y }\n"
+                "fn leaf(n) {\n"
+                "    get({ x: n, y: 1 }) + get({ x: 2, y: n }) + get({ x: n, y: 3 }) + get({ x: 5, y: n })\n"
+                "}")
+    lines = [leaf]
+    for i in range(levels):
+        callee = f"level{suffix(i - 1)}" if i else "leaf"
+        lines.append(f"fn level{suffix(i)}(n) {{\n    {callee}(n + 1) + {callee}(n * 2)\n}}")
+    lines.append(f"level{suffix(levels - 1)}(1)")
+    return "\n".join(lines)
+
+
+def script(levels: int, repeat: int):
+    backends = (
+        ("tree", evaluate),
+        ("closure", lambda program, env: compile_program(program)(env)),
+        ("vm", run_program),
+    )
+    for polymorphic in (False, True):
+        source = make_source(levels, polymorphic)
+        print(f"{2 ** levels * 4} objects and {2 ** levels * 8} member reads, "
+              f"{'4 shapes' if polymorphic else '1 shape'} per site")
+        for name, run in backends:
+            times = []
+            for caches in (True, False):
+                # Sites are made on the first run, after the switch.
+                set_inline_caches(caches)
+                program = Parser().produceAST(source)
+                run(program, createGlobalEnv())
+                times.append(best_of(repeat, lambda: run(program, createGlobalEnv())))
+            set_inline_caches(True)
+            print(f"  {name:<8} inline caches {times[0] * 1000:8.1f} ms  off {times[1] * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shape based objects against dicts")
+    parser.add_argument("--objects", type=int, default=1_000_000, help="objects built by the runtime part")
+    parser.add_argument("--keys", type=int, default=4, help="keys per object")
+    parser.add_argument("--levels", type=int, default=12, help="levels of the call tree in the script part")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    runtime(args.objects, args.keys, args.repeat)
+    script(args.levels, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
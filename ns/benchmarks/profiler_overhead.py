@@ -0,0 +1,49 @@
+# Overhead of the sampling profiler (maiin/profiler.py) on a script with a
+# deep chain of calls, at a few sampling intervals.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.profiler_overhead [--depth 40] [--calls 3000] [--repeat 5]
+import argparse
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.profiler import SamplingProfiler
+from benchmarks.common import best_of, suffix
+
+
+def make_source(depth: int, calls: int) -> str:
+    lines = []
+    for i in range(depth):
+        body = f"level{suffix(i + 1)}(b + 1) % 1000" if i < depth - 1 else "let o = { a, b };\n    b * 3"
+        lines.append(f"fn level{suffix(i)}(a) {{\n    let b = a * 2;\n    {body}\n}}")
+    lines.append("fn heavy(a) { a * a * a % 7 + a / 3 - a }")
+    for i in range(calls):
+        lines.append(f"level{suffix(0)}({i})")
+        lines.append(f"heavy({i})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sampling profiler overhead")
+    parser.add_argument("--depth", type=int, default=40, help="length of the call chain")
+    parser.add_argument("--calls", type=int, default=3000, help="calls of the chain")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    program = Parser().produceAST(make_source(args.depth, args.calls))
+    run = lambda: evaluate(program, createGlobalEnv())  # noqa: E731
+
+    baseline = best_of(args.repeat, run)
+    print(f"{'not profiled':<16} {baseline * 1000:9.2f} ms")
+    for interval in (0.01, 0.005, 0.001):
+        with SamplingProfiler(interval) as profiler:
+            elapsed = best_of(args.repeat, run)
+        print(
+            f"{f'every {interval * 1000:g} ms':<16} {elapsed * 1000:9.2f} ms "
+            f"({(elapsed / baseline - 1) * 100:+.1f}%, {profiler.total} samples)"
+        )
+
+
+if __name__ == "__main__":
+    main()
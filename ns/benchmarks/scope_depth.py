@@ -0,0 +1,56 @@
+# Measures variable access through deep closure chains, where the tree
+# walker resolves every name by walking Environment parents and resolved
+# programs index slot frames directly.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.scope_depth [--depth 30] [--calls 2000] [--repeat 3]
+import argparse
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program, compile_resolved_program
+from maiin.resolver import resolve_program
+from benchmarks.common import best_of, suffix
+
+
+def make_source(depth: int, calls: int) -> str:
+    # fn levela(arga) { fn levelb(argb) { ... arga + argb + ... } levelb(1) } ...
+    lines = ["let base = 1;"]
+    for level in range(depth):
+        lines.append("    " * level + f"fn level{suffix(level)}(arg{suffix(level)}) {{")
+    inner = " + ".join(f"arg{suffix(level)}" for level in range(depth))
+    lines.append("    " * depth + f"let sum = {inner} + base;")
+    lines.append("    " * depth + "sum * base + arga - base")
+    for level in reversed(range(depth)):
+        if level + 1 < depth:
+            lines.append("    " * (level + 1) + f"level{suffix(level + 1)}({level + 1})")
+        lines.append("    " * level + "}")
+    lines.append("fn run() {\n" + "\n".join("    levela(0)" for _ in range(calls)) + "\n}")
+    lines.append("run()")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Variable access through deep scope chains")
+    parser.add_argument("--depth", type=int, default=30, help="nested function levels")
+    parser.add_argument("--calls", type=int, default=2000, help="calls of the outermost function")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per backend, best is reported")
+    args = parser.parse_args()
+
+    program = Parser().produceAST(make_source(args.depth, args.calls))
+    compiled = compile_program(program)
+    resolved = compile_resolved_program(resolve_program(program, createGlobalEnv()))
+
+    tree = best_of(args.repeat, lambda: evaluate(program, createGlobalEnv()))
+    closure = best_of(args.repeat, lambda: compiled(createGlobalEnv()))
+    slots = best_of(args.repeat, lambda: resolved(createGlobalEnv()))
+
+    print(f"depth {args.depth}, {args.calls} calls")
+    print(f"tree walker:   {tree:.4f}s")
+    print(f"closures:      {closure:.4f}s ({tree / closure:.2f}x)")
+    print(f"slot frames:   {slots:.4f}s ({tree / slots:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Parsing a whole data script before running it against streaming it a
+# top level statement at a time (main.stream_file). Two scripts print a
+# line, run many statements and print again: one declares records, every
+# one kept in a global, the other only has expression statements (calls)
+# whose values are dropped. Reports the time to the first printed line, the
+# total time and the peak of traced memory, which for the whole file
+# includes its source, its tokens and its AST. Peak memory is measured in a
+# separate run, tracemalloc slows everything down.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.streaming [--records 20000] [--backend tree]
+import argparse
+import contextlib
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from main import STREAM_BACKENDS, execute_file, stream_file
+from benchmarks.common import suffix
+
+
+def write_records(file, records: int):
+    file.write("print(0)\n")
+    for i in range(records):
+        name = f"r{suffix(i)}"
+        file.write(f"let {name} = {{ id: {i}, tags: [{i % 7}, {i % 11}, {i % 13}], score: {i} * 3 / 4 }};\n")
+    file.write(f"print(r{suffix(records - 1)}.id)\n")
+
+
+def write_calls(file, records: int):
+    file.write("fn score(id, tags) {\n    id * 3 / 4 + tags[0]\n}\nprint(0)\n")
+    for i in range(records):
+        file.write(f"gather({i}, score({i}, [{i % 7}, {i % 11}, {i % 13}]))\n")
+    file.write(f"print({records})\n")
+
+
+class FirstWrite:
+    # Stands in for stdout and notes when something is first written.
+    def __init__(self):
+        self.at = None
+
+    def write(self, text: str):
+        if self.at is None:
+            self.at = time.perf_counter()
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def timed(run) -> tuple:
+    # (seconds to the first output, seconds in total)
+    out = FirstWrite()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(out):
+        run()
+    return out.at - start, time.perf_counter() - start
+
+
+def peak(run) -> int:
+    gc.collect()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(FirstWrite()):
+        run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whole file against streaming execution")
+    parser.add_argument("--records", type=int, default=20000, help="statements in each script")
+    parser.add_argument("--backend", choices=STREAM_BACKENDS, default="tree", help="execution backend")
+    args = parser.parse_args()
+
+    for script, write in (("records", write_records), ("calls", write_calls)):
+        with tempfile.NamedTemporaryFile("w", suffix=".ns", delete=False) as file:
+            write(file, args.records)
+        try:
+            size = os.path.getsize(file.name)
+            print(f"{args.records} {script}, {size / 2 ** 20:.1f} MB of source")
+            for mode, run in (
+                ("whole file", lambda: execute_file(file.name, args.backend)),
+                ("streaming", lambda: stream_file(file.name, args.backend)),
+            ):
+                first, total = timed(run)
+                print(f"  {mode:<11} first output {first * 1000:9.2f} ms  total {total * 1000:9.2f} ms  "
+                      f"peak {peak(run) / 2 ** 20:8.1f} MB")
+        finally:
+            os.unlink(file.name)
+
+if __name__ == "__main__":
+    main()
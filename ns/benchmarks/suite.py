@@ -0,0 +1,197 @@
+# Benchmark suite with phase separated timings (tokenize, parse, optimize,
+# evaluate) for the synthetic programs in benchmarks/generators.py. Results
+# are written as JSON, so two commits can be compared:
+#
+#   git checkout old && python -m benchmarks.suite run -o old.json
+#   git checkout new && python -m benchmarks.suite run -o new.json
+#   python -m benchmarks.suite compare old.json new.json --threshold 0.1
+#
+# compare exits with status 1 when any phase got slower than the threshold.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.suite run [--scale 1] [--warmup 2] [--repeat 7] [--backend tree]
+#                                  [--only NAME ...] [-o results.json]
+#   python -m benchmarks.suite compare OLD NEW [--threshold 0.1] [--statistic min]
+import argparse
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from src.lexer import tokenize
+from src.parser_1 import Parser
+from src.optimizer import Optimizer
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.iterative import evaluate_iterative
+from maiin.compiler import compile_program
+from maiin.vm.machine import run_program
+from benchmarks.common import run_slots
+from benchmarks.generators import GENERATORS
+
+PHASES = ("tokenize", "parse", "optimize", "evaluate")
+STATISTICS = ("min", "median", "mean")
+
+# Evaluation including any compilation the backend needs.
+BACKENDS: Dict[str, Callable] = {
+    "tree": evaluate,
+    "closure": lambda program, env: compile_program(program)(env),
+    "slots": run_slots,
+    "vm": run_program,
+    "iterative": evaluate_iterative,
+}
+
+
+def measure(fn: Callable, setup: Optional[Callable], warmup: int, repeat: int) -> List[float]:
+    # Seconds of each timed call of fn(setup()), setup is not timed.
+    times = []
+    for run in range(warmup + repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        fn(argument)
+        elapsed = time.perf_counter() - start
+        if run >= warmup:
+            times.append(elapsed)
+    return times
+
+
+def summarize(times: List[float]) -> dict:
+    return {
+        "runs": len(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "max": max(times),
+    }
+
+
+def run_benchmark(source: str, backend: str, warmup: int, repeat: int) -> Dict[str, dict]:
+    builtins = createGlobalEnv().variables
+    run = BACKENDS[backend]
+    phases = {
+        "tokenize": (lambda _: tokenize(source), None),
+        "parse": (lambda _: Parser().produceAST(source), None),
+        "optimize": (lambda program: Optimizer(builtins=builtins).optimize(program),
+                     lambda: Parser().produceAST(source)),
+        "evaluate": (lambda program: run(program, createGlobalEnv()), lambda: Parser().produceAST(source)),
+    }
+    return {name: summarize(measure(fn, setup, warmup, repeat)) for name, (fn, setup) in phases.items()}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        output = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.stdout.strip()
+
+
+def run_suite(args) -> int:
+    names = args.only or list(GENERATORS)
+    unknown = [name for name in names if name not in GENERATORS]
+    if unknown:
+        print(f"unknown benchmark(s): {', '.join(unknown)}. Expected some of {', '.join(GENERATORS)}.", file=sys.stderr)
+        return 2
+
+    results = {}
+    for name in names:
+        generator, size = GENERATORS[name]
+        size = max(1, int(size * args.scale))
+        source = generator(size)
+        phases = run_benchmark(source, args.backend, args.warmup, args.repeat)
+        results[name] = {"size": size, "source_bytes": len(source), "phases": phases}
+        timings = "  ".join(
+            f"{phase} {phases[phase]['median'] * 1000:8.2f} ms ±{phases[phase]['stdev'] * 1000:6.2f}"
+            for phase in PHASES
+        )
+        print(f"{name:<15} {timings}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "backend": args.backend,
+            "scale": args.scale,
+            "warmup": args.warmup,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"results written to {args.output}")
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.old) as file:
+        old = json.load(file)
+    with open(args.new) as file:
+        new = json.load(file)
+
+    for key in ("backend", "scale"):
+        if old["meta"].get(key) != new["meta"].get(key):
+            print(f"warning: {key} differs ({old['meta'].get(key)} vs {new['meta'].get(key)})", file=sys.stderr)
+
+    regressions = 0
+    print(f"{'benchmark':<15} {'phase':<9} {'old ms':>10} {'new ms':>10} {'change':>8}")
+    for name, result in new["results"].items():
+        before = old["results"].get(name)
+        if before is None or before["size"] != result["size"]:
+            print(f"{name:<15} not comparable (missing or different size)")
+            continue
+        for phase in PHASES:
+            old_time = before["phases"][phase][args.statistic]
+            new_time = result["phases"][phase][args.statistic]
+            change = new_time / old_time - 1 if old_time else 0.0
+            flag = ""
+            if change > args.threshold:
+                flag = "  REGRESSION"
+                regressions += 1
+            elif change < -args.threshold:
+                flag = "  faster"
+            print(f"{name:<15} {phase:<9} {old_time * 1000:10.2f} {new_time * 1000:10.2f} {change * 100:+7.1f}%{flag}")
+
+    print(f"{regressions} regression(s) over {args.threshold * 100:g}% ({args.statistic} of each phase)")
+    return 1 if regressions else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="NiScript benchmark suite")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks")
+    run.add_argument("--scale", type=float, default=1.0, help="multiplies the size of every program")
+    run.add_argument("--warmup", type=int, default=2, help="untimed runs before measuring")
+    run.add_argument("--repeat", type=int, default=7, help="timed runs per phase")
+    run.add_argument("--backend", choices=tuple(BACKENDS), default="tree", help="backend of the evaluate phase")
+    run.add_argument("--only", nargs="+", metavar="NAME", help="run only these benchmarks")
+    run.add_argument("-o", "--output", help="write the results as JSON")
+    run.add_argument("--recursion-limit", type=int, default=10000, help="Python recursion limit")
+
+    diff = commands.add_parser("compare", help="compare two JSON results")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=0.1, help="allowed slowdown, 0.1 is 10%%")
+    diff.add_argument("--statistic", choices=STATISTICS, default="min", help="statistic compared")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        sys.setrecursionlimit(args.recursion_limit)
+        return run_suite(args)
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# The iterative evaluator (maiin/iterative.py) against the recursive tree
+# walker: speed on ordinary calls, memory of a tail recursive loop as it
+# runs longer, and how deep non tail recursion gets before it is stopped.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.tail_calls [--depth 40] [--calls 2000] [--repeat 5]
+import argparse
+import sys
+import time
+import tracemalloc
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.iterative import MAX_DEPTH, evaluate_iterative
+from maiin.limits import Limits, ResourceLimitExceeded
+from benchmarks.common import best_of
+from benchmarks.profiler_overhead import make_source
+
+# Endless without conditionals, the step limit ends them.
+TAIL_LOOP = "fn loop(n) {\n    let next = n + 1;\n    loop(next)\n}\nloop(0)"
+NESTED = "fn down(n) {\n    let r = down(n + 1);\n    r\n}\ndown(0)"
+
+
+def run_tail_loop(steps: int) -> int:
+    # Peak bytes allocated while the loop runs for steps nodes.
+    program = Parser().produceAST(TAIL_LOOP)
+    tracemalloc.start()
+    try:
+        evaluate_iterative(program, createGlobalEnv(), limits=Limits(steps=steps))
+    except ResourceLimitExceeded:
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def nested_depth(evaluator) -> str:
+    program = Parser().produceAST(NESTED)
+    start = time.perf_counter()
+    try:
+        evaluator(program, createGlobalEnv())
+    except (RecursionError, ResourceLimitExceeded) as e:
+        return f"{type(e).__name__} after {(time.perf_counter() - start) * 1000:.1f} ms"
+    return "returned"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Iterative evaluator and tail calls")
+    parser.add_argument("--depth", type=int, default=40, help="length of the call chain")
+    parser.add_argument("--calls", type=int, default=2000, help="calls of the chain")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    program = Parser().produceAST(make_source(args.depth, args.calls))
+    tree = best_of(args.repeat, lambda: evaluate(program, createGlobalEnv()))
+    iterative = best_of(args.repeat, lambda: evaluate_iterative(program, createGlobalEnv()))
+    print(f"{'tree':<12} {tree * 1000:9.2f} ms")
+    print(f"{'iterative':<12} {iterative * 1000:9.2f} ms ({(iterative / tree - 1) * 100:+.1f}%)")
+
+    print("\ntail recursive loop, iterative")
+    for steps in (10_000, 100_000, 1_000_000):
+        print(f"{steps:>10} steps  peak {run_tail_loop(steps) / 1024:8.1f} KiB")
+
+    print("\nnon tail recursion")
+    print(f"{'tree':<12} recursion limit {sys.getrecursionlimit()}: {nested_depth(evaluate)}")
+    print(f"{'iterative':<12} max_depth {MAX_DEPTH}: {nested_depth(evaluate_iterative)}")
+
+
+if __name__ == "__main__":
+    main()
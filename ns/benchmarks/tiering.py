@@ -0,0 +1,65 @@
+# Tiered execution (maiin/tiering.py) on recursive numeric code: a tree of
+# calls 2 ** levels leaves wide, every leaf doing a little integer
+# arithmetic. The tree walker runs it with tiering off, with the default
+# threshold and with every function translated on its first call, the
+# closure and slots backends are there for comparison. Parsing is not
+# timed.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.tiering [--levels 14] [--repeat 3] [--dump]
+import argparse
+import sys
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program
+from maiin.tiering import DEFAULT_THRESHOLD, set_tier_dump, set_tier_threshold
+from benchmarks.common import best_of, run_slots, suffix
+
+
+def make_source(levels: int) -> str:
+    lines = [
+        "const m = 1000003;",
+        "fn leaf(n) {\n    let x = n * 7 + 3;\n    const y = x % m;\n    (y * y + n) % m\n}",
+    ]
+    for i in range(levels):
+        callee = f"level{suffix(i - 1)}" if i else "leaf"
+        lines.append(f"fn level{suffix(i)}(n) {{\n    {callee}(n + 1) + {callee}(n * 2) % m\n}}")
+    lines.append(f"level{suffix(levels - 1)}(1)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiered execution of the tree walker")
+    parser.add_argument("--levels", type=int, default=14, help="levels of the call tree")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best is reported")
+    parser.add_argument("--dump", action="store_true", help="print the generated code to stderr")
+    args = parser.parse_args()
+
+    program = Parser().produceAST(make_source(args.levels))
+    cases = (
+        ("tree interpreted", None, evaluate),
+        (f"tree tiered at {DEFAULT_THRESHOLD}", DEFAULT_THRESHOLD, evaluate),
+        ("tree tiered at 1", 1, evaluate),
+        ("closure", None, lambda program, env: compile_program(program)(env)),
+        ("slots", None, run_slots),
+    )
+
+    print(f"{2 ** args.levels} leaf calls")
+    results = []
+    for name, threshold, run in cases:
+        set_tier_threshold(threshold)
+        set_tier_dump(sys.stderr if args.dump and threshold == 1 else None)
+        value = run(program, createGlobalEnv()).value
+        set_tier_dump(None)
+        results.append((name, best_of(args.repeat, lambda: run(program, createGlobalEnv())), value))
+    set_tier_threshold(None)
+
+    baseline = results[0][1]
+    for name, elapsed, value in results:
+        print(f"  {name:<22} {elapsed * 1000:9.2f} ms  x{baseline / elapsed:5.2f}  result {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Counts the runtime values a loop heavy script allocates and measures the
+# memory they take with tracemalloc.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.value_allocations [--calls 20000] [--no-number-cache]
+import argparse
+import tracemalloc
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin import values
+from benchmarks.common import suffix
+
+FUNCTION = """
+fn step(a, b) {
+    let x = a * 2 + b % 3;
+    let y = x - a / 4 + 1;
+    x * y % 50
+}
+"""
+
+
+def make_source(calls: int) -> str:
+    lines = [FUNCTION, "let total = 0;"]
+    for i in range(calls):
+        lines.append(f"total = total + step({i % 17}, {i % 11 + 1}) % 7")
+    # Keep some results alive, so they show up in the retained memory.
+    kept = ", ".join(f"k{suffix(i)}: step({i % 13}, {i % 5})" for i in range(calls // 10))
+    lines.append(f"let kept = {{ {kept} }};")
+    return "\n".join(lines)
+
+
+def count_allocations(counts: dict):
+    # Wraps the constructor of every value class to count instances.
+    for cls in (values.NullVal, values.BooleanVal, values.NumberVal, values.ObjectVal,
+                values.NativeFnValue, values.FunctionValue):
+        init = cls.__init__
+
+        def counting_init(self, *args, _init=init, _name=cls.__name__, **kwargs):
+            counts[_name] = counts.get(_name, 0) + 1
+            _init(self, *args, **kwargs)
+
+        cls.__init__ = counting_init
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runtime value allocations of the tree walker")
+    parser.add_argument("--calls", type=int, default=20000, help="calls of the step function")
+    parser.add_argument("--no-number-cache", action="store_true", help="do not intern small numbers")
+    args = parser.parse_args()
+
+    if args.no_number_cache:
+        values.set_number_cache(False)
+
+    program = Parser().produceAST(make_source(args.calls))
+    env = createGlobalEnv()
+
+    counts = {}
+    count_allocations(counts)
+    tracemalloc.start()
+    evaluate(program, env)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    total = sum(counts.values())
+    print(f"values allocated: {total} ({total / args.calls:.1f} per call)")
+    for name, n in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"  {name:<14} {n}")
+    print(f"retained memory:  {retained / 1024:.1f} KiB")
+    print(f"peak memory:      {peak / 1024:.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
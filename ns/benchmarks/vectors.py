@@ -0,0 +1,59 @@
+# Batch arithmetic with vectors (maiin/vectors.py) against a script
+# function called once per element. Both compute the same score over n
+# inputs and add the results up. Parsing is not timed.
+#
+# Usage (from the ns directory):
+#   python -m benchmarks.vectors [--sizes 1000,10000,100000] [--repeat 3]
+import argparse
+
+from src.parser_1 import Parser
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.compiler import compile_program
+from maiin.vectors import numpy, set_numpy
+from benchmarks.common import best_of
+
+SCORE = "x * 3 / 4 + x % 7 - 2"
+
+
+def scalar_source(n: int) -> str:
+    calls = "\n".join(f"    sum = sum + score({i})" for i in range(n))
+    return f"fn score(x) {{\n    {SCORE}\n}}\nlet sum = 0;\nfn total() {{\n{calls}\n}}\ntotal()"
+
+
+def vector_source(n: int) -> str:
+    return f"let x = vec.range({n});\nvec.sum({SCORE})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector arithmetic against one call per element")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated input sizes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per case, best is reported")
+    args = parser.parse_args()
+
+    backends = (
+        ("tree", evaluate),
+        ("closure", lambda program, env: compile_program(program)(env)),
+    )
+    storages = [("array", False)] + ([("numpy", True)] if numpy is not None else [])
+    if numpy is None:
+        print("NumPy is not installed, vectors use array('d')")
+
+    for n in (int(size) for size in args.sizes.split(",")):
+        print(f"{n} inputs")
+        scalar = Parser().produceAST(scalar_source(n))
+        vector = Parser().produceAST(vector_source(n))
+        for name, run in backends:
+            results = [("per element", best_of(args.repeat, lambda: run(scalar, createGlobalEnv())))]
+            for storage, enabled in storages:
+                set_numpy(enabled)
+                results.append((f"vector {storage}", best_of(args.repeat, lambda: run(vector, createGlobalEnv()))))
+            set_numpy(True)
+
+            baseline = results[0][1]
+            for case, elapsed in results:
+                print(f"  {name:<8} {case:<13} {elapsed * 1000:10.2f} ms  x{baseline / elapsed:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
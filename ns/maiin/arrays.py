@@ -0,0 +1,389 @@
+from contextvars import ContextVar
+from functools import cmp_to_key
+from types import FunctionType
+from typing import TYPE_CHECKING, Callable, List, Optional
+
+from src.ast_1 import FunctionDeclaration, Stmt
+from maiin.memo import memo_key
+from maiin.shapes import property_key, read_member
+from maiin.values import (
+    ArrayVal,
+    BooleanVal,
+    FunctionValue,
+    MK_ARRAY,
+    MK_NATIVE_FN,
+    MK_NUMBER,
+    NULL,
+    NativeFnValue,
+    NullVal,
+    NumberVal,
+    ObjectVal,
+    RuntimeVal,
+)
+
+if TYPE_CHECKING:
+    from maiin.environment import Environment
+
+# Arrays: ordered lists of values that can grow.
+#
+#   let xs = [3, 1, 2];
+#   xs[3] = 4
+#   array.sort(array.map(xs, square))
+#
+# An ArrayVal keeps its items in a Python list, so reading or replacing an
+# item is O(1) and appending amortized O(1). `a[i]` with a whole number i in
+# range reads an item, any other number reads null. `a[i] = x` replaces the
+# item when i is in range and appends x when i is exactly the length.
+# Arrays only grow at the end and never have holes: an index past the
+# length raises, like a negative one, so a 3 item array takes a[3] = x but
+# not a[5] = x. Arrays are the only values that change after they are
+# made, every variable holding an array sees the change.
+#
+# Scripts reach the builtins through the global `array` object:
+#   array.len(a)
+#   array.push(a, x, ...)   appends, returns the new length
+#   array.pop(a)            removes and returns the last item, null if empty
+#   array.map(a, f)         a new array of f(item, index)
+#   array.filter(a, f)      a new array of the items f(item, index) keeps
+#   array.reduce(a, f)      f(acc, item, index) over the items, starting
+#   array.reduce(a, f, x)   from the first item or from x
+#   array.sort(a)           sorts numbers in place and returns a
+#   array.sort(a, f)        the same ordered by f(x, y) < 0, = 0 or > 0
+#
+# map, filter and reduce go over the items a had when they were called. f
+# keeps an item when it returns anything but null, false or 0.
+
+
+# INDEXING
+
+def _index_error(key: RuntimeVal) -> Exception:
+    return ValueError(f"Cannot use {key.type} as an array index.")
+
+
+# target[key] for every target, objects read the key property_key makes.
+def read_computed(target: RuntimeVal, key: RuntimeVal) -> RuntimeVal:
+    if type(target) is not ArrayVal:
+        return read_member(target, property_key(key))
+    if type(key) is not NumberVal:
+        raise _index_error(key)
+    items = target.items
+    index = key.value
+    if 0 <= index < len(items) and (type(index) is int or index.is_integer()):
+        return items[int(index)]
+    return NULL
+
+
+# target[key] = value, returns value.
+def write_computed(target: RuntimeVal, key: RuntimeVal, value: RuntimeVal) -> RuntimeVal:
+    if type(target) is not ArrayVal:
+        raise not_assignable(property_key(key), target)
+    if type(key) is not NumberVal:
+        raise _index_error(key)
+    items = target.items
+    index = key.value
+    if type(index) is float and not index.is_integer():
+        raise ValueError(f"Array index must be a whole number, got {index}.")
+    index = int(index)
+    if index == len(items):
+        items.append(value)
+    elif 0 <= index < len(items):
+        items[index] = value
+    else:
+        raise ValueError(
+            f"Index {index} is out of range for an array of length {len(items)}, "
+            f"only index {len(items)} appends."
+        )
+    return value
+
+
+# Only array items can be assigned, objects never change.
+def not_assignable(key: str, target: RuntimeVal) -> Exception:
+    return ValueError(f"Cannot assign to property {key} of {target.type}.")
+
+
+# CALLING SCRIPT FUNCTIONS
+#
+# bind_function does the work every call of fn repeats once and returns
+# call(args) for the loop of a builtin. The compiled form of fn is found
+# through fn.code, which the backend that made fn fills in: the closure
+# compiled body (a tuple), a SlotFunction, a CodeObject, a Python function
+# for a function the tree walker tiered (maiin/tiering.py), or nothing. A
+# function declaring no inner functions cannot leak its scope, so all its
+# calls share one Environment (or slot frame) that is emptied and given the
+# new arguments, instead of making a new one per call.
+#
+# Evaluators that keep track of calls (maiin/instrument.py, maiin/limits.py
+# and maiin/iterative.py) set CALLER while they run, every call made by a
+# builtin then goes through it.
+
+Caller = Callable[[RuntimeVal, List[RuntimeVal], "Environment"], RuntimeVal]
+CALLER: "ContextVar[Optional[Caller]]" = ContextVar("array_caller", default=None)
+
+_frame_reuse = True
+
+
+# With enabled False every call gets a new scope, like a call from a script.
+def set_frame_reuse(enabled: bool = True):
+    global _frame_reuse
+    _frame_reuse = enabled
+
+
+# Whether calls of a function with this body can share one scope.
+def reusable(body: List[Stmt]) -> bool:
+    return _frame_reuse and not any(isinstance(stmt, FunctionDeclaration) for stmt in body)
+
+
+def bind_function(fn: RuntimeVal, env: "Environment") -> Callable[[List[RuntimeVal]], RuntimeVal]:
+    if type(fn) is not FunctionValue and type(fn) is not NativeFnValue:
+        raise ValueError("Cannot call value that is not a function: " + str(fn))
+
+    caller = CALLER.get()
+    if caller is not None:
+        return lambda args: caller(fn, args, env)
+    if type(fn) is NativeFnValue:
+        native = fn.call
+        return lambda args: native(args, env)
+
+    # Imported here, they import maiin.environment which declares `array`.
+    from maiin.compiler import SlotFunction
+    from maiin.interpreter import evaluate
+    from maiin.vm.bytecode import CodeObject
+    from maiin.vm.machine import execute
+
+    code = fn.code
+    if type(code) is SlotFunction:
+        return _bind_slots(fn, code)
+
+    if type(code) is CodeObject:
+        # The vm keeps neither caches nor cells.
+        return _bind_scope(fn, lambda scope: execute(code, scope), ())
+
+    if type(code) is FunctionType:
+        call = code
+    elif type(code) is tuple:
+        body = code[0]
+
+        def run_compiled(scope: "Environment") -> RuntimeVal:
+            result = NULL
+            for statement in body:
+                result = statement(scope)
+            return result
+
+        call = _bind_scope(fn, run_compiled, fn.cells)
+    else:
+        body = fn.body
+
+        def run_tree(scope: "Environment") -> RuntimeVal:
+            result = NULL
+            for stmt in body:
+                result = evaluate(stmt, scope)
+            return result
+
+        call = _bind_scope(fn, run_tree, fn.cells)
+
+    if fn.memo is not None:
+        return _memoized(fn, call)
+    return call
+
+
+def _bind_scope(fn: FunctionValue, run: Callable[["Environment"], RuntimeVal], cells) -> Callable:
+    from maiin.captures import make_cells
+    from maiin.environment import Environment
+
+    parent = fn.declarationEnv
+    parameters = fn.parameters
+    count = len(parameters)
+
+    if reusable(fn.body) and len(set(parameters)) == count:
+        scope = Environment(parent)
+        variables = scope.variables
+        constants = scope.constants
+
+        def call_reusing(args: List[RuntimeVal]) -> RuntimeVal:
+            variables.clear()
+            if constants:
+                constants.clear()
+            for i in range(count):
+                variables[parameters[i]] = args[i]
+            if cells:
+                make_cells(scope, cells)
+            return run(scope)
+
+        return call_reusing
+
+    def call(args: List[RuntimeVal]) -> RuntimeVal:
+        scope = Environment(parent)
+        for i in range(count):
+            scope.declareVar(parameters[i], args[i], False)
+        if cells:
+            make_cells(scope, cells)
+        return run(scope)
+
+    return call
+
+
+def _bind_slots(fn: FunctionValue, code) -> Callable:
+    parent = fn.declarationEnv
+    body = code.body
+    count = code.parameter_count
+    locals = code.locals
+
+    def check(args: List[RuntimeVal]):
+        if len(args) < count:
+            raise IndexError("list index out of range")
+
+    if reusable(fn.body):
+        frame = [parent] + [NULL] * count + locals
+        end = count + 1
+
+        def call_reusing(args: List[RuntimeVal]) -> RuntimeVal:
+            check(args)
+            frame[1:end] = args[:count]
+            frame[end:] = locals
+            result = NULL
+            for statement in body:
+                result = statement(frame)
+            return result
+
+        return call_reusing
+
+    def call(args: List[RuntimeVal]) -> RuntimeVal:
+        check(args)
+        frame = [parent] + args[:count] + locals
+        result = NULL
+        for statement in body:
+            result = statement(frame)
+        return result
+
+    return call
+
+
+def _memoized(fn: FunctionValue, call: Callable) -> Callable:
+    memo = fn.memo
+
+    def call_memoized(args: List[RuntimeVal]) -> RuntimeVal:
+        key = memo_key(args)
+        if key is not None:
+            cached = memo.get(key)
+            if cached is not None:
+                return cached
+        result = call(args)
+        if key is not None:
+            memo.put(key, result)
+        return result
+
+    return call_memoized
+
+
+# BUILTINS
+
+def _array(value: RuntimeVal, what: str) -> List[RuntimeVal]:
+    if type(value) is not ArrayVal:
+        raise ValueError(f"{what} must be an array, got {value.type}.")
+    return value.items
+
+
+def _arguments(args: List[RuntimeVal], name: str, count: int):
+    if len(args) < count:
+        raise ValueError(f"array.{name} expects {count} arguments, got {len(args)}.")
+
+
+def truthy(value: RuntimeVal) -> bool:
+    if type(value) is NullVal:
+        return False
+    if type(value) is BooleanVal:
+        return value.value
+    if type(value) is NumberVal:
+        return value.value != 0
+    return True
+
+
+def array_len(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "len", 1)
+    return MK_NUMBER(len(_array(args[0], "array.len argument")))
+
+
+def array_push(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "push", 1)
+    items = _array(args[0], "array.push array")
+    items.extend(args[1:])
+    return MK_NUMBER(len(items))
+
+
+def array_pop(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "pop", 1)
+    items = _array(args[0], "array.pop argument")
+    return items.pop() if items else NULL
+
+
+def array_map(args: List[RuntimeVal], env) -> RuntimeVal:
+    _arguments(args, "map", 2)
+    items = _array(args[0], "array.map array")[:]
+    call = bind_function(args[1], env)
+    return MK_ARRAY([call([item, MK_NUMBER(i)]) for i, item in enumerate(items)])
+
+
+def array_filter(args: List[RuntimeVal], env) -> RuntimeVal:
+    _arguments(args, "filter", 2)
+    items = _array(args[0], "array.filter array")[:]
+    call = bind_function(args[1], env)
+    return MK_ARRAY([item for i, item in enumerate(items) if truthy(call([item, MK_NUMBER(i)]))])
+
+
+def array_reduce(args: List[RuntimeVal], env) -> RuntimeVal:
+    _arguments(args, "reduce", 2)
+    items = _array(args[0], "array.reduce array")[:]
+    call = bind_function(args[1], env)
+    if len(args) > 2:
+        acc = args[2]
+        start = 0
+    elif items:
+        acc = items[0]
+        start = 1
+    else:
+        raise ValueError("array.reduce of an empty array needs an initial value.")
+
+    for i in range(start, len(items)):
+        acc = call([acc, items[i], MK_NUMBER(i)])
+    return acc
+
+
+def _number_order(value: NumberVal):
+    # nan sorts last.
+    number = value.value
+    return number != number, number
+
+
+def array_sort(args: List[RuntimeVal], env) -> RuntimeVal:
+    _arguments(args, "sort", 1)
+    items = _array(args[0], "array.sort array")
+
+    if len(args) < 2:
+        for item in items:
+            if type(item) is not NumberVal:
+                raise ValueError(f"array.sort without a comparator needs numbers, got {item.type}.")
+        items.sort(key=_number_order)
+        return args[0]
+
+    call = bind_function(args[1], env)
+
+    def compare(a: RuntimeVal, b: RuntimeVal) -> int:
+        result = call([a, b])
+        if type(result) is not NumberVal:
+            raise ValueError(f"array.sort comparator must return a number, got {result.type}.")
+        return (result.value > 0) - (result.value < 0)
+
+    # Sorted into a new list, the comparator may read the array meanwhile.
+    items[:] = sorted(items, key=cmp_to_key(compare))
+    return args[0]
+
+
+ARRAY = ObjectVal({
+    "len": MK_NATIVE_FN(array_len),
+    "push": MK_NATIVE_FN(array_push),
+    "pop": MK_NATIVE_FN(array_pop),
+    "map": MK_NATIVE_FN(array_map),
+    "filter": MK_NATIVE_FN(array_filter),
+    "reduce": MK_NATIVE_FN(array_reduce),
+    "sort": MK_NATIVE_FN(array_sort),
+})
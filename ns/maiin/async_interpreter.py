@@ -0,0 +1,238 @@
+import asyncio
+from typing import Callable, Dict, List
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    Identifier,
+    MemberExpr,
+    ObjectLiteral,
+    Program,
+    Stmt,
+    VarDeclaration,
+)
+from maiin.environment import GATHER, Environment
+from maiin.interpreter import evaluate
+from maiin.eval.expressions import (
+    assign_variable,
+    call_function,
+    eval_numeric_binary_expr,
+    function_scope,
+    shorthand_value,
+)
+from maiin.eval.statements import declare_variable
+from maiin.arrays import not_assignable, read_computed, write_computed
+from maiin.memo import memo_key
+from maiin.shapes import literal_site, member_cache
+from maiin.vectors import vector_binary
+from maiin.values import (
+    MK_ARRAY,
+    MK_NULL,
+    NumberVal,
+    RuntimeVal,
+)
+
+# Async twin of maiin/interpreter.py. Native functions may return awaitables
+# (e.g. be `async def`), which are awaited before the value is used, so a
+# script waiting on I/O only blocks its own task. Any number of programs,
+# each with its own Environment, can be evaluated on one event loop:
+#
+#   await asyncio.gather(evaluate_async(a, createGlobalEnv()),
+#                        evaluate_async(b, createGlobalEnv()))
+#
+# `gather(x(), y(), ...)` evaluates its arguments concurrently here and
+# returns them in an object keyed "0", "1", ... Everywhere else arguments are
+# evaluated left to right like the synchronous evaluator does.
+#
+# Only a call can hand back an awaitable, so a node without calls inside
+# (node.awaits, worked out on its first evaluation) goes to the tree
+# walker's `evaluate`, and so does a call of a function whose body makes no
+# calls. Those get cells, memoized results and tiered code from the tree
+# walker. The handlers below cover the nodes on the way to a call, they
+# evaluate the children in the same order as the tree walker's and share
+# its helpers for the rest.
+
+
+async def evaluate_async(astNode: Stmt, env: Environment) -> RuntimeVal:
+    awaits = astNode.awaits
+    if awaits is None:
+        awaits = mark_awaits(astNode)
+    if not awaits:
+        return evaluate(astNode, env)
+    return await ASYNC_HANDLERS[type(astNode)](astNode, env)
+
+
+# The nodes each kind of node evaluates. A function declaration evaluates
+# nothing, its body runs when the function is called.
+CHILDREN: Dict[type, Callable[[Stmt], List[Stmt]]] = {
+    Program: lambda node: node.body,
+    VarDeclaration: lambda node: [node.value] if node.value else [],
+    AssignmentExpr: lambda node: [node.assigne, node.value],
+    BinaryExpr: lambda node: [node.left, node.right],
+    MemberExpr: lambda node: [node.object, node.property],
+    ObjectLiteral: lambda node: [prop.value for prop in node.properties if prop.value is not None],
+    ArrayLiteral: lambda node: node.elements,
+}
+
+
+# Sets node.awaits: whether evaluating node may call a function.
+def mark_awaits(node: Stmt) -> bool:
+    if type(node) is CallExpr:
+        node.awaits = True
+        return True
+    children = CHILDREN.get(type(node))
+    awaits = False
+    if children is not None:
+        for child in children(node):
+            child_awaits = child.awaits
+            if child_awaits is None:
+                child_awaits = mark_awaits(child)
+            awaits = awaits or child_awaits
+    node.awaits = awaits
+    return awaits
+
+
+def body_awaits(body: List[Stmt]) -> bool:
+    for statement in body:
+        awaits = statement.awaits
+        if awaits is None:
+            awaits = mark_awaits(statement)
+        if awaits:
+            return True
+    return False
+
+
+async def eval_body_async(body: List[Stmt], env: Environment) -> RuntimeVal:
+    last_evaluated = MK_NULL()
+    for statement in body:
+        last_evaluated = await evaluate_async(statement, env)
+    return last_evaluated
+
+
+async def eval_program_async(program: Program, env: Environment) -> RuntimeVal:
+    return await eval_body_async(program.body, env)
+
+
+async def eval_var_declaration_async(declaration: VarDeclaration, env: Environment) -> RuntimeVal:
+    value = await evaluate_async(declaration.value, env) if declaration.value else MK_NULL()
+    return declare_variable(declaration, value, env)
+
+
+async def eval_binary_expr_async(binop: BinaryExpr, env: Environment) -> RuntimeVal:
+    lhs = await evaluate_async(binop.left, env)
+    rhs = await evaluate_async(binop.right, env)
+
+    if type(lhs) is NumberVal and type(rhs) is NumberVal:
+        return eval_numeric_binary_expr(lhs, rhs, binop.operator)
+    return vector_binary(lhs, rhs, binop.operator)
+
+
+async def eval_assignment_async(node: AssignmentExpr, env: Environment) -> RuntimeVal:
+    if node.assigne.kind == "MemberExpr":
+        member = node.assigne
+        target = await evaluate_async(member.object, env)
+        if not member.computed:
+            await evaluate_async(node.value, env)
+            raise not_assignable(member.property.symbol, target)
+        key = await evaluate_async(member.property, env)
+        return write_computed(target, key, await evaluate_async(node.value, env))
+    if node.assigne.kind != "Identifier":
+        raise ValueError(f"Invalid LHS inside assignment expr: {node.assigne}")
+
+    return assign_variable(node, await evaluate_async(node.value, env), env)
+
+
+async def eval_object_expr_async(obj: ObjectLiteral, env: Environment) -> RuntimeVal:
+    site = obj.site
+    if site is None:
+        site = obj.site = literal_site(obj)
+
+    values = []
+    for prop in obj.properties:
+        if prop.value is None:
+            values.append(shorthand_value(prop, env))
+        else:
+            values.append(await evaluate_async(prop.value, env))
+
+    return site.build(values)
+
+
+async def eval_array_expr_async(node: ArrayLiteral, env: Environment) -> RuntimeVal:
+    return MK_ARRAY([await evaluate_async(element, env) for element in node.elements])
+
+
+async def eval_member_expr_async(expr: MemberExpr, env: Environment) -> RuntimeVal:
+    target = await evaluate_async(expr.object, env)
+    if expr.computed:
+        return read_computed(target, await evaluate_async(expr.property, env))
+
+    site = expr.site
+    if site is None:
+        site = expr.site = member_cache(expr)
+    return site.read(target)
+
+
+def is_gather(caller: Stmt, env: Environment) -> bool:
+    # Whether caller names the gather builtin. Looked up without raising,
+    # a missing name is reported in evaluation order later.
+    if not isinstance(caller, Identifier):
+        return False
+    scope = env
+    while scope is not None:
+        value = scope.variables.get(caller.symbol)
+        if value is not None:
+            return value is GATHER
+        scope = scope.parent
+    return False
+
+
+async def eval_call_expr_async(expr: CallExpr, env: Environment) -> RuntimeVal:
+    if is_gather(expr.caller, env):
+        args = await asyncio.gather(*(evaluate_async(arg, env) for arg in expr.args))
+    else:
+        args = [await evaluate_async(arg, env) for arg in expr.args]
+    fn = await evaluate_async(expr.caller, env)
+    return await call_function_async(fn, args, env)
+
+
+# call_function of the tree walker, awaiting what natives return and the
+# bodies making calls.
+async def call_function_async(fn: RuntimeVal, args: List[RuntimeVal], env: Environment) -> RuntimeVal:
+    if fn.type == "native-fn":
+        result = fn.call(args, env)
+        if not isinstance(result, RuntimeVal):
+            result = await result
+        return result
+
+    if fn.type == "function":
+        if not body_awaits(fn.body):
+            return call_function(fn, args, env)
+
+        key = None
+        if fn.memo is not None:
+            key = memo_key(args)
+            if key is not None:
+                cached = fn.memo.get(key)
+                if cached is not None:
+                    return cached
+
+        result = await eval_body_async(fn.body, function_scope(fn, args))
+
+        if key is not None:
+            fn.memo.put(key, result)
+        return result
+
+    raise ValueError("Cannot call value that is not a function: " + str(fn))
+
+
+ASYNC_HANDLERS = {
+    ObjectLiteral: eval_object_expr_async,
+    ArrayLiteral: eval_array_expr_async,
+    CallExpr: eval_call_expr_async,
+    MemberExpr: eval_member_expr_async,
+    AssignmentExpr: eval_assignment_async,
+    BinaryExpr: eval_binary_expr_async,
+    Program: eval_program_async,
+    VarDeclaration: eval_var_declaration_async,
+}
@@ -0,0 +1,267 @@
+from typing import Dict, List, Optional, Set
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    FunctionDeclaration,
+    Identifier,
+    MemberExpr,
+    ObjectLiteral,
+    Program,
+    Stmt,
+    VarDeclaration,
+)
+from maiin.environment import Environment
+from maiin.values import RuntimeVal
+
+# Capture analysis: a function declared inside another function keeps only
+# its free variables instead of the whole defining Environment chain, so
+# closures no longer hold on to scopes (and the objects in them) they never
+# use.
+#
+#   analyze_captures(program)
+#   evaluate(program, createGlobalEnv())
+#
+# A captured function gets a small Environment holding the variables it
+# reads from enclosing function scopes, whose parent is the program scope:
+# program level names are looked up there at call time as before. Values
+# are copied when the function is created. A captured variable that is
+# assigned anywhere lives in a Cell instead, shared by the defining scope
+# and every closure capturing it, so assignments stay visible both ways.
+#
+# A function keeps its whole defining Environment, as without the
+# analysis, when a name it captures may not be declared yet when it is
+# created (except its own name, for recursion).
+#
+# It annotates the AST in place, see the `cell`, `captures`, `cells` and
+# `program_depth` attributes in src/ast_1.py. The tree and closure backends
+# use the annotations, the other backends ignore them.
+
+
+class Cell:
+    __slots__ = ("value",)
+
+    def __init__(self, value: RuntimeVal):
+        self.value = value
+
+
+class Binding:
+    __slots__ = ("node", "parameter", "captured", "assigned")
+
+    def __init__(self, node: Stmt, parameter: bool):
+        # VarDeclaration or FunctionDeclaration declaring the name, for a
+        # parameter the function.
+        self.node = node
+        self.parameter = parameter
+        self.captured = False
+        self.assigned = False
+
+    @property
+    def is_cell(self) -> bool:
+        if not (self.captured and self.assigned):
+            return False
+        # Consts and functions cannot be assigned, the assignment raises.
+        return self.parameter or (isinstance(self.node, VarDeclaration) and not self.node.constant)
+
+
+class CaptureScope:
+    def __init__(self, parent: Optional["CaptureScope"], function: Optional[FunctionDeclaration]):
+        self.parent = parent
+        self.function = function  # None for the program scope.
+        # Every name declared anywhere in the scope.
+        self.bindings: Dict[str, Binding] = {}
+        # Names declared so far, in statement order.
+        self.declared: Set[str] = set()
+        # What the parent scope had declared when the function was created.
+        self.snapshot: Set[str] = set()
+        self.captures: Dict[str, Binding] = {}
+        # Keeps the whole defining Environment.
+        self.dynamic = False
+
+
+class CaptureAnalysis:
+    def analyze(self, program: Program) -> Program:
+        self.functions: List[CaptureScope] = []
+        # (node, bindings the name may refer to) of every read and assignment.
+        self.references: List[tuple] = []
+
+        scope = CaptureScope(None, None)
+        self.visit_body(program.body, scope)
+
+        for function in self.functions:
+            if not function.dynamic and function.parent.function is not None:
+                for binding in function.captures.values():
+                    binding.captured = True
+
+        for function in self.functions:
+            declaration = function.function
+            trimmed = not function.dynamic and function.parent.function is not None
+            declaration.captures = tuple(sorted(function.captures)) if trimmed else None
+            declaration.program_depth = program_depth(function.parent)
+            declaration.cells = tuple(
+                name for name in declaration.parameters
+                if function.bindings[name].node is declaration and function.bindings[name].is_cell
+            )
+            for stmt in declaration.body:
+                if isinstance(stmt, VarDeclaration):
+                    binding = function.bindings.get(stmt.identifier)
+                    stmt.cell = binding is not None and binding.node is stmt and binding.is_cell
+
+        for node, bindings in self.references:
+            node.cell = any(binding.is_cell for binding in bindings)
+        return program
+
+    def visit_body(self, body: List[Stmt], scope: CaptureScope):
+        for stmt in body:
+            self.visit(stmt, scope)
+
+    def visit(self, node: Stmt, scope: CaptureScope):
+        if isinstance(node, Identifier):
+            self.reference(node, node.symbol, scope, False)
+        elif isinstance(node, BinaryExpr):
+            self.visit(node.left, scope)
+            self.visit(node.right, scope)
+        elif isinstance(node, CallExpr):
+            for arg in node.args:
+                self.visit(arg, scope)
+            self.visit(node.caller, scope)
+        elif isinstance(node, AssignmentExpr):
+            if isinstance(node.assigne, MemberExpr):
+                self.visit(node.assigne, scope)
+            self.visit(node.value, scope)
+            if isinstance(node.assigne, Identifier):
+                self.reference(node, node.assigne.symbol, scope, True)
+        elif isinstance(node, ObjectLiteral):
+            for prop in node.properties:
+                if prop.value is None:
+                    self.reference(prop, prop.key, scope, False)
+                else:
+                    self.visit(prop.value, scope)
+        elif isinstance(node, ArrayLiteral):
+            for element in node.elements:
+                self.visit(element, scope)
+        elif isinstance(node, MemberExpr):
+            self.visit(node.object, scope)
+            if node.computed:
+                self.visit(node.property, scope)
+        elif isinstance(node, VarDeclaration):
+            if node.value is not None:
+                self.visit(node.value, scope)
+            scope.declared.add(node.identifier)
+        elif isinstance(node, FunctionDeclaration):
+            self.visit_function(node, scope)
+            scope.declared.add(node.name)
+
+    def visit_function(self, node: FunctionDeclaration, scope: CaptureScope):
+        body_scope = CaptureScope(scope, node)
+        body_scope.snapshot = set(scope.declared)
+        for name in node.parameters:
+            body_scope.bindings.setdefault(name, Binding(node, True))
+        for stmt in node.body:
+            if isinstance(stmt, VarDeclaration):
+                body_scope.bindings.setdefault(stmt.identifier, Binding(stmt, False))
+            elif isinstance(stmt, FunctionDeclaration):
+                body_scope.bindings.setdefault(stmt.name, Binding(stmt, False))
+        body_scope.declared.update(node.parameters)
+        self.functions.append(body_scope)
+        self.visit_body(node.body, body_scope)
+
+    def reference(self, node: Stmt, name: str, scope: CaptureScope, assign: bool):
+        # Walks the function scopes out to the binding of name. Every
+        # function left on the way captures it; when the binding may not be
+        # declared yet the lookup can go on to an outer binding, so those
+        # functions keep their whole Environment instead.
+        candidates = []
+        crossed: List[CaptureScope] = []
+        definite = False
+        current = scope
+        while current.function is not None and not definite:
+            binding = current.bindings.get(name)
+            if binding is not None:
+                if not crossed:
+                    definite = name in current.declared
+                else:
+                    outermost = crossed[-1]
+                    definite = name in outermost.snapshot or binding.node is outermost.function
+                if candidates or not definite:
+                    for function in crossed:
+                        function.dynamic = True
+                candidates.append(binding)
+                if assign:
+                    binding.assigned = True
+                if definite:
+                    for function in crossed:
+                        function.captures[name] = binding
+            crossed.append(current)
+            current = current.parent
+
+        if candidates:
+            self.references.append((node, candidates))
+
+
+def program_depth(scope: CaptureScope) -> int:
+    # Parent hops from an Environment of scope to the program scope.
+    if scope.function is None:
+        return 0
+    function = scope
+    if not function.dynamic and function.parent.function is not None:
+        # Call scope -> captured Environment -> program scope.
+        return 2
+    return 1 + program_depth(function.parent)
+
+
+def analyze_captures(program: Program) -> Program:
+    return CaptureAnalysis().analyze(program)
+
+
+# RUNTIME
+
+# The declarationEnv of a function created from declaration inside env.
+def capture_environment(declaration: FunctionDeclaration, env: Environment) -> Environment:
+    program = env
+    for _ in range(declaration.program_depth):
+        program = program.parent
+
+    closure = Environment(program)
+    variables = closure.variables
+    for name in declaration.captures:
+        if name == declaration.name:
+            # Declared right after the function is created, see bind_self.
+            continue
+        scope = env.resolve(name)
+        variables[name] = scope.variables[name]
+        if name in scope.constants:
+            closure.constants.add(name)
+    return closure
+
+
+def bind_self(declaration: FunctionDeclaration, fn: RuntimeVal):
+    # A function calling itself captures its own name.
+    if declaration.name in declaration.captures:
+        fn.declarationEnv.variables[declaration.name] = fn
+        fn.declarationEnv.constants.add(declaration.name)
+
+
+def read_cell(value) -> RuntimeVal:
+    return value.value if type(value) is Cell else value
+
+
+def assign_cell(env: Environment, varname: str, value: RuntimeVal) -> RuntimeVal:
+    # Environment.assignVar for a variable that may live in a Cell.
+    scope = env.resolve(varname)
+    if varname in scope.constants:
+        raise Exception(f"Cannot reassign to variable {varname} as it was declared constant.")
+    current = scope.variables[varname]
+    if type(current) is Cell:
+        current.value = value
+    else:
+        scope.variables[varname] = value
+    return value
+
+
+def make_cells(scope: Environment, names) -> None:
+    # Moves the parameters in names into Cells after a call declared them.
+    variables = scope.variables
+    for name in names:
+        variables[name] = Cell(variables[name])
@@ -0,0 +1,769 @@
+import operator
+from typing import Callable, Dict, List, Optional
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    FunctionDeclaration,
+    Identifier,
+    MemberExpr,
+    NumericLiteral,
+    ObjectLiteral,
+    Program,
+    Stmt,
+    VarDeclaration,
+)
+from src.parser_1 import is_unparsed
+from maiin.environment import Environment
+from maiin.memo import LRUCache, memo_key
+from maiin.arrays import not_assignable, read_computed, write_computed
+from maiin.captures import Cell, assign_cell, bind_self, capture_environment, make_cells, read_cell
+from maiin.vectors import vector_binary
+from maiin.shapes import MISSING, literal_site, member_cache, not_an_object
+from maiin.values import (
+    FunctionValue,
+    MK_ARRAY,
+    MK_NULL,
+    MK_NUMBER,
+    NULL,
+    NativeFnValue,
+    NumberVal,
+    ObjectVal,
+    RuntimeVal,
+    interned_number,
+)
+
+# A compiled node: evaluates the node it was built from inside `env`.
+Compiled = Callable[[Environment], RuntimeVal]
+
+# Closure compilation turns every AST node into a Python closure once, so
+# running a program only calls closures instead of re-dispatching
+# `evaluate` on every node visit. Semantics match maiin/interpreter.py.
+#
+# Scopes stay Environments (natives, captures and the array builtins are
+# handed them), but names a body has already declared, its parameters and
+# the let/const of earlier statements, are known to be in the scope the
+# body runs in: they are read and assigned on env.variables directly
+# instead of walking the scope chain.
+
+
+def compile_program(program: Program) -> Compiled:
+    return ClosureCompiler().compile_program(program)
+
+
+# Runs a program annotated by maiin/resolver.py. The returned callable still
+# takes the global Environment.
+def compile_resolved_program(program: Program) -> Compiled:
+    return SlotCompiler().compile_program(program)
+
+
+# BINARY EXPRESSIONS
+# Every operator gets its own closure so the operator is never compared at
+# runtime. Numeric literal operands are captured as plain numbers and
+# combined with the functions of the operator module, which need no Python
+# frame of their own.
+
+def _binary_add(left: Compiled, right: Compiled) -> Compiled:
+    def run_add(env: Environment) -> RuntimeVal:
+        lhs = left(env)
+        rhs = right(env)
+        if type(lhs) is NumberVal and type(rhs) is NumberVal:
+            value = lhs.value + rhs.value
+            return (type(value) is int and interned_number(value)) or NumberVal(value)
+        return vector_binary(lhs, rhs, "+")
+
+    return run_add
+
+
+def _binary_sub(left: Compiled, right: Compiled) -> Compiled:
+    def run_sub(env: Environment) -> RuntimeVal:
+        lhs = left(env)
+        rhs = right(env)
+        if type(lhs) is NumberVal and type(rhs) is NumberVal:
+            value = lhs.value - rhs.value
+            return (type(value) is int and interned_number(value)) or NumberVal(value)
+        return vector_binary(lhs, rhs, "-")
+
+    return run_sub
+
+
+def _binary_mul(left: Compiled, right: Compiled) -> Compiled:
+    def run_mul(env: Environment) -> RuntimeVal:
+        lhs = left(env)
+        rhs = right(env)
+        if type(lhs) is NumberVal and type(rhs) is NumberVal:
+            value = lhs.value * rhs.value
+            return (type(value) is int and interned_number(value)) or NumberVal(value)
+        return vector_binary(lhs, rhs, "*")
+
+    return run_mul
+
+
+def _binary_div(left: Compiled, right: Compiled) -> Compiled:
+    def run_div(env: Environment) -> RuntimeVal:
+        lhs = left(env)
+        rhs = right(env)
+        if type(lhs) is NumberVal and type(rhs) is NumberVal:
+            value = lhs.value / rhs.value
+            return (type(value) is int and interned_number(value)) or NumberVal(value)
+        return vector_binary(lhs, rhs, "/")
+
+    return run_div
+
+
+def _binary_mod(left: Compiled, right: Compiled) -> Compiled:
+    def run_mod(env: Environment) -> RuntimeVal:
+        lhs = left(env)
+        rhs = right(env)
+        if type(lhs) is NumberVal and type(rhs) is NumberVal:
+            value = lhs.value % rhs.value
+            return (type(value) is int and interned_number(value)) or NumberVal(value)
+        return vector_binary(lhs, rhs, "%")
+
+    return run_mod
+
+
+def _binary_const_left(value: float, right: Compiled, op: Callable[[float, float], float], operator: str) -> Compiled:
+    number = MK_NUMBER(value)
+
+    def run_const_left(env: Environment) -> RuntimeVal:
+        rhs = right(env)
+        if type(rhs) is NumberVal:
+            result = op(value, rhs.value)
+            return (type(result) is int and interned_number(result)) or NumberVal(result)
+        return vector_binary(number, rhs, operator)
+
+    return run_const_left
+
+
+def _binary_const_right(left: Compiled, value: float, op: Callable[[float, float], float], operator: str) -> Compiled:
+    number = MK_NUMBER(value)
+
+    def run_const_right(env: Environment) -> RuntimeVal:
+        lhs = left(env)
+        if type(lhs) is NumberVal:
+            result = op(lhs.value, value)
+            return (type(result) is int and interned_number(result)) or NumberVal(result)
+        return vector_binary(lhs, number, operator)
+
+    return run_const_right
+
+
+def _binary_const(lhs: float, rhs: float, op: Callable[[float, float], float]) -> Compiled:
+    try:
+        value = op(lhs, rhs)
+    except ArithmeticError:
+        # Leave the error (division by zero, an int too large for `/`) to
+        # runtime, like the tree walker.
+        def run_const_error(env: Environment) -> RuntimeVal:
+            return MK_NUMBER(op(lhs, rhs))
+
+        return run_const_error
+
+    number = MK_NUMBER(value)
+
+    def run_const(env: Environment) -> RuntimeVal:
+        return number
+
+    return run_const
+
+
+BINARY_OPERATIONS: Dict[str, Callable[[float, float], float]] = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+}
+
+BINARY_COMPILERS: Dict[str, Callable[[Compiled, Compiled], Compiled]] = {
+    "+": _binary_add,
+    "-": _binary_sub,
+    "*": _binary_mul,
+    "/": _binary_div,
+}
+
+
+class ClosureCompiler:
+    def __init__(self):
+        self.compilers: Dict[type, Callable[[Stmt], Compiled]] = {
+            NumericLiteral: self.compile_numeric_literal,
+            Identifier: self.compile_identifier,
+            ObjectLiteral: self.compile_object_expr,
+            ArrayLiteral: self.compile_array_expr,
+            CallExpr: self.compile_call_expr,
+            AssignmentExpr: self.compile_assignment,
+            BinaryExpr: self.compile_binary_expr,
+            VarDeclaration: self.compile_var_declaration,
+            FunctionDeclaration: self.compile_function_declaration,
+            MemberExpr: self.compile_member_expr,
+        }
+        # Names the scope being compiled has declared so far, with whether
+        # they are const. None outside of compile_scope.
+        self.declared: Optional[Dict[str, bool]] = None
+
+    def compile_program(self, program: Program) -> Compiled:
+        body = self.compile_scope(program.body)
+
+        def run_program(env: Environment) -> RuntimeVal:
+            last_evaluated = MK_NULL()
+            for statement in body:
+                last_evaluated = statement(env)
+            return last_evaluated
+
+        return run_program
+
+    def compile_block(self, body: List[Stmt]) -> List[Compiled]:
+        return [self.compile_node(stmt) for stmt in body]
+
+    # Compiles the statements of a program or function body, noting the
+    # names each one declares for the statements after it. Only the first
+    # declaration of a name binds it, a later one raises when it runs.
+    def compile_scope(self, body: List[Stmt], parameters: List[str] = ()) -> List[Compiled]:
+        declared = self.declared = dict.fromkeys(parameters, False)
+        compiled = []
+        for stmt in body:
+            compiled.append(self.compile_node(stmt))
+            if isinstance(stmt, VarDeclaration):
+                declared.setdefault(stmt.identifier, stmt.constant)
+            elif isinstance(stmt, FunctionDeclaration):
+                declared.setdefault(stmt.name, True)
+        self.declared = None
+        return compiled
+
+    def compile_node(self, node: Stmt) -> Compiled:
+        compiler = self.compilers.get(type(node))
+        if compiler is None:
+            return self.compile_unsupported(node)
+        return compiler(node)
+
+    def compile_unsupported(self, node: Stmt) -> Compiled:
+        def run_unsupported(env: Environment) -> RuntimeVal:
+            print(
+                "This AST Node has not yet been set up for interpretation.\n",
+                node
+            )
+            exit(0)
+
+        return run_unsupported
+
+    def compile_numeric_literal(self, node: NumericLiteral) -> Compiled:
+        # Values are immutable, every run returns the same NumberVal.
+        number = MK_NUMBER(node.value)
+
+        def run_numeric_literal(env: Environment) -> RuntimeVal:
+            return number
+
+        return run_numeric_literal
+
+    def compile_identifier(self, node: Identifier) -> Compiled:
+        symbol = node.symbol
+        if node.cell:
+            return lambda env: read_cell(env.lookupVar(symbol))
+        if self.declared and symbol in self.declared:
+            return lambda env: env.variables[symbol]
+
+        # Same as env.lookupVar(symbol), with the scope chain walk inlined.
+        def run_identifier(env: Environment) -> RuntimeVal:
+            scope = env
+            while scope is not None:
+                variables = scope.variables
+                if symbol in variables:
+                    return variables[symbol]
+                scope = scope.parent
+            return env.lookupVar(symbol)
+
+        return run_identifier
+
+    def compile_binary_expr(self, node: BinaryExpr) -> Compiled:
+        # Any other operator is treated as modulo, see eval_numeric_binary_expr.
+        op = BINARY_OPERATIONS.get(node.operator, operator.mod)
+        left_const = isinstance(node.left, NumericLiteral)
+        right_const = isinstance(node.right, NumericLiteral)
+
+        if left_const and right_const:
+            return _binary_const(node.left.value, node.right.value, op)
+        if left_const:
+            return _binary_const_left(node.left.value, self.compile_node(node.right), op, node.operator)
+        if right_const:
+            return _binary_const_right(self.compile_node(node.left), node.right.value, op, node.operator)
+
+        binary = BINARY_COMPILERS.get(node.operator, _binary_mod)
+        return binary(self.compile_node(node.left), self.compile_node(node.right))
+
+    def compile_assignment(self, node: AssignmentExpr) -> Compiled:
+        if isinstance(node.assigne, MemberExpr):
+            return self.compile_member_assignment(node)
+        if not isinstance(node.assigne, Identifier):
+            return self.compile_invalid_assignment(node)
+
+        varname = node.assigne.symbol
+        value = self.compile_node(node.value)
+        if node.cell:
+            return lambda env: assign_cell(env, varname, value(env))
+
+        if self.declared and self.declared.get(varname) is False:
+            def run_local_assignment(env: Environment) -> RuntimeVal:
+                result = env.variables[varname] = value(env)
+                return result
+
+            return run_local_assignment
+
+        def run_assignment(env: Environment) -> RuntimeVal:
+            return env.assignVar(varname, value(env))
+
+        return run_assignment
+
+    def compile_invalid_assignment(self, node: AssignmentExpr) -> Compiled:
+        def run_invalid_assignment(env: Environment) -> RuntimeVal:
+            raise ValueError(f"Invalid LHS inside assignment expr: {node.assigne}")
+
+        return run_invalid_assignment
+
+    # Evaluates the object, the key and then the value.
+    def compile_member_assignment(self, node: AssignmentExpr) -> Compiled:
+        member = node.assigne
+        target = self.compile_node(member.object)
+        value = self.compile_node(node.value)
+
+        if not member.computed:
+            name = member.property.symbol
+
+            def run_property_assignment(env: Environment) -> RuntimeVal:
+                obj = target(env)
+                value(env)
+                raise not_assignable(name, obj)
+
+            return run_property_assignment
+
+        key = self.compile_node(member.property)
+
+        def run_computed_assignment(env: Environment) -> RuntimeVal:
+            obj = target(env)
+            return write_computed(obj, key(env), value(env))
+
+        return run_computed_assignment
+
+    def compile_array_expr(self, node: ArrayLiteral) -> Compiled:
+        elements = self.compile_block(node.elements)
+
+        def run_array_expr(env: Environment) -> RuntimeVal:
+            return MK_ARRAY([element(env) for element in elements])
+
+        return run_array_expr
+
+    def compile_object_expr(self, node: ObjectLiteral) -> Compiled:
+        # (key, compiled value) pairs. Shorthand properties have no value and
+        # are looked up by key, unless the variable may be a Cell.
+        properties = [
+            (prop.key, self.compile_node(prop.value) if prop.value is not None else
+             (lambda env, key=prop.key: read_cell(env.lookupVar(key))) if prop.cell else None)
+            for prop in node.properties
+        ]
+
+        build = literal_site(node).build
+
+        def run_object_expr(env: Environment) -> RuntimeVal:
+            return build([env.lookupVar(key) if value is None else value(env) for key, value in properties])
+
+        return run_object_expr
+
+    # Compiled form of a function, stored in FunctionValue.code:
+    # (compiled body, whether all parameter names are distinct). Bodies are
+    # compiled on their first call, possibly by several threads at once
+    # (maiin/embedding.py), so each gets a compiler of its own.
+    def compile_function_body(self, parameters: List[str], body: List[Stmt]):
+        return type(self)().compile_scope(body, parameters), len(set(parameters)) == len(parameters)
+
+    def compile_call_expr(self, node: CallExpr) -> Compiled:
+        args = self.compile_block(node.args)
+        caller = self.compile_node(node.caller)
+        compile_function_body = self.compile_function_body
+
+        def run_call_expr(env: Environment) -> RuntimeVal:
+            values = [arg(env) for arg in args]
+            fn = caller(env)
+
+            if type(fn) is NativeFnValue:
+                return fn.call(values, env)
+
+            if type(fn) is FunctionValue:
+                key = None
+                if fn.memo is not None:
+                    key = memo_key(values)
+                    if key is not None:
+                        cached = fn.memo.get(key)
+                        if cached is not None:
+                            return cached
+
+                code = fn.code
+                if type(code) is not tuple:
+                    code = fn.code = compile_function_body(fn.parameters, fn.body)
+                body, unique_parameters = code
+
+                scope = Environment(fn.declarationEnv)
+                parameters = fn.parameters
+                if unique_parameters:
+                    # A fresh scope cannot hold duplicates, so the parameters
+                    # are stored directly.
+                    variables = scope.variables
+                    for i in range(len(parameters)):
+                        variables[parameters[i]] = values[i]
+                else:
+                    for i in range(len(parameters)):
+                        scope.declareVar(parameters[i], values[i], False)
+                if fn.cells:
+                    make_cells(scope, fn.cells)
+
+                result = MK_NULL()
+                for statement in body:
+                    result = statement(scope)
+                if key is not None:
+                    fn.memo.put(key, result)
+                return result
+
+            raise ValueError("Cannot call value that is not a function: " + str(fn))
+
+        return run_call_expr
+
+    def compile_var_declaration(self, node: VarDeclaration) -> Compiled:
+        identifier = node.identifier
+        constant = node.constant
+        value = None if node.value is None else self.compile_node(node.value)
+
+        if node.cell:
+            def run_cell_declaration(env: Environment) -> RuntimeVal:
+                result = value(env) if value else MK_NULL()
+                env.declareVar(identifier, Cell(result), constant)
+                return result
+
+            return run_cell_declaration
+
+        def run_var_declaration(env: Environment) -> RuntimeVal:
+            return env.declareVar(identifier, value(env) if value else MK_NULL(), constant)
+
+        return run_var_declaration
+
+    def compile_function_declaration(self, node: FunctionDeclaration) -> Compiled:
+        name = node.name
+        parameters = node.parameters
+        body = node.body
+        compile_function_body = self.compile_function_body
+        memoize = node.memoize
+        captured = node.captures is not None
+        cells = node.cells
+        # The body is compiled on the first call and shared between every
+        # FunctionValue created from this declaration.
+        code = []
+
+        def run_function_declaration(env: Environment) -> RuntimeVal:
+            # A body the lazy parser skipped is left to the first call.
+            if not code and not is_unparsed(body):
+                code.append(compile_function_body(parameters, body))
+
+            fn = FunctionValue(
+                name=name,
+                parameters=parameters,
+                declarationEnv=capture_environment(node, env) if captured else env,
+                body=body,
+            )
+            fn.cells = cells
+            if code:
+                fn.code = code[0]
+            if memoize:
+                fn.memo = LRUCache(memoize)
+            env.declareVar(name, fn, True)
+            if captured:
+                bind_self(node, fn)
+            return fn
+
+        return run_function_declaration
+
+    def compile_member_expr(self, node: MemberExpr) -> Compiled:
+        target = self.compile_node(node.object)
+
+        if node.computed:
+            key = self.compile_node(node.property)
+
+            def run_computed_member(env: Environment) -> RuntimeVal:
+                obj = target(env)
+                return read_computed(obj, key(env))
+
+            return run_computed_member
+
+        # MemberCache.read, inlined. Every compile of the node gets its own
+        # cache.
+        cache = member_cache(node)
+        lookup = cache.lookup
+        key = cache.key
+
+        def run_member(env: Environment) -> RuntimeVal:
+            obj = target(env)
+            if type(obj) is not ObjectVal:
+                raise not_an_object(key, obj)
+            shape = obj.shape
+            entry = cache.entry
+            index = entry[1] if entry[0] is shape else lookup(shape)
+            return NULL if index == MISSING else obj.values[index]
+
+        return run_member
+
+
+# SLOT FRAMES
+# Resolved programs keep variables in lists instead of Environments:
+# frame[0] is the parent frame (the global Environment for the global frame)
+# and frame[slot] holds a variable. Slots of names that have not been
+# declared yet hold UNSET.
+UNSET = object()
+
+
+def root_env(frame: list) -> Environment:
+    while type(frame) is list:
+        frame = frame[0]
+    return frame
+
+
+def _unresolved(symbol: str) -> Exception:
+    return Exception(f"Cannot resolve '{symbol}' as it does not exist.")
+
+
+def _redeclared(name: str) -> Exception:
+    return Exception(f"Cannot declare variable {name}. As it already is defined.")
+
+
+# Compiled form of a function, stored in FunctionValue.code.
+class SlotFunction:
+    __slots__ = ("body", "parameter_count", "locals")
+
+    def __init__(self, body: List[Compiled], parameter_count: int, frame_size: int):
+        self.body = body
+        self.parameter_count = parameter_count
+        # Initial value of the slots after the parameters.
+        self.locals = [UNSET] * (frame_size - 1 - parameter_count)
+
+
+class SlotCompiler(ClosureCompiler):
+    def compile_program(self, program: Program) -> Compiled:
+        body = self.compile_block(program.body)
+        global_names = program.global_names
+        builtin_names = global_names[:program.builtin_count]
+        declared_count = len(global_names) - program.builtin_count
+        global_constants = {
+            stmt.identifier if isinstance(stmt, VarDeclaration) else stmt.name
+            for stmt in program.body
+            if isinstance(stmt, FunctionDeclaration)
+            or (isinstance(stmt, VarDeclaration) and stmt.constant)
+        }
+
+        def run_program(env: Environment) -> RuntimeVal:
+            frame = [env]
+            for name in builtin_names:
+                if name not in env.variables:
+                    raise _unresolved(name)
+                frame.append(env.variables[name])
+            frame += [UNSET] * declared_count
+
+            try:
+                last_evaluated = MK_NULL()
+                for statement in body:
+                    last_evaluated = statement(frame)
+                return last_evaluated
+            finally:
+                # Publish the globals declared by the program on env.
+                for slot, name in enumerate(global_names, 1):
+                    if frame[slot] is not UNSET:
+                        env.variables[name] = frame[slot]
+                        if name in global_constants:
+                            env.constants.add(name)
+
+        return run_program
+
+    def compile_name_read(self, node: Stmt, symbol: str) -> Compiled:
+        depth = node.depth
+        slot = node.slot
+
+        if depth is None:
+            def run_unresolved(frame: list) -> RuntimeVal:
+                raise _unresolved(symbol)
+
+            return run_unresolved
+
+        if node.definite:
+            if depth == 0:
+                return lambda frame: frame[slot]
+            if depth == 1:
+                return lambda frame: frame[0][slot]
+            if depth == 2:
+                return lambda frame: frame[0][0][slot]
+
+            def run_deep_read(frame: list) -> RuntimeVal:
+                for _ in range(depth):
+                    frame = frame[0]
+                return frame[slot]
+
+            return run_deep_read
+
+        # The name may not be declared yet, try every candidate frame.
+        candidates = ((depth, slot),) + tuple((d, s) for d, s, _constant in node.fallbacks)
+
+        def run_dynamic_read(frame: list) -> RuntimeVal:
+            for depth, slot in candidates:
+                scope = frame
+                for _ in range(depth):
+                    scope = scope[0]
+                value = scope[slot]
+                if value is not UNSET:
+                    return value
+            raise _unresolved(symbol)
+
+        return run_dynamic_read
+
+    def compile_identifier(self, node: Identifier) -> Compiled:
+        return self.compile_name_read(node, node.symbol)
+
+    def compile_assignment(self, node: AssignmentExpr) -> Compiled:
+        if isinstance(node.assigne, MemberExpr):
+            return self.compile_member_assignment(node)
+        if not isinstance(node.assigne, Identifier):
+            return self.compile_invalid_assignment(node)
+
+        varname = node.assigne.symbol
+        value = self.compile_node(node.value)
+        slot = node.slot
+
+        if node.depth is None:
+            def run_unresolved_assignment(frame: list) -> RuntimeVal:
+                value(frame)
+                raise _unresolved(varname)
+
+            return run_unresolved_assignment
+
+        if node.depth == 0 and node.definite and not node.constant:
+            def run_local_assignment(frame: list) -> RuntimeVal:
+                result = frame[slot] = value(frame)
+                return result
+
+            return run_local_assignment
+
+        candidates = ((node.depth, slot, node.constant),) + node.fallbacks
+
+        def run_assignment(frame: list) -> RuntimeVal:
+            result = value(frame)
+            for depth, slot, constant in candidates:
+                scope = frame
+                for _ in range(depth):
+                    scope = scope[0]
+                if scope[slot] is not UNSET:
+                    if constant:
+                        raise Exception(f"Cannot reassign to variable {varname} as it was declared constant.")
+                    scope[slot] = result
+                    return result
+            raise _unresolved(varname)
+
+        return run_assignment
+
+    def compile_object_expr(self, node: ObjectLiteral) -> Compiled:
+        properties = [
+            (prop.key, self.compile_name_read(prop, prop.key) if prop.value is None else self.compile_node(prop.value))
+            for prop in node.properties
+        ]
+
+        build = literal_site(node).build
+
+        def run_object_expr(frame: list) -> RuntimeVal:
+            return build([value(frame) for _key, value in properties])
+
+        return run_object_expr
+
+    def compile_var_declaration(self, node: VarDeclaration) -> Compiled:
+        slot = node.slot
+        value = None if node.value is None else self.compile_node(node.value)
+
+        if slot is None:
+            name = node.identifier
+
+            def run_redeclaration(frame: list) -> RuntimeVal:
+                if value:
+                    value(frame)
+                raise _redeclared(name)
+
+            return run_redeclaration
+
+        def run_var_declaration(frame: list) -> RuntimeVal:
+            result = frame[slot] = value(frame) if value else MK_NULL()
+            return result
+
+        return run_var_declaration
+
+    def compile_function_declaration(self, node: FunctionDeclaration) -> Compiled:
+        name = node.name
+        parameters = node.parameters
+        body = node.body
+        slot = node.slot
+        frame_size = node.frame_size
+        compile_block = self.compile_block
+        # Shared between every FunctionValue created from this declaration.
+        code = []
+
+        def make_code() -> SlotFunction:
+            repeated = node.repeated
+            if repeated is None:
+                return SlotFunction(compile_block(body), len(parameters), frame_size)
+
+            # Like declaring the parameters one by one, a call missing the
+            # argument of the repeated parameter fails on that first.
+            def run_repeated(frame: list) -> RuntimeVal:
+                raise _redeclared(parameters[repeated])
+
+            return SlotFunction([run_repeated], repeated + 1, repeated + 2)
+
+        def run_function_declaration(frame: list) -> RuntimeVal:
+            if not code:
+                code.append(make_code())
+
+            fn = FunctionValue(
+                name=name,
+                parameters=parameters,
+                declarationEnv=frame,
+                body=body,
+            )
+            fn.code = code[0]
+            if slot is None:
+                raise _redeclared(name)
+            frame[slot] = fn
+            return fn
+
+        return run_function_declaration
+
+    def compile_call_expr(self, node: CallExpr) -> Compiled:
+        args = self.compile_block(node.args)
+        caller = self.compile_node(node.caller)
+
+        def run_call_expr(frame: list) -> RuntimeVal:
+            values = [arg(frame) for arg in args]
+            fn = caller(frame)
+
+            if type(fn) is NativeFnValue:
+                return fn.call(values, root_env(frame))
+
+            if type(fn) is FunctionValue:
+                code = fn.code
+                if type(code) is not SlotFunction:
+                    raise ValueError("Cannot call function compiled for another backend: " + fn.name)
+
+                count = code.parameter_count
+                if len(values) < count:
+                    raise IndexError("list index out of range")
+
+                callee = [fn.declarationEnv]
+                callee += values[:count] if len(values) > count else values
+                callee += code.locals
+
+                result = MK_NULL()
+                for statement in code.body:
+                    result = statement(callee)
+                return result
+
+            raise ValueError("Cannot call value that is not a function: " + str(fn))
+
+        return run_call_expr
@@ -0,0 +1,171 @@
+from array import array
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional
+from src.ast_1 import Program
+from src.optimizer import Optimizer
+from src.parser_1 import Parser
+from maiin.async_interpreter import evaluate_async
+from maiin.compiler import compile_program, compile_resolved_program
+from maiin.environment import Environment, createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.limits import LimitedInterpreter, Limits
+from maiin.resolver import resolve_program
+from maiin.vectors import make_vector, numpy
+from maiin.values import (
+    ArrayVal,
+    BooleanVal,
+    MK_ARRAY,
+    MK_BOOL,
+    MK_NATIVE_FN,
+    MK_NULL,
+    MK_NUMBER,
+    NativeFnValue,
+    NullVal,
+    NumberVal,
+    ObjectVal,
+    RuntimeVal,
+    VectorVal,
+)
+from maiin.vm.machine import execute
+from maiin.vm import bytecode
+
+# Embedding API: prepare a script once, run it many times.
+#
+#   rule = CompiledProgram(source, globals=("request",))
+#   for request in requests:
+#       result = to_host(rule.run({"request": request}))
+#
+# A CompiledProgram parses, optimizes and compiles once. Every run starts
+# from a copy of a prepared global Environment, with the host values of
+# that run declared as constants. Runs share nothing mutable, so the same
+# CompiledProgram can run on many threads at once, each run with its own
+# environment.
+
+EMBEDDING_BACKENDS = ("tree", "closure", "slots", "vm")
+
+
+# HOST VALUES
+
+def to_runtime(value: Any) -> RuntimeVal:
+    # None, bools, numbers, dicts with string keys, lists/tuples (as
+    # arrays), array("d")s and numpy arrays (as vectors), callables and
+    # RuntimeVals.
+    if isinstance(value, RuntimeVal):
+        return value
+    if value is None:
+        return MK_NULL()
+    if isinstance(value, bool):
+        return MK_BOOL(value)
+    if isinstance(value, (int, float)):
+        return MK_NUMBER(int(value) if isinstance(value, int) else float(value))
+    if isinstance(value, Mapping):
+        return ObjectVal({str(key): to_runtime(item) for key, item in value.items()})
+    if isinstance(value, array) or (numpy is not None and isinstance(value, numpy.ndarray)):
+        return make_vector(value)
+    if isinstance(value, (list, tuple)):
+        return MK_ARRAY([to_runtime(item) for item in value])
+    if callable(value):
+        return host_function(value)
+    raise TypeError(f"Cannot convert {type(value).__name__} to a NiScript value.")
+
+
+def to_host(value: RuntimeVal) -> Any:
+    # The inverse of to_runtime, script functions are returned as they are
+    # and arrays and vectors as lists.
+    if isinstance(value, (NullVal, BooleanVal, NumberVal, VectorVal)):
+        return value.value
+    if isinstance(value, ObjectVal):
+        return {key: to_host(item) for key, item in zip(value.shape.keys, value.values)}
+    if isinstance(value, ArrayVal):
+        return [to_host(item) for item in value.items]
+    return value
+
+
+# Wraps a Python callable as a native function taking and returning host
+# values.
+def host_function(fn: Callable[..., Any]) -> NativeFnValue:
+    def call(args, _env: Environment) -> RuntimeVal:
+        return to_runtime(fn(*[to_host(arg) for arg in args]))
+
+    return MK_NATIVE_FN(call)
+
+
+class CompiledProgram:
+    def __init__(
+        self,
+        source: str,
+        backend: str = "closure",
+        optimize: bool = True,
+        globals: Iterable[str] = (),
+        natives: Optional[Dict[str, Any]] = None,
+        engine: str = "descent",
+    ):
+        # globals: names of the host values passed to every run.
+        # natives: host values (usually functions) shared by all runs.
+        if backend not in EMBEDDING_BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Expected one of {EMBEDDING_BACKENDS}.")
+        self.backend = backend
+        self.globals = frozenset(globals)
+
+        # The pristine environment every run copies. The host globals get
+        # placeholders so the optimizer and the resolver know the names.
+        self.template = createGlobalEnv()
+        for name, value in (natives or {}).items():
+            self.template.declareVar(name, to_runtime(value), True)
+        for name in self.globals:
+            self.template.declareVar(name, MK_NULL(), True)
+
+        self.program: Program = Parser(engine).produceAST(source)
+        if optimize:
+            Optimizer(builtins=self.template.variables).optimize(self.program)
+        # Shared across threads, so nothing may be left for the first run.
+        Parser.validate(self.program)
+
+        if backend == "closure":
+            self.compiled = compile_program(self.program)
+        elif backend == "slots":
+            resolve_program(self.program, self.template)
+            self.compiled = compile_resolved_program(self.program)
+        elif backend == "vm":
+            self.code = bytecode.compile_program(self.program)
+
+    def environment(self, values: Optional[Mapping[str, Any]] = None) -> Environment:
+        # A fresh global environment holding the host values of one run.
+        env = self.template.copy()
+        if values:
+            variables = env.variables
+            for name, value in values.items():
+                if name not in self.globals:
+                    raise ValueError(f"'{name}' was not declared as a global of this program.")
+                variables[name] = to_runtime(value)
+        return env
+
+    def run(
+        self,
+        values: Optional[Mapping[str, Any]] = None,
+        env: Optional[Environment] = None,
+        limits: Optional[Limits] = None,
+    ) -> RuntimeVal:
+        # Runs the program once. values: host values for the declared
+        # globals. env: run in this environment instead, e.g. one made by
+        # environment() and inspected afterwards. limits: run with the
+        # tree evaluator within these Limits, whatever the backend.
+        if env is None:
+            env = self.environment(values)
+
+        if limits is not None:
+            return LimitedInterpreter(limits).run(self.program, env)
+        if self.backend in ("closure", "slots"):
+            return self.compiled(env)
+        elif self.backend == "vm":
+            return execute(self.code, env)
+        return evaluate(self.program, env)
+
+    async def run_async(self, values: Optional[Mapping[str, Any]] = None, env: Optional[Environment] = None) -> RuntimeVal:
+        # Runs the program with the async evaluator, whatever the backend.
+        if env is None:
+            env = self.environment(values)
+        return await evaluate_async(self.program, env)
+
+
+def prepare(source: str, **options) -> CompiledProgram:
+    return CompiledProgram(source, **options)
@@ -1,6 +1,8 @@
-from ast import List
-from maiin.values import MK_BOOL, MK_NATIVE_FN, MK_NULL, MK_NUMBER, RuntimeVal
-from typing import Optional, Dict
+from maiin.arrays import ARRAY
+from maiin.memo import MEMO
+from maiin.vectors import VEC
+from maiin.values import MK_BOOL, MK_NATIVE_FN, MK_NULL, MK_NUMBER, ObjectVal, RuntimeVal
+from typing import Optional, Dict, List
 
 class Environment:
     def __init__(self, parentENV: Optional['Environment'] = None):
@@ -8,6 +10,15 @@ class Environment:
         self.variables: Dict[str, RuntimeVal] = {}
         self.constants: set = set()
 
+    # A new environment with the same parent and its own copy of the
+    # variable tables. Values are shared, so copying a prepared global
+    # environment is much cheaper than building it again with declareVar.
+    def copy(self) -> 'Environment':
+        env = Environment(self.parent)
+        env.variables = self.variables.copy()
+        env.constants = self.constants.copy()
+        return env
+
     def declareVar(self, varname: str, value: RuntimeVal, constant: bool) -> RuntimeVal:
         if varname in self.variables:
             raise Exception(f"Cannot declare variable {varname}. As it already is defined.")
@@ -40,6 +51,16 @@ class Environment:
 
         return self.parent.resolve(varname)
 
+# gather(a, b, ...) returns its arguments in an object keyed "0", "1", ...
+# The async evaluator (maiin/async_interpreter.py) evaluates the arguments
+# of a gather call concurrently, everywhere else they run in order.
+def gatherFunction(args: List[RuntimeVal], _env: Environment) -> RuntimeVal:
+    return ObjectVal({str(i): arg for i, arg in enumerate(args)})
+
+
+GATHER = MK_NATIVE_FN(gatherFunction)
+
+
 def createGlobalEnv() -> Environment:
     env = Environment()
     # Create Default Global Environment
@@ -59,5 +80,12 @@ def createGlobalEnv() -> Environment:
         return MK_NUMBER(int(time.time() * 1000))
 
     env.declareVar("time", MK_NATIVE_FN(timeFunction), True)
+    env.declareVar("gather", GATHER, True)
+    # memo(fn) or memo(fn, size) caches the results of fn, see maiin/memo.py.
+    env.declareVar("memo", MEMO, True)
+    # vec.of(...), vec.sum(v), ... work on vectors, see maiin/vectors.py.
+    env.declareVar("vec", VEC, True)
+    # array.push(a, x), array.map(a, f), ... work on arrays, see maiin/arrays.py.
+    env.declareVar("array", ARRAY, True)
 
     return env
@@ -1,22 +1,34 @@
+from typing import List
 from src.ast_1 import (
+    ArrayLiteral,
     AssignmentExpr,
     BinaryExpr,
     CallExpr,
     Identifier,
+    MemberExpr,
     ObjectLiteral,
+    Property,
 )
 from maiin.environment import Environment
-from maiin.interpreter import evaluate
+from maiin.interpreter import HOOKED, evaluate
+from maiin.arrays import not_assignable, read_computed, write_computed
+from maiin.captures import assign_cell, make_cells, read_cell
+from maiin.memo import memo_key
+from maiin.shapes import literal_site, member_cache
+from maiin.tiering import BAILED_OUT, count_call
+from maiin.vectors import vector_binary
 from maiin.values import (
     FunctionValue,
+    MK_ARRAY,
     MK_NULL,
+    MK_NUMBER,
     NativeFnValue,
     NumberVal,
-    ObjectVal,
     RuntimeVal,
 )
 
 
+# Two ints give an int except for `/`, see NumberVal.
 def eval_numeric_binary_expr(lhs: NumberVal, rhs: NumberVal, operator: str) -> NumberVal:
     result = None
     if operator == "+":
@@ -31,67 +43,151 @@ def eval_numeric_binary_expr(lhs: NumberVal, rhs: NumberVal, operator: str) -> N
     else:
         result = lhs.value % rhs.value
 
-    return NumberVal(result)
+    return MK_NUMBER(result)
 
 
 def eval_binary_expr(binop: BinaryExpr, env: Environment) -> RuntimeVal:
     lhs = evaluate(binop.left, env)
     rhs = evaluate(binop.right, env)
 
-    # Only currently support numeric operations
-    if lhs.type == "number" and rhs.type == "number":
+    if type(lhs) is NumberVal and type(rhs) is NumberVal:
         return eval_numeric_binary_expr(lhs, rhs, binop.operator)
 
-    # One or both are NULL
-    return MK_NULL()
+    # Vectors, anything else gives null.
+    return vector_binary(lhs, rhs, binop.operator)
 
 
 def eval_identifier(ident: Identifier, env: Environment) -> RuntimeVal:
-    val = env.lookup_var(ident.symbol)
+    val = env.lookupVar(ident.symbol)
+    if ident.cell:
+        return read_cell(val)
     return val
 
 
 def eval_assignment(node: AssignmentExpr, env: Environment) -> RuntimeVal:
+    if node.assigne.kind == "MemberExpr":
+        return eval_member_assignment(node, env)
     if node.assigne.kind != "Identifier":
         raise ValueError(f"Invalid LHS inside assignment expr: {node.assigne}")
 
-    varname = node.assigne.symbol
-    return env.assign_var(varname, evaluate(node.value, env))
+    return assign_variable(node, evaluate(node.value, env), env)
+
+
+# Assigns the evaluated value of an assignment to a variable.
+def assign_variable(node: AssignmentExpr, value: RuntimeVal, env: Environment) -> RuntimeVal:
+    if node.cell:
+        return assign_cell(env, node.assigne.symbol, value)
+    return env.assignVar(node.assigne.symbol, value)
+
+
+# Evaluates the object, the key and then the value.
+def eval_member_assignment(node: AssignmentExpr, env: Environment) -> RuntimeVal:
+    member = node.assigne
+    target = evaluate(member.object, env)
+    if not member.computed:
+        evaluate(node.value, env)
+        raise not_assignable(member.property.symbol, target)
+    key = evaluate(member.property, env)
+    return write_computed(target, key, evaluate(node.value, env))
 
 
 def eval_object_expr(obj: ObjectLiteral, env: Environment) -> RuntimeVal:
-    object_val = ObjectVal(properties={})
+    site = obj.site
+    if site is None:
+        site = obj.site = literal_site(obj)
+
+    values = []
     for prop in obj.properties:
         key = prop.key
         value = prop.value
-        runtime_val = env.lookup_var(key) if value is None else evaluate(value, env)
-        object_val.properties[key] = runtime_val
+        if value is None:
+            runtime_val = shorthand_value(prop, env)
+        else:
+            runtime_val = evaluate(value, env)
+        values.append(runtime_val)
+
+    return site.build(values)
+
+
+# The value of a shorthand property `{ key }`: the variable key.
+def shorthand_value(prop: Property, env: Environment) -> RuntimeVal:
+    hooks = HOOKED.get()
+    if hooks is not None:
+        return hooks.lookup(prop.key, env, prop.cell)
+    if prop.cell:
+        return read_cell(env.lookupVar(prop.key))
+    return env.lookupVar(prop.key)
+
 
-    return object_val
+def eval_array_expr(node: ArrayLiteral, env: Environment) -> RuntimeVal:
+    return MK_ARRAY([evaluate(element, env) for element in node.elements])
+
+
+def eval_member_expr(expr: MemberExpr, env: Environment) -> RuntimeVal:
+    target = evaluate(expr.object, env)
+    if expr.computed:
+        return read_computed(target, evaluate(expr.property, env))
+
+    site = expr.site
+    if site is None:
+        site = expr.site = member_cache(expr)
+    return site.read(target)
 
 
 def eval_call_expr(expr: CallExpr, env: Environment) -> RuntimeVal:
     args = [evaluate(arg, env) for arg in expr.args]
     fn = evaluate(expr.caller, env)
+    return call_function(fn, args, env)
+
 
+# Calls fn from env, the scope of the caller. Tiered code (maiin/tiering.py)
+# calls through here as well. Instrumented runs (HOOKED) report the
+# parameters as declarations and never run tiered code, which would skip
+# their hooks.
+def call_function(fn: RuntimeVal, args: List[RuntimeVal], env: Environment) -> RuntimeVal:
     if fn.type == "native-fn":
         result = (fn.call)(args, env)
         return result
 
     if fn.type == "function":
         func = fn
-        scope = Environment(parent_env=func.declaration_env)
+        key = None
+        if func.memo is not None:
+            key = memo_key(args)
+            if key is not None:
+                cached = func.memo.get(key)
+                if cached is not None:
+                    return cached
+
+        hooks = HOOKED.get()
+        code = func.code
+        if code is None and hooks is None:
+            code = count_call(func)
+        if code is not None and code is not BAILED_OUT and hooks is None:
+            result = code(args)
+        else:
+            scope = function_scope(func, args, hooks)
+            result = MK_NULL()
+            # Evaluate the function body line by line
+            for stmt in func.body:
+                result = evaluate(stmt, scope)
+
+        if key is not None:
+            func.memo.put(key, result)
+        return result
 
-        # Create the variables for the parameters list
-        for i in range(len(func.parameters)):
-            varname = func.parameters[i]
-            scope.declare_var(varname, args[i], constant=False)
+    raise ValueError("Cannot call value that is not a function: " + str(fn))
 
-        result = MK_NULL()
-        # Evaluate the function body line by line
-        for stmt in func.body:
-            result = evaluate(stmt, scope)
 
-        return result
+# The scope a call of func runs its body in, holding the arguments.
+def function_scope(func: FunctionValue, args: List[RuntimeVal], hooks=None) -> Environment:
+    scope = Environment(func.declarationEnv)
+    declare = scope.declareVar if hooks is None else hooks.declarer(scope)
 
-    raise ValueError("Cannot call value that is not a function: " + str(fn))
+    # Create the variables for the parameters list
+    for i in range(len(func.parameters)):
+        varname = func.parameters[i]
+        declare(varname, args[i], False)
+    if func.cells:
+        make_cells(scope, func.cells)
+    return scope
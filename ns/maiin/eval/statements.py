@@ -1,6 +1,8 @@
 from src.ast_1 import FunctionDeclaration, Program, VarDeclaration
 from maiin.environment import Environment
 from maiin.interpreter import evaluate
+from maiin.captures import Cell, bind_self, capture_environment
+from maiin.memo import LRUCache
 from maiin.values import FunctionValue, MK_NULL, RuntimeVal
 
 
@@ -13,7 +15,15 @@ def eval_program(program: Program, env: Environment) -> RuntimeVal:
 
 def eval_var_declaration(declaration: VarDeclaration, env: Environment) -> RuntimeVal:
     value = evaluate(declaration.value, env) if declaration.value else MK_NULL()
-    return env.declare_var(declaration.identifier, value, declaration.constant)
+    return declare_variable(declaration, value, env)
+
+
+# Declares the variable of declaration with its evaluated value.
+def declare_variable(declaration: VarDeclaration, value: RuntimeVal, env: Environment) -> RuntimeVal:
+    if declaration.cell:
+        env.declareVar(declaration.identifier, Cell(value), declaration.constant)
+        return value
+    return env.declareVar(declaration.identifier, value, declaration.constant)
 
 
 def eval_function_declaration(
@@ -23,8 +33,14 @@ def eval_function_declaration(
     fn = FunctionValue(
         name=declaration.name,
         parameters=declaration.parameters,
-        declaration_env=env,
+        declarationEnv=env if declaration.captures is None else capture_environment(declaration, env),
         body=declaration.body,
     )
+    fn.cells = declaration.cells
+    if declaration.memoize:
+        fn.memo = LRUCache(declaration.memoize)
 
-    return env.declare_var(declaration.name, fn, constant=True)
+    env.declareVar(declaration.name, fn, True)
+    if declaration.captures is not None:
+        bind_self(declaration, fn)
+    return fn
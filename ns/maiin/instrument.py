@@ -0,0 +1,339 @@
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    FunctionDeclaration,
+    Identifier,
+    NumericLiteral,
+    ObjectLiteral,
+    Stmt,
+    VarDeclaration,
+)
+from maiin.environment import Environment
+from maiin.interpreter import HANDLERS, HOOKED, evaluate, unsupported
+from maiin.eval.expressions import call_function
+from maiin.arrays import CALLER
+from maiin.captures import read_cell
+from maiin.values import RuntimeVal, is_interned
+
+# Instrumentation for the tree walking evaluator.
+#
+#   profile = CallProfile()
+#   Interpreter([profile]).run(program, createGlobalEnv())
+#   print(profile.report())
+#
+# An Instrument overrides any of the hooks below. An Interpreter only calls
+# the hooks its instruments override, and without instruments it runs the
+# plain `evaluate` from maiin/interpreter.py, so nothing is paid for
+# instrumentation that is not attached. Interpreters do not share
+# instruments, every one reports only on the programs it ran.
+#
+# The Interpreter is not an evaluator of its own: while it runs it is the
+# HOOKED one of maiin/interpreter.py and evaluates nodes with the handlers
+# of the tree walker (captures, cells and memoized functions included),
+# running the hooks before and after them. Only calls get a handler of
+# their own, which reports them under the name they were called by.
+
+HOOKS = ("enter", "exit", "call", "returned", "lookup", "assign", "declare", "allocate")
+
+
+class Instrument:
+    # Before and after a node is evaluated. value is None when the node
+    # raised.
+    def enter(self, node: Stmt, env: Environment):
+        pass
+
+    def exit(self, node: Stmt, env: Environment, value: Optional[RuntimeVal]):
+        pass
+
+    # Around calls of FunctionValues and NativeFnValues. name is the name
+    # of a script function, or the name a native was called by.
+    def call(self, name: str, fn: RuntimeVal, args: List[RuntimeVal]):
+        pass
+
+    def returned(self, name: str, fn: RuntimeVal, value: Optional[RuntimeVal]):
+        pass
+
+    # Variable reads, assignments and declarations, with the environment
+    # the evaluator asked.
+    def lookup(self, name: str, value: RuntimeVal, env: Environment):
+        pass
+
+    def assign(self, name: str, value: RuntimeVal, env: Environment):
+        pass
+
+    def declare(self, name: str, value: RuntimeVal, env: Environment):
+        pass
+
+    # Every value the evaluator creates. Shared values (null, true, false,
+    # small numbers) are not allocations.
+    def allocate(self, value: RuntimeVal):
+        pass
+
+
+# Node types whose value is a new allocation.
+ALLOCATING = (NumericLiteral, ObjectLiteral, ArrayLiteral, BinaryExpr)
+
+
+class Interpreter:
+    def __init__(self, instruments: Iterable[Instrument] = ()):
+        self.instruments: List[Instrument] = []
+        self.handlers: Dict[type, Callable] = dict(HANDLERS)
+        self.handlers[CallExpr] = self.eval_call_expr
+        self.bind()
+        for instrument in instruments:
+            self.attach(instrument)
+
+    def attach(self, instrument: Instrument) -> Instrument:
+        self.instruments.append(instrument)
+        self.bind()
+        return instrument
+
+    def detach(self, instrument: Instrument):
+        self.instruments.remove(instrument)
+        self.bind()
+
+    def bind(self):
+        # self.on_<hook>: the overriding hooks of every instrument, so the
+        # evaluator tests an empty tuple for hooks nobody attached.
+        for hook in HOOKS:
+            default = getattr(Instrument, hook)
+            setattr(self, "on_" + hook, tuple(
+                getattr(instrument, hook)
+                for instrument in self.instruments
+                if getattr(type(instrument), hook, default) is not default
+            ))
+
+        # self.after: what runs after a node of a type is evaluated, for the
+        # hooks attached (or allocated and declared overridden by a
+        # subclass).
+        allocations = self.on_allocate or type(self).allocated is not Interpreter.allocated
+        declarations = self.on_declare or type(self).declared is not Interpreter.declared
+        self.after: Dict[type, Callable] = {}
+        if allocations:
+            for node_type in ALLOCATING:
+                self.after[node_type] = self.after_allocation
+        if self.on_lookup:
+            self.after[Identifier] = self.after_identifier
+        if self.on_assign:
+            self.after[AssignmentExpr] = self.after_assignment
+        if declarations:
+            self.after[VarDeclaration] = self.after_var_declaration
+        if allocations or declarations:
+            self.after[FunctionDeclaration] = self.after_function_declaration
+        self.evaluate = self.evaluate_traced if self.on_enter or self.on_exit else self.dispatch
+
+    def run(self, program: Stmt, env: Environment) -> RuntimeVal:
+        if not self.instruments:
+            return evaluate(program, env)
+        return self.run_hooked(program, env)
+
+    def run_hooked(self, program: Stmt, env: Environment) -> RuntimeVal:
+        # Functions the array builtins call are reported too.
+        caller = CALLER.set(self.call_back)
+        hooked = HOOKED.set(self)
+        try:
+            return self.evaluate(program, env)
+        finally:
+            HOOKED.reset(hooked)
+            CALLER.reset(caller)
+
+    def dispatch(self, astNode: Stmt, env: Environment) -> RuntimeVal:
+        handler = self.handlers.get(type(astNode))
+        if handler is None:
+            return unsupported(astNode)
+        value = handler(astNode, env)
+        after = self.after.get(type(astNode))
+        if after is not None:
+            after(astNode, env, value)
+        return value
+
+    def evaluate_traced(self, astNode: Stmt, env: Environment) -> RuntimeVal:
+        for hook in self.on_enter:
+            hook(astNode, env)
+        value = None
+        try:
+            value = self.dispatch(astNode, env)
+            return value
+        finally:
+            for hook in self.on_exit:
+                hook(astNode, env, value)
+
+    # HOOKS INSIDE NODES
+
+    def allocated(self, value: RuntimeVal) -> RuntimeVal:
+        if self.on_allocate and not is_interned(value):
+            for hook in self.on_allocate:
+                hook(value)
+        return value
+
+    def declared(self, name: str, value: RuntimeVal, env: Environment):
+        for hook in self.on_declare:
+            hook(name, value, env)
+
+    def declare(self, name: str, value: RuntimeVal, constant: bool, env: Environment) -> RuntimeVal:
+        env.declareVar(name, value, constant)
+        self.declared(name, value, env)
+        return value
+
+    # declareVar of scope for call_function, which declares the parameters.
+    def declarer(self, scope: Environment) -> Callable[[str, RuntimeVal, bool], RuntimeVal]:
+        return lambda name, value, constant: self.declare(name, value, constant, scope)
+
+    # A shorthand property reading name.
+    def lookup(self, name: str, env: Environment, cell: bool = False) -> RuntimeVal:
+        value = env.lookupVar(name)
+        if cell:
+            value = read_cell(value)
+        for hook in self.on_lookup:
+            hook(name, value, env)
+        return value
+
+    # HOOKS AFTER NODES
+
+    def after_allocation(self, node: Stmt, env: Environment, value: RuntimeVal):
+        self.allocated(value)
+
+    def after_identifier(self, node: Identifier, env: Environment, value: RuntimeVal):
+        for hook in self.on_lookup:
+            hook(node.symbol, value, env)
+
+    def after_assignment(self, node: AssignmentExpr, env: Environment, value: RuntimeVal):
+        if type(node.assigne) is Identifier:
+            for hook in self.on_assign:
+                hook(node.assigne.symbol, value, env)
+
+    def after_var_declaration(self, node: VarDeclaration, env: Environment, value: RuntimeVal):
+        self.declared(node.identifier, value, env)
+
+    def after_function_declaration(self, node: FunctionDeclaration, env: Environment, value: RuntimeVal):
+        self.allocated(value)
+        self.declared(node.name, value, env)
+
+    # CALLS
+
+    def eval_call_expr(self, expr: CallExpr, env: Environment) -> RuntimeVal:
+        args = [self.evaluate(arg, env) for arg in expr.args]
+        fn = self.evaluate(expr.caller, env)
+
+        if fn.type != "native-fn" and fn.type != "function":
+            raise ValueError("Cannot call value that is not a function: " + str(fn))
+
+        if fn.type == "function":
+            name = fn.name
+        else:
+            name = expr.caller.symbol if isinstance(expr.caller, Identifier) else "<native>"
+
+        return self.call_hooked(name, fn, args, env)
+
+    # A call made by a builtin, e.g. array.map calling its function.
+    def call_back(self, fn: RuntimeVal, args: List[RuntimeVal], env: Environment) -> RuntimeVal:
+        return self.call_hooked(fn.name if fn.type == "function" else "<native>", fn, args, env)
+
+    def call_hooked(self, name: str, fn: RuntimeVal, args: List[RuntimeVal], env: Environment) -> RuntimeVal:
+        for hook in self.on_call:
+            hook(name, fn, args)
+        result = None
+        try:
+            result = self.call_function(fn, args, env)
+            return result
+        finally:
+            for hook in self.on_returned:
+                hook(name, fn, result)
+
+    def call_function(self, fn: RuntimeVal, args: List[RuntimeVal], env: Environment) -> RuntimeVal:
+        return call_function(fn, args, env)
+
+
+# COLLECTORS
+
+class CallProfile(Instrument):
+    # Calls, cumulative time (including callees, recursive calls counted
+    # once) and self time per function name.
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.calls: Dict[str, int] = {}
+        self.cumulative: Dict[str, float] = {}
+        self.self_time: Dict[str, float] = {}
+        self.stack: List[list] = []  # [name, start, time spent in callees]
+        self.active: Dict[str, int] = {}
+
+    def call(self, name, fn, args):
+        self.calls[name] = self.calls.get(name, 0) + 1
+        self.active[name] = self.active.get(name, 0) + 1
+        self.stack.append([name, self.clock(), 0.0])
+
+    def returned(self, name, fn, value):
+        name, start, callees = self.stack.pop()
+        elapsed = self.clock() - start
+        self.active[name] -= 1
+        if not self.active[name]:
+            self.cumulative[name] = self.cumulative.get(name, 0.0) + elapsed
+        self.self_time[name] = self.self_time.get(name, 0.0) + elapsed - callees
+        if self.stack:
+            self.stack[-1][2] += elapsed
+
+    def report(self, limit: int = 20) -> str:
+        lines = [f"{'calls':>10} {'cumulative ms':>14} {'self ms':>10}  function"]
+        ranked = sorted(self.calls, key=lambda name: self.self_time.get(name, 0.0), reverse=True)
+        for name in ranked[:limit]:
+            lines.append(
+                f"{self.calls[name]:>10} {self.cumulative.get(name, 0.0) * 1000:>14.2f} "
+                f"{self.self_time.get(name, 0.0) * 1000:>10.2f}  {name}"
+            )
+        return "\n".join(lines)
+
+
+class NodeTimer(Instrument):
+    # Evaluations, cumulative and self time per node kind.
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.counts: Dict[str, int] = {}
+        self.cumulative: Dict[str, float] = {}
+        self.self_time: Dict[str, float] = {}
+        self.stack: List[list] = []  # [start, time spent in children]
+        self.active: Dict[str, int] = {}
+
+    def enter(self, node, env):
+        kind = node.kind
+        self.counts[kind] = self.counts.get(kind, 0) + 1
+        self.active[kind] = self.active.get(kind, 0) + 1
+        self.stack.append([self.clock(), 0.0])
+
+    def exit(self, node, env, value):
+        kind = node.kind
+        start, children = self.stack.pop()
+        elapsed = self.clock() - start
+        self.active[kind] -= 1
+        if not self.active[kind]:
+            self.cumulative[kind] = self.cumulative.get(kind, 0.0) + elapsed
+        self.self_time[kind] = self.self_time.get(kind, 0.0) + elapsed - children
+        if self.stack:
+            self.stack[-1][1] += elapsed
+
+    def report(self) -> str:
+        lines = [f"{'count':>10} {'cumulative ms':>14} {'self ms':>10}  node"]
+        for kind in sorted(self.counts, key=lambda kind: self.self_time.get(kind, 0.0), reverse=True):
+            lines.append(
+                f"{self.counts[kind]:>10} {self.cumulative.get(kind, 0.0) * 1000:>14.2f} "
+                f"{self.self_time.get(kind, 0.0) * 1000:>10.2f}  {kind}"
+            )
+        return "\n".join(lines)
+
+
+class AllocationCounter(Instrument):
+    # Values created per RuntimeVal type.
+    def __init__(self):
+        self.counts: Dict[str, int] = {}
+
+    def allocate(self, value):
+        self.counts[value.type] = self.counts.get(value.type, 0) + 1
+
+    def report(self) -> str:
+        lines = [f"{'allocated':>10}  type"]
+        for kind, count in sorted(self.counts.items(), key=lambda item: item[1], reverse=True):
+            lines.append(f"{count:>10}  {kind}")
+        return "\n".join(lines)
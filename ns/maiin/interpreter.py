@@ -1,10 +1,14 @@
-from maiin.values import NumberVal, RuntimeVal
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+from maiin.values import MK_NUMBER, RuntimeVal
 from src.ast_1 import (
+    ArrayLiteral,
     AssignmentExpr,
     BinaryExpr,
     CallExpr,
     FunctionDeclaration,
     Identifier,
+    MemberExpr,
     NumericLiteral,
     ObjectLiteral,
     Program,
@@ -12,41 +16,72 @@ from src.ast_1 import (
     VarDeclaration,
 )
 from maiin.environment import Environment
-from eval.statements import (
+
+if TYPE_CHECKING:
+    from maiin.instrument import Interpreter
+
+# The tree walker dispatches every node to its handler in HANDLERS. An
+# instrumented run (maiin/instrument.py, maiin/limits.py) sets HOOKED to its
+# Interpreter, which then evaluates every node instead: it calls the same
+# handlers and runs the hooks around them. Handlers reach the hooks that
+# belong inside a node (declaring parameters, shorthand properties) through
+# HOOKED as well.
+
+Handler = Callable[[Stmt, Environment], RuntimeVal]
+
+HANDLERS: Dict[type, Handler] = {}
+
+HOOKED: "ContextVar[Optional[Interpreter]]" = ContextVar("hooked", default=None)
+
+
+def evaluate(astNode: Stmt, env: Environment) -> RuntimeVal:
+    hooks = HOOKED.get()
+    if hooks is not None:
+        return hooks.evaluate(astNode, env)
+    handler = HANDLERS.get(type(astNode))
+    if handler is None:
+        return unsupported(astNode)
+    return handler(astNode, env)
+
+
+def unsupported(astNode: Stmt):
+    print(
+        "This AST Node has not yet been set up for interpretation.\n",
+        astNode
+    )
+    exit(0)
+
+
+def eval_numeric_literal(node: NumericLiteral, env: Environment) -> RuntimeVal:
+    return MK_NUMBER(node.value)
+
+
+# The eval modules import `evaluate` from here, so they are imported last.
+from maiin.eval.statements import (  # noqa: E402
     eval_function_declaration,
     eval_program,
     eval_var_declaration,
 )
-from eval.expressions import (
+from maiin.eval.expressions import (  # noqa: E402
+    eval_array_expr,
     eval_assignment,
     eval_binary_expr,
     eval_call_expr,
     eval_identifier,
+    eval_member_expr,
     eval_object_expr,
 )
 
-def evaluate(astNode: Stmt, env: Environment) -> RuntimeVal:
-    if isinstance(astNode, NumericLiteral):
-        return NumberVal(astNode.value)
-    elif isinstance(astNode, Identifier):
-        return eval_identifier(astNode, env)
-    elif isinstance(astNode, ObjectLiteral):
-        return eval_object_expr(astNode, env)
-    elif isinstance(astNode, CallExpr):
-        return eval_call_expr(astNode, env)
-    elif isinstance(astNode, AssignmentExpr):
-        return eval_assignment(astNode, env)
-    elif isinstance(astNode, BinaryExpr):
-        return eval_binary_expr(astNode, env)
-    elif isinstance(astNode, Program):
-        return eval_program(astNode, env)
-    elif isinstance(astNode, VarDeclaration):
-        return eval_var_declaration(astNode, env)
-    elif isinstance(astNode, FunctionDeclaration):
-        return eval_function_declaration(astNode, env)
-    else:
-        print(
-            "This AST Node has not yet been set up for interpretation.\n",
-            astNode
-        )
-        exit(0)
+HANDLERS.update({
+    NumericLiteral: eval_numeric_literal,
+    Identifier: eval_identifier,
+    ObjectLiteral: eval_object_expr,
+    ArrayLiteral: eval_array_expr,
+    CallExpr: eval_call_expr,
+    MemberExpr: eval_member_expr,
+    AssignmentExpr: eval_assignment,
+    BinaryExpr: eval_binary_expr,
+    Program: eval_program,
+    VarDeclaration: eval_var_declaration,
+    FunctionDeclaration: eval_function_declaration,
+})
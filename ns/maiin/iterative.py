@@ -0,0 +1,382 @@
+import time
+from typing import Dict, List, Optional
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    FunctionDeclaration,
+    Identifier,
+    MemberExpr,
+    NumericLiteral,
+    ObjectLiteral,
+    Program,
+    Stmt,
+    VarDeclaration,
+)
+from maiin.environment import Environment
+# Loads maiin.eval.* in the order their circular imports need.
+import maiin.interpreter  # noqa: F401
+from maiin.eval.expressions import eval_numeric_binary_expr
+from maiin.arrays import CALLER, not_assignable, read_computed, write_computed
+from maiin.limits import CHECK_INTERVAL, Limits, ResourceLimitExceeded, Usage
+from maiin.shapes import literal_site, member_cache
+from maiin.vectors import vector_binary
+from maiin.values import (
+    FunctionValue,
+    MK_ARRAY,
+    MK_NULL,
+    MK_NUMBER,
+    RuntimeVal,
+)
+
+# Tree walking evaluator without Python recursion. Pending work is kept on
+# an explicit stack of tasks and intermediate values on a value stack, so
+# the depth of NiScript calls is bounded by max_depth instead of the Python
+# stack.
+#
+# A call whose value is returned right away (the last statement of a
+# function body, possibly nested in other such calls) is a tail call: it
+# takes over the frame of the function making it instead of pushing a new
+# one, so tail recursion runs in constant space. If that function declares
+# no inner functions nothing can refer to its scope any more, and the
+# callee reuses the Environment as well.
+#
+# NiScript has no conditionals, so tail recursion only ends through an
+# error or a limit: pass Limits to bound the steps, depth or time of a run.
+#
+# Functions called by the array builtins (maiin/arrays.py) run as nested
+# evaluations through NativeCalls, which carry on with the steps, depth and
+# clock of the run.
+
+# Upper bound for nested (non tail) NiScript calls.
+MAX_DEPTH = 100_000
+
+# Tasks, tuples starting with one of these.
+EVAL = 0  # (EVAL, node, env): push the value of node.
+BINARY = 1  # (BINARY, operator): pop rhs and lhs, push the result.
+DECLARE = 2  # (DECLARE, name, constant, env): declare the top value.
+ASSIGN = 3  # (ASSIGN, name, env): assign the top value.
+LOOKUP = 4  # (LOOKUP, name, env): push the value of a variable.
+OBJECT = 5  # (OBJECT, site): pop site.count values, push an object.
+CALL = 6  # (CALL, argc, env): pop the callee and its arguments, call it.
+POP = 7  # (POP,): discard the top value.
+RETURN = 8  # (RETURN, scope or None): leave a function, scope is reusable.
+MEMBER = 9  # (MEMBER, site): pop an object, push the member site reads.
+COMPUTED = 10  # (COMPUTED,): pop a key and an object, push the member.
+ARRAY = 11  # (ARRAY, count): pop count values, push an array of them.
+STORE = 12  # (STORE,): pop a value, a key and an array, store the value.
+PROPERTY = 13  # (PROPERTY, name): pop a value and an object, raise.
+
+
+class NativeCalls:
+    def __init__(self, max_depth: int, limits: Optional[Limits]):
+        self.max_depth = max_depth
+        self.limits = limits
+        # Usage of the run so far, the evaluation loops copy it in and out
+        # around native calls.
+        self.steps = 0
+        self.depth = 0
+        self.max_seen = 0
+        self.started = time.monotonic()
+        # Whether a function body declares inner functions, by body.
+        self.captures: Dict[int, bool] = {}
+
+    def call(self, fn: RuntimeVal, args: List[RuntimeVal], env: Environment) -> RuntimeVal:
+        if fn.type == "native-fn":
+            return fn.call(args, env)
+
+        self.depth += 1
+        try:
+            if self.depth > self.max_seen:
+                self.max_seen = self.depth
+                if self.depth > self.max_depth:
+                    limits = self.limits
+                    if limits is not None and limits.depth is not None and self.depth > limits.depth:
+                        exceeded("depth", limits.depth, self.steps, self.depth, self.max_seen, self.started)
+                    raise RecursionError("maximum NiScript call depth exceeded")
+
+            scope = Environment(fn.declarationEnv)
+            parameters = fn.parameters
+            for i in range(len(parameters)):
+                scope.declareVar(parameters[i], args[i], False)
+            todo: List[tuple] = []
+            values: List[RuntimeVal] = []
+            push_body(fn.body, scope, todo.append, values.append)
+            return run_tasks(todo, values, self)
+        finally:
+            self.depth -= 1
+
+
+def evaluate_iterative(
+    astNode: Stmt,
+    env: Environment,
+    max_depth: int = MAX_DEPTH,
+    limits: Optional[Limits] = None,
+) -> RuntimeVal:
+    # limits: steps count evaluated nodes, depth nested calls (tail calls do
+    # not nest) and seconds wall clock time, checked every CHECK_INTERVAL
+    # steps. Memory is not tracked here.
+    if limits is not None and limits.depth is not None:
+        max_depth = min(max_depth, limits.depth)
+    calls = NativeCalls(max_depth, limits)
+    token = CALLER.set(calls.call)
+    try:
+        return run_tasks([(EVAL, astNode, env)], [], calls)
+    finally:
+        CALLER.reset(token)
+
+
+# Runs the tasks in todo, returns the value left on top of values.
+def run_tasks(todo: List[tuple], values: List[RuntimeVal], calls: NativeCalls) -> RuntimeVal:
+    push_task = todo.append
+    push = values.append
+    pop = values.pop
+    captures = calls.captures
+
+    max_depth = calls.max_depth
+    limits = calls.limits
+    depth = calls.depth
+    max_seen = calls.max_seen
+    step_limit = limits.steps if limits is not None else None
+    started = calls.started
+    deadline = None if limits is None or limits.seconds is None else started + limits.seconds
+    steps = calls.steps
+    countdown = CHECK_INTERVAL if step_limit is None else min(CHECK_INTERVAL, step_limit - steps)
+    chunk = countdown
+
+    while todo:
+        task = todo.pop()
+        kind = task[0]
+
+        if kind == EVAL:
+            countdown -= 1
+            if countdown < 0:
+                # Checkpoint, this step is the first of the next chunk.
+                steps += chunk
+                chunk = countdown = 0
+                if step_limit is not None and steps >= step_limit:
+                    exceeded("steps", step_limit, steps, depth, max_seen, started)
+                if deadline is not None and time.monotonic() > deadline:
+                    exceeded("seconds", limits.seconds, steps, depth, max_seen, started)
+                chunk = CHECK_INTERVAL if step_limit is None else min(CHECK_INTERVAL, step_limit - steps)
+                countdown = chunk - 1
+
+            node = task[1]
+            node_type = type(node)
+            if node_type is NumericLiteral:
+                push(MK_NUMBER(node.value))
+            elif node_type is Identifier:
+                push(task[2].lookupVar(node.symbol))
+            elif node_type is BinaryExpr:
+                scope = task[2]
+                push_task((BINARY, node.operator))
+                push_task((EVAL, node.right, scope))
+                push_task((EVAL, node.left, scope))
+            elif node_type is CallExpr:
+                scope = task[2]
+                push_task((CALL, len(node.args), scope))
+                push_task((EVAL, node.caller, scope))
+                for arg in reversed(node.args):
+                    push_task((EVAL, arg, scope))
+            elif node_type is VarDeclaration:
+                scope = task[2]
+                push_task((DECLARE, node.identifier, node.constant, scope))
+                if node.value:
+                    push_task((EVAL, node.value, scope))
+                else:
+                    push(MK_NULL())
+            elif node_type is AssignmentExpr:
+                scope = task[2]
+                member = node.assigne
+                if member.kind == "MemberExpr":
+                    if member.computed:
+                        push_task((STORE,))
+                        push_task((EVAL, node.value, scope))
+                        push_task((EVAL, member.property, scope))
+                    else:
+                        push_task((PROPERTY, member.property.symbol))
+                        push_task((EVAL, node.value, scope))
+                    push_task((EVAL, member.object, scope))
+                elif member.kind != "Identifier":
+                    raise ValueError(f"Invalid LHS inside assignment expr: {node.assigne}")
+                else:
+                    push_task((ASSIGN, node.assigne.symbol, scope))
+                    push_task((EVAL, node.value, scope))
+            elif node_type is FunctionDeclaration:
+                scope = task[2]
+                fn = FunctionValue(
+                    name=node.name,
+                    parameters=node.parameters,
+                    declarationEnv=scope,
+                    body=node.body,
+                )
+                push(scope.declareVar(node.name, fn, True))
+            elif node_type is ObjectLiteral:
+                scope = task[2]
+                properties = node.properties
+                site = node.site
+                if site is None:
+                    site = node.site = literal_site(node)
+                push_task((OBJECT, site))
+                for prop in reversed(properties):
+                    if prop.value is None:
+                        push_task((LOOKUP, prop.key, scope))
+                    else:
+                        push_task((EVAL, prop.value, scope))
+            elif node_type is ArrayLiteral:
+                scope = task[2]
+                push_task((ARRAY, len(node.elements)))
+                for element in reversed(node.elements):
+                    push_task((EVAL, element, scope))
+            elif node_type is MemberExpr:
+                scope = task[2]
+                if node.computed:
+                    push_task((COMPUTED,))
+                    push_task((EVAL, node.property, scope))
+                else:
+                    site = node.site
+                    if site is None:
+                        site = node.site = member_cache(node)
+                    push_task((MEMBER, site))
+                push_task((EVAL, node.object, scope))
+            elif node_type is Program:
+                push_body(node.body, task[2], push_task, push)
+            else:
+                print(
+                    "This AST Node has not yet been set up for interpretation.\n",
+                    node
+                )
+                exit(0)
+
+        elif kind == BINARY:
+            rhs = pop()
+            lhs = pop()
+            if lhs.type == "number" and rhs.type == "number":
+                push(eval_numeric_binary_expr(lhs, rhs, task[1]))
+            else:
+                push(vector_binary(lhs, rhs, task[1]))
+
+        elif kind == CALL:
+            fn = pop()
+            argc = task[1]
+            if argc:
+                args = values[-argc:]
+                del values[-argc:]
+            else:
+                args = []
+
+            if fn.type == "native-fn":
+                # The native may call back into NiScript, see NativeCalls.
+                used = steps + chunk - countdown
+                calls.steps = used
+                calls.depth = depth
+                calls.max_seen = max_seen
+                push(fn.call(args, task[2]))
+                steps += calls.steps - used
+                max_seen = calls.max_seen
+                continue
+            if fn.type != "function":
+                raise ValueError("Cannot call value that is not a function: " + str(fn))
+
+            body = fn.body
+            reusable = captures.get(id(body))
+            if reusable is None:
+                reusable = captures[id(body)] = not any(isinstance(stmt, FunctionDeclaration) for stmt in body)
+
+            if todo and todo[-1][0] == RETURN:
+                # Tail call: the caller's frame becomes the callee's.
+                scope = todo[-1][1]
+                if scope is not None:
+                    scope.parent = fn.declarationEnv
+                    scope.variables = {}
+                    scope.constants = set()
+                else:
+                    scope = Environment(fn.declarationEnv)
+                todo[-1] = (RETURN, scope if reusable else None)
+            else:
+                depth += 1
+                if depth > max_seen:
+                    max_seen = depth
+                    if depth > max_depth:
+                        if limits is not None and limits.depth is not None and depth > limits.depth:
+                            exceeded("depth", limits.depth, steps + chunk - countdown, depth, max_seen, started)
+                        raise RecursionError("maximum NiScript call depth exceeded")
+                scope = Environment(fn.declarationEnv)
+                push_task((RETURN, scope if reusable else None))
+
+            parameters = fn.parameters
+            for i in range(len(parameters)):
+                scope.declareVar(parameters[i], args[i], False)
+            push_body(body, scope, push_task, push)
+
+        elif kind == RETURN:
+            depth -= 1
+
+        elif kind == POP:
+            pop()
+
+        elif kind == DECLARE:
+            task[3].declareVar(task[1], values[-1], task[2])
+
+        elif kind == ASSIGN:
+            push(task[2].assignVar(task[1], pop()))
+
+        elif kind == LOOKUP:
+            push(task[2].lookupVar(task[1]))
+
+        elif kind == OBJECT:
+            count = task[1].count
+            if count:
+                properties = values[-count:]
+                del values[-count:]
+            else:
+                properties = []
+            push(task[1].build(properties))
+
+        elif kind == MEMBER:
+            push(task[1].read(pop()))
+
+        elif kind == COMPUTED:
+            key = pop()
+            push(read_computed(pop(), key))
+
+        elif kind == ARRAY:
+            count = task[1]
+            if count:
+                items = values[-count:]
+                del values[-count:]
+            else:
+                items = []
+            push(MK_ARRAY(items))
+
+        elif kind == STORE:
+            value = pop()
+            key = pop()
+            push(write_computed(pop(), key, value))
+
+        elif kind == PROPERTY:
+            pop()
+            raise not_assignable(task[1], pop())
+
+    calls.steps = steps + chunk - countdown
+    calls.max_seen = max_seen
+    return values[-1]
+
+
+def exceeded(limit: str, maximum, steps: int, depth: int, max_depth: int, started: float):
+    usage = Usage(steps, depth, max_depth, 0, time.monotonic() - started)
+    raise ResourceLimitExceeded(limit, maximum, usage)
+
+
+# Pushes the tasks evaluating body, leaving the value of its last statement
+# (null for an empty body).
+def push_body(body: List[Stmt], env: Environment, push_task, push):
+    count = len(body)
+    if not count:
+        push(MK_NULL())
+        return
+    push_task((EVAL, body[count - 1], env))
+    for i in range(count - 2, -1, -1):
+        push_task((POP,))
+        push_task((EVAL, body[i], env))
@@ -0,0 +1,335 @@
+import sys
+import time
+from typing import Iterable, List, Optional
+from src.ast_1 import AssignmentExpr, BinaryExpr, MemberExpr, Stmt
+from maiin.arrays import write_computed
+from maiin.environment import Environment
+from maiin.interpreter import evaluate, unsupported
+from maiin.eval.expressions import eval_assignment, eval_binary_expr, eval_numeric_binary_expr
+from maiin.instrument import Instrument, Interpreter
+from maiin.vectors import ALLOCATION_CHECK, vector_binary
+from maiin.values import (
+    ARRAY_TYPE,
+    FUNCTION_TYPE,
+    OBJECT_TYPE,
+    VECTOR_TYPE,
+    ArrayVal,
+    FunctionValue,
+    NumberVal,
+    ObjectVal,
+    RuntimeVal,
+    VectorVal,
+)
+
+# Resource limits for running untrusted scripts with the tree walking
+# evaluator:
+#
+#   limits = Limits(steps=1_000_000, depth=200, memory=64 * 1024 * 1024, seconds=2)
+#   LimitedInterpreter(limits).run(program, createGlobalEnv())
+#
+# - steps: evaluated nodes, plus the words multiplied in products of large
+#   ints (see binary).
+# - depth: nested calls of script functions.
+# - memory: estimated bytes of the objects, vectors, arrays (and their
+#   items), large ints, functions, properties, variables and call scopes
+#   the run allocated. Allocations are counted, not live memory, so this
+#   also bounds the garbage a script makes.
+# - seconds: wall clock time of the run.
+#
+# The step counter is a countdown to the next checkpoint, every
+# CHECK_INTERVAL steps the checkpoint compares the steps and the clock with
+# the limits. A native call blocking the run is not interrupted.
+#
+# Natives are charged for what they made once they return. The vector
+# builtins check the size of a vector against the memory left before they
+# make it (see maiin/vectors.py), so one call cannot allocate far past the
+# limit.
+
+CHECK_INTERVAL = 1024
+
+# Approximate sizes in bytes (64-bit CPython). Numbers are not counted when
+# they are made, most are garbage right away. Every variable and property
+# is charged with the size of a number instead, which covers the numbers
+# that are kept. Ints have no size limit though, the ones longer than
+# BIG_INT_BITS are charged their whole size when they are made, so a script
+# squaring a number over and over runs out of memory instead of time.
+NUMBER_SIZE = sys.getsizeof(NumberVal(0.5)) + sys.getsizeof(0.5)
+BIG_INT_BITS = 64
+ENTRY_SIZE = 48 + NUMBER_SIZE  # a dict entry, its share of the table and a value.
+# Objects keep their keys in a shared Shape, a property is a list item. So
+# is an array item.
+PROPERTY_SIZE = 8 + NUMBER_SIZE
+VALUE_SIZES = {
+    OBJECT_TYPE: sys.getsizeof(ObjectVal({})) + sys.getsizeof([]),
+    ARRAY_TYPE: sys.getsizeof(ArrayVal([])) + sys.getsizeof([]),
+    FUNCTION_TYPE: sys.getsizeof(FunctionValue("f", [], None, [])),
+    # With the header of its array, plus 8 bytes per element.
+    VECTOR_TYPE: sys.getsizeof(VectorVal(None)) + 112,
+}
+# Types of the values natives are charged for.
+CHARGED_TYPES = (OBJECT_TYPE, VECTOR_TYPE, ARRAY_TYPE)
+SCOPE_SIZE = sys.getsizeof(Environment()) + sys.getsizeof({}) + sys.getsizeof(set())
+
+
+def value_size(value: RuntimeVal) -> int:
+    size = VALUE_SIZES.get(value.type, 0)
+    if value.type == OBJECT_TYPE:
+        size += PROPERTY_SIZE * len(value.values)
+    elif value.type == VECTOR_TYPE:
+        size += 8 * len(value.data)
+    elif value.type == ARRAY_TYPE:
+        size += PROPERTY_SIZE * len(value.items)
+    elif type(value) is NumberVal and type(value.value) is int and value.value.bit_length() > BIG_INT_BITS:
+        size = sys.getsizeof(value.value)
+    return size
+
+
+# Items in the arrays among args.
+def array_items(args: List[RuntimeVal]) -> int:
+    return sum(len(arg.items) for arg in args if type(arg) is ArrayVal)
+
+
+# "64MB", "512KB" or a plain number of bytes.
+SIZE_UNITS = {"KB": 1024, "MB": 1024 * 1024, "GB": 1024 * 1024 * 1024}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    for suffix, factor in SIZE_UNITS.items():
+        if text.endswith(suffix):
+            return int(float(text[: -len(suffix)]) * factor)
+    return int(text)
+
+
+class Limits:
+    def __init__(
+        self,
+        steps: Optional[int] = None,
+        depth: Optional[int] = None,
+        memory: Optional[int] = None,
+        seconds: Optional[float] = None,
+    ):
+        # None leaves a resource unlimited.
+        self.steps = steps
+        self.depth = depth
+        self.memory = memory
+        self.seconds = seconds
+
+    def __repr__(self):
+        return f"Limits(steps={self.steps}, depth={self.depth}, memory={self.memory}, seconds={self.seconds})"
+
+
+class Usage:
+    def __init__(self, steps: int, depth: int, max_depth: int, memory: int, seconds: float):
+        self.steps = steps
+        self.depth = depth  # call depth when the usage was taken.
+        self.max_depth = max_depth
+        self.memory = memory
+        self.seconds = seconds
+
+    def as_dict(self) -> dict:
+        return {
+            "steps": self.steps,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "memory": self.memory,
+            "seconds": self.seconds,
+        }
+
+    def __repr__(self):
+        return (
+            f"Usage(steps={self.steps}, depth={self.depth}, max_depth={self.max_depth}, "
+            f"memory={self.memory}, seconds={self.seconds:.3f})"
+        )
+
+
+class ResourceLimitExceeded(Exception):
+    # limit: "steps", "depth", "memory" or "seconds". maximum: the limit
+    # that was set. usage: what the run used up to that point.
+    def __init__(self, limit: str, maximum, usage: Usage):
+        super().__init__(
+            f"Run exceeded its {limit} limit of {maximum} "
+            f"(steps {usage.steps}, depth {usage.depth}, "
+            f"~{usage.memory} bytes allocated, {usage.seconds:.3f}s)."
+        )
+        self.limit = limit
+        self.maximum = maximum
+        self.usage = usage
+
+
+class LimitedInterpreter(Interpreter):
+    def __init__(self, limits: Limits, instruments: Iterable[Instrument] = ()):
+        self.limits = limits
+        super().__init__(instruments)
+        # Array items and products of large ints are charged inside nodes.
+        self.handlers[AssignmentExpr] = self.eval_assignment
+        self.handlers[BinaryExpr] = self.eval_binary_expr
+        self.reset()
+
+    def reset(self):
+        # Usage is counted from here, run() resets it too.
+        self.steps = 0  # steps up to the current chunk.
+        self.chunk = 0  # steps in the current chunk.
+        self.countdown = 0
+        self.depth = 0
+        self.max_depth = 0
+        self.memory = 0
+        self.memory_limit = self.limits.memory
+        self.depth_limit = self.limits.depth
+        self.started = time.monotonic()
+        self.deadline = None if self.limits.seconds is None else self.started + self.limits.seconds
+        self.next_chunk()
+
+    def bind(self):
+        super().bind()
+        # Without enter/exit hooks evaluate_counted dispatches itself, which
+        # saves a call per node.
+        self.inner = self.evaluate
+        self.evaluate = self.evaluate_counted if self.inner == self.dispatch else self.evaluate_counted_traced
+
+    def run(self, program: Stmt, env: Environment) -> RuntimeVal:
+        self.reset()
+        check = ALLOCATION_CHECK.set(self.check_vector)
+        try:
+            return self.run_hooked(program, env)
+        finally:
+            ALLOCATION_CHECK.reset(check)
+
+    def usage(self) -> Usage:
+        return Usage(
+            self.steps + self.chunk - self.countdown,
+            self.depth,
+            self.max_depth,
+            self.memory,
+            time.monotonic() - self.started,
+        )
+
+    def exceeded(self, limit: str, maximum):
+        raise ResourceLimitExceeded(limit, maximum, self.usage())
+
+    def next_chunk(self):
+        self.steps += self.chunk
+        chunk = CHECK_INTERVAL
+        if self.limits.steps is not None:
+            chunk = min(chunk, self.limits.steps - self.steps)
+        self.chunk = self.countdown = chunk
+
+    def checkpoint(self):
+        # The countdown ran out, the step taking it below zero is the first
+        # of the next chunk.
+        self.countdown = 0
+        if self.limits.steps is not None and self.steps + self.chunk >= self.limits.steps:
+            self.exceeded("steps", self.limits.steps)
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            self.exceeded("seconds", self.limits.seconds)
+        self.next_chunk()
+        self.countdown -= 1
+
+    def evaluate_counted(self, astNode: Stmt, env: Environment) -> RuntimeVal:
+        self.countdown -= 1
+        if self.countdown < 0:
+            self.checkpoint()
+        handler = self.handlers.get(type(astNode))
+        if handler is None:
+            return unsupported(astNode)
+        value = handler(astNode, env)
+        after = self.after.get(type(astNode))
+        if after is not None:
+            after(astNode, env, value)
+        return value
+
+    def evaluate_counted_traced(self, astNode: Stmt, env: Environment) -> RuntimeVal:
+        self.countdown -= 1
+        if self.countdown < 0:
+            self.checkpoint()
+        return self.inner(astNode, env)
+
+    def allocate(self, size: int):
+        self.memory += size
+        if self.memory_limit is not None and self.memory > self.memory_limit:
+            self.exceeded("memory", self.memory_limit)
+
+    # Refuses a vector of length numbers a native is about to make when it
+    # would not fit in the memory left. Charged once the native returns.
+    def check_vector(self, length: int):
+        size = VALUE_SIZES[VECTOR_TYPE] + 8 * length
+        if self.memory_limit is not None and self.memory + size > self.memory_limit:
+            self.exceeded("memory", self.memory_limit)
+
+    def allocated(self, value: RuntimeVal) -> RuntimeVal:
+        size = value_size(value)
+        if size:
+            self.allocate(size)
+        if self.on_allocate:
+            return super().allocated(value)
+        return value
+
+    def declared(self, name: str, value: RuntimeVal, env: Environment):
+        self.allocate(ENTRY_SIZE)
+        super().declared(name, value, env)
+
+    # target[key] = value charges the item it appends to an array.
+    def eval_assignment(self, node: AssignmentExpr, env: Environment) -> RuntimeVal:
+        member = node.assigne
+        if type(member) is not MemberExpr or not member.computed:
+            return eval_assignment(node, env)
+        target = evaluate(member.object, env)
+        key = evaluate(member.property, env)
+        value = evaluate(node.value, env)
+        length = len(target.items) if type(target) is ArrayVal else 0
+        write_computed(target, key, value)
+        if type(target) is ArrayVal and len(target.items) > length:
+            self.allocate(PROPERTY_SIZE)
+        return value
+
+    def eval_binary_expr(self, binop: BinaryExpr, env: Environment) -> RuntimeVal:
+        if binop.operator != "*":
+            return eval_binary_expr(binop, env)
+        lhs = evaluate(binop.left, env)
+        rhs = evaluate(binop.right, env)
+        # A product of two large ints is a single step that can run for
+        # minutes. It costs a step per pair of 64 bit words multiplied and is
+        # refused before it is computed when those steps, or its size, go
+        # past the limits.
+        if (
+            type(lhs) is NumberVal
+            and type(rhs) is NumberVal
+            and type(lhs.value) is int
+            and type(rhs.value) is int
+        ):
+            left = lhs.value.bit_length()
+            right = rhs.value.bit_length()
+            if left > BIG_INT_BITS and right > BIG_INT_BITS:
+                self.steps += (left // BIG_INT_BITS) * (right // BIG_INT_BITS)
+                if self.limits.steps is not None and self.steps + self.chunk - self.countdown > self.limits.steps:
+                    self.exceeded("steps", self.limits.steps)
+                if self.memory_limit is not None and self.memory + (left + right) // 8 > self.memory_limit:
+                    self.exceeded("memory", self.memory_limit)
+        if type(lhs) is NumberVal and type(rhs) is NumberVal:
+            return eval_numeric_binary_expr(lhs, rhs, "*")
+        return vector_binary(lhs, rhs, "*")
+
+    def call_function(self, fn: RuntimeVal, args: List[RuntimeVal], env: Environment) -> RuntimeVal:
+        if fn.type != "function":
+            # Natives make objects, vectors and arrays too and grow the
+            # arrays they are given, a large one is only noticed once it
+            # exists.
+            items = array_items(args)
+            value = fn.call(args, env)
+            grown = array_items(args) - items
+            if grown > 0:
+                self.allocate(PROPERTY_SIZE * grown)
+            if value.type in CHARGED_TYPES and all(value is not arg for arg in args):
+                self.allocate(value_size(value))
+            return value
+
+        self.depth += 1
+        try:
+            if self.depth > self.max_depth:
+                self.max_depth = self.depth
+                if self.depth_limit is not None and self.depth > self.depth_limit:
+                    self.exceeded("depth", self.depth_limit)
+            self.allocate(SCOPE_SIZE)
+            return Interpreter.call_function(self, fn, args, env)
+        finally:
+            self.depth -= 1
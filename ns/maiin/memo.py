@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+from maiin.values import MK_NATIVE_FN, FunctionValue, NumberVal, RuntimeVal
+
+if TYPE_CHECKING:
+    from maiin.environment import Environment
+
+# Memoization of NiScript functions. A FunctionValue with a `memo` cache
+# returns the cached result of earlier calls with the same numeric
+# arguments instead of evaluating its body again. Calls with any other
+# argument, and calls that raise, are not cached.
+#
+# Functions get a cache in two ways:
+# - declarations src/purity.py proved pure, when the program was marked
+#   with PurityAnalysis.mark (main.py --memoize),
+# - explicitly from the script, for functions the analysis cannot prove
+#   pure: `memo(fn)` or `memo(fn, size)`.
+#
+# The tree backend (with maiin/instrument.py and maiin/limits.py) and the
+# closure backend use the caches, the other backends ignore them.
+
+DEFAULT_SIZE = 1024
+
+
+class LRUCache:
+    def __init__(self, size: int = DEFAULT_SIZE):
+        self.entries: "OrderedDict[tuple, RuntimeVal]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.resize(size)
+
+    def resize(self, size: int):
+        if size < 1:
+            raise ValueError(f"Memoization needs a cache size of at least 1, got {size}.")
+        self.size = size
+        while len(self.entries) > size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: tuple) -> Optional[RuntimeVal]:
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key: tuple, value: RuntimeVal):
+        entries = self.entries
+        entries[key] = value
+        if len(entries) > self.size:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": self.size,
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Cache key of a call, None when an argument is not a number. Floats are
+# keyed by float.hex: 2 == 2.0 and -0.0 == 0.0, but the calls may differ.
+def memo_key(args: List[RuntimeVal]) -> Optional[tuple]:
+    key = []
+    for arg in args:
+        if type(arg) is not NumberVal:
+            return None
+        value = arg.value
+        key.append(value if type(value) is int else value.hex())
+    return tuple(key)
+
+
+# memo(fn) or memo(fn, size): gives fn a cache and returns it. Calling it on
+# a function that already has one keeps the entries and resizes it.
+def memoFunction(args: List[RuntimeVal], _env: "Environment") -> RuntimeVal:
+    if not args or type(args[0]) is not FunctionValue:
+        raise ValueError("memo expects a function, got " + (str(args[0]) if args else "nothing"))
+    fn = args[0]
+    size = DEFAULT_SIZE
+    if len(args) > 1:
+        if type(args[1]) is not NumberVal:
+            raise ValueError("memo expects a number as cache size, got " + str(args[1]))
+        size = int(args[1].value)
+
+    if fn.memo is None:
+        fn.memo = LRUCache(size)
+    else:
+        fn.memo.resize(size)
+    return fn
+
+
+MEMO = MK_NATIVE_FN(memoFunction)
+
+
+# Caches of the memoized functions in env and its parents, by name.
+def memo_stats(env: "Environment") -> Dict[str, Dict[str, int]]:
+    stats = {}
+    while env is not None:
+        for name, value in env.variables.items():
+            if type(value) is FunctionValue and value.memo is not None and name not in stats:
+                stats[name] = value.memo.stats()
+        env = env.parent
+    return stats
+
+
+def memo_report(env: "Environment") -> str:
+    lines = [f"{'hits':>10} {'misses':>10} {'evictions':>10} {'entries':>10}  function"]
+    for name, stats in sorted(memo_stats(env).items()):
+        lines.append(
+            f"{stats['hits']:>10} {stats['misses']:>10} {stats['evictions']:>10} "
+            f"{stats['entries']:>10}  {name}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,222 @@
+import html
+import sys
+import threading
+import zlib
+from typing import Dict, List, Optional, Tuple
+from src.ast_1 import Identifier
+from maiin.interpreter import evaluate
+from maiin.eval.expressions import eval_call_expr
+from maiin.instrument import Interpreter
+
+# Sampling profiler for NiScript code run by the tree walking evaluator.
+#
+#   with SamplingProfiler(interval=0.005) as profiler:
+#       evaluate(program, env)
+#   profiler.write("profile.html")
+#
+# A background thread wakes up every interval and reads the Python stack of
+# the profiled thread. Every eval_call_expr frame on it that already holds
+# the called function is one NiScript frame, named after the function and
+# the line:column of the call. The evaluator itself is not changed, so the
+# cost is only the GIL time of the sampler thread.
+#
+# Samples are kept as collapsed stacks ("<program>;main:3:1;add:2:5 12"),
+# the input format of flamegraph.pl, speedscope and similar tools. write()
+# produces that text or, for .svg/.html files, a self-contained flame graph.
+
+ROOT = "<program>"
+CALL_CODES = frozenset((eval_call_expr.__code__, Interpreter.eval_call_expr.__code__))
+EVALUATE_CODES = frozenset((evaluate.__code__, Interpreter.dispatch.__code__))
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005, thread_id: Optional[int] = None, positions: bool = True):
+        # interval: seconds between samples. thread_id: the thread running
+        # the scripts, by default the one calling start(). positions: name
+        # frames with the position of the call as well, without it all
+        # calls of a function are merged.
+        self.interval = interval
+        self.thread_id = thread_id
+        self.positions = positions
+        self.samples: Dict[Tuple[str, ...], int] = {}
+        self.stopped = threading.Event()
+        self.sampler: Optional[threading.Thread] = None
+
+    def __enter__(self) -> "SamplingProfiler":
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self) -> "SamplingProfiler":
+        if self.thread_id is None:
+            self.thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.sampler = threading.Thread(target=self.run, name="niscript-profiler", daemon=True)
+        self.sampler.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+            self.sampler = None
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = script_stack(frame, self.positions)
+            del frame
+            if stack is not None:
+                self.samples[stack] = self.samples.get(stack, 0) + 1
+
+    @property
+    def total(self) -> int:
+        return sum(self.samples.values())
+
+    def collapsed(self) -> str:
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(self.samples.items()))
+
+    def write(self, path: str, title: str = "NiScript profile"):
+        # Collapsed stacks, or a flame graph for .svg and .html paths.
+        if path.endswith(".svg"):
+            text = flamegraph_svg(self.samples, title)
+        elif path.endswith(".html"):
+            text = flamegraph_html(self.samples, title)
+        else:
+            text = self.collapsed()
+        with open(path, "w") as file:
+            file.write(text)
+
+
+# The NiScript frames on a Python stack, outermost first. None when the
+# thread is not evaluating NiScript code.
+def script_stack(frame, positions: bool = True) -> Optional[Tuple[str, ...]]:
+    frames: List[str] = []
+    evaluating = False
+    while frame is not None:
+        code = frame.f_code
+        if code in CALL_CODES:
+            local = frame.f_locals
+            fn = local.get("fn")
+            # Without fn the arguments are still being evaluated.
+            if fn is not None:
+                frames.append(frame_name(local["expr"], fn, positions))
+            evaluating = True
+        elif code in EVALUATE_CODES:
+            evaluating = True
+        frame = frame.f_back
+
+    if not evaluating:
+        return None
+    frames.append(ROOT)
+    frames.reverse()
+    return tuple(frames)
+
+
+def frame_name(expr, fn, positions: bool = True) -> str:
+    name = getattr(fn, "name", None)
+    if name is None:
+        name = expr.caller.symbol if isinstance(expr.caller, Identifier) else "<native>"
+    return f"{name}:{expr.line}:{expr.column}" if positions else name
+
+
+# FLAME GRAPHS
+
+ROW_HEIGHT = 17
+WIDTH = 1200
+MIN_WIDTH = 0.1  # narrower frames are left out.
+
+
+class _Node:
+    __slots__ = ("name", "count", "children")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.children: Dict[str, "_Node"] = {}
+
+
+def build_tree(samples: Dict[Tuple[str, ...], int]) -> _Node:
+    root = _Node("")
+    for stack, count in samples.items():
+        root.count += count
+        node = root
+        for name in stack:
+            child = node.children.get(name)
+            if child is None:
+                child = node.children[name] = _Node(name)
+            child.count += count
+            node = child
+    return root
+
+
+def depth_of(node: _Node) -> int:
+    return 1 + max((depth_of(child) for child in node.children.values()), default=0)
+
+
+def color(name: str) -> str:
+    # Stable warm colours, the same function always gets the same one.
+    value = zlib.crc32(name.split(":")[0].encode())
+    return f"rgb({205 + value % 50},{80 + (value >> 8) % 130},{(value >> 16) % 60})"
+
+
+def flamegraph_svg(samples: Dict[Tuple[str, ...], int], title: str = "NiScript profile") -> str:
+    root = build_tree(samples)
+    total = root.count or 1
+    depth = depth_of(root) - 1
+    top = 2 * ROW_HEIGHT
+    height = top + depth * ROW_HEIGHT + 4
+    scale = WIDTH / total
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{height}" '
+        f'viewBox="0 0 {WIDTH} {height}" font-family="monospace" font-size="11">',
+        f'<rect width="100%" height="100%" fill="#fdfdf6"/>',
+        f'<text x="{WIDTH / 2}" y="{ROW_HEIGHT}" text-anchor="middle" font-size="14">'
+        f'{html.escape(title)} ({root.count} samples)</text>',
+    ]
+
+    # Roots at the bottom, callees stacked on top of their callers.
+    pending = []
+    x = 0.0
+    for name in sorted(root.children):
+        child = root.children[name]
+        pending.append((child, x, 0))
+        x += child.count * scale
+    while pending:
+        node, x, level = pending.pop()
+        width = node.count * scale
+        if width < MIN_WIDTH:
+            continue
+        y = height - 4 - (level + 1) * ROW_HEIGHT
+        label = html.escape(node.name)
+        share = node.count * 100 / total
+        parts.append(
+            f'<g><title>{label} ({node.count} samples, {share:.2f}%)</title>'
+            f'<rect x="{x:.2f}" y="{y}" width="{width:.2f}" height="{ROW_HEIGHT - 1}" '
+            f'fill="{color(node.name)}" rx="2"/>'
+        )
+        # About 7 pixels per character at font-size 11.
+        chars = int((width - 6) / 7)
+        if chars >= 3:
+            text = node.name if len(node.name) <= chars else node.name[:chars - 2] + ".."
+            parts.append(f'<text x="{x + 3:.2f}" y="{y + ROW_HEIGHT - 5}">{html.escape(text)}</text>')
+        parts.append("</g>")
+
+        child_x = x
+        for name in sorted(node.children):
+            child = node.children[name]
+            pending.append((child, child_x, level + 1))
+            child_x += child.count * scale
+
+    parts.append("</svg>")
+    return "\n".join(parts) + "\n"
+
+
+def flamegraph_html(samples: Dict[Tuple[str, ...], int], title: str = "NiScript profile") -> str:
+    return (
+        f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"utf-8\">\n<title>{html.escape(title)}</title>\n"
+        f"</head>\n<body>\n{flamegraph_svg(samples, title)}</body>\n</html>\n"
+    )
@@ -0,0 +1,211 @@
+from typing import Dict, List, Optional, Set, Tuple
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    FunctionDeclaration,
+    Identifier,
+    MemberExpr,
+    ObjectLiteral,
+    Program,
+    Stmt,
+    VarDeclaration,
+)
+from maiin.environment import Environment
+
+# The resolver runs after parsing and gives every variable a static address:
+# - depth: how many frames to walk up from the current one.
+# - slot: index of the variable inside that frame.
+# Frames are lists whose first item is the parent frame, so slots start at 1.
+#
+# It annotates the AST in place:
+# - Identifier / AssignmentExpr / Property (shorthand):
+#     depth, slot       first frame that may hold the name, depth is None
+#                       when the name is not declared anywhere.
+#     definite          True when that frame is known to hold the name by
+#                       the time the node runs.
+#     fallbacks         ((depth, slot, constant), ...) further frames to try
+#                       when the first one has not declared the name yet.
+#     constant          whether the first binding is const.
+# - VarDeclaration / FunctionDeclaration: slot in the current frame, None
+#   when the name is declared already and the declaration raises.
+# - FunctionDeclaration: repeated, index of the first parameter with the
+#   name of an earlier one (None for none), calls raise there.
+# - FunctionDeclaration / Program: frame_size (slots including the parent).
+# - Program: global_names, the name held by every global slot, the first
+#   builtin_count of them come from the global Environment.
+#
+# Names are declared at runtime in statement order, so an identifier only
+# refers to its own scope after the declaration has run, and a function body
+# may see names its enclosing scopes declare later. Those cases keep a
+# runtime check, everything else becomes two index operations. Errors the
+# resolver can already see (redeclarations, assigning a const) are left to
+# the statement raising them, like the tree walker does when it runs it.
+
+
+class Scope:
+    def __init__(self, parent: Optional["Scope"], names: List[str], constants: Set[str]):
+        self.parent = parent
+        # Slot of every name declared anywhere in this scope.
+        self.layout: Dict[str, int] = {}
+        for name in names:
+            if name not in self.layout:
+                self.layout[name] = len(self.layout) + 1
+        self.constants = constants
+        # Names declared so far, in statement order.
+        self.declared: Set[str] = set()
+        # Names each enclosing scope had declared when this function was
+        # created. Index 0 is the parent.
+        self.snapshots: List[Set[str]] = []
+
+    @property
+    def frame_size(self) -> int:
+        return len(self.layout) + 1
+
+
+# The names a body declares and which of them are const. Only the first
+# declaration of a name binds it (after the parameters), a later one raises.
+def declared_names(body: List[Stmt], parameters: List[str] = ()) -> Tuple[List[str], Set[str]]:
+    names = []
+    constants = set()
+    bound = set(parameters)
+    for stmt in body:
+        if isinstance(stmt, VarDeclaration):
+            name = stmt.identifier
+            constant = stmt.constant
+        elif isinstance(stmt, FunctionDeclaration):
+            name = stmt.name
+            constant = True
+        else:
+            continue
+        names.append(name)
+        if name not in bound:
+            bound.add(name)
+            if constant:
+                constants.add(name)
+    return names, constants
+
+
+class Resolver:
+    def __init__(self, env: Environment):
+        # Names provided by the global environment, e.g. print and time.
+        self.env = env
+
+    def resolve_program(self, program: Program) -> Program:
+        names, constants = declared_names(program.body)
+        builtins = list(self.env.variables)
+        scope = Scope(None, builtins + names, constants | self.env.constants)
+        scope.declared.update(builtins)
+
+        for stmt in program.body:
+            self.resolve(stmt, scope)
+
+        program.frame_size = scope.frame_size
+        program.global_names = list(scope.layout)
+        program.builtin_count = len(builtins)
+        return program
+
+    def resolve(self, node: Stmt, scope: Scope):
+        if isinstance(node, Identifier):
+            self.resolve_name(node, node.symbol, scope)
+        elif isinstance(node, BinaryExpr):
+            self.resolve(node.left, scope)
+            self.resolve(node.right, scope)
+        elif isinstance(node, CallExpr):
+            for arg in node.args:
+                self.resolve(arg, scope)
+            self.resolve(node.caller, scope)
+        elif isinstance(node, AssignmentExpr):
+            self.resolve_assignment(node, scope)
+        elif isinstance(node, ObjectLiteral):
+            for prop in node.properties:
+                if prop.value is None:
+                    self.resolve_name(prop, prop.key, scope)
+                else:
+                    self.resolve(prop.value, scope)
+        elif isinstance(node, ArrayLiteral):
+            for element in node.elements:
+                self.resolve(element, scope)
+        elif isinstance(node, MemberExpr):
+            self.resolve(node.object, scope)
+            if node.computed:
+                self.resolve(node.property, scope)
+        elif isinstance(node, VarDeclaration):
+            if node.value is not None:
+                self.resolve(node.value, scope)
+            node.slot = self.declare(node.identifier, scope)
+        elif isinstance(node, FunctionDeclaration):
+            node.slot = self.declare(node.name, scope)
+            self.resolve_function(node, scope)
+
+    def declare(self, name: str, scope: Scope) -> Optional[int]:
+        if name in scope.declared:
+            return None
+        scope.declared.add(name)
+        return scope.layout[name]
+
+    def resolve_function(self, node: FunctionDeclaration, scope: Scope):
+        names, constants = declared_names(node.body, node.parameters)
+        body_scope = Scope(scope, node.parameters + names, constants)
+        body_scope.snapshots = [set(scope.declared)] + scope.snapshots
+        node.repeated = None
+        for i, name in enumerate(node.parameters):
+            if self.declare(name, body_scope) is None and node.repeated is None:
+                node.repeated = i
+
+        for stmt in node.body:
+            self.resolve(stmt, body_scope)
+
+        node.frame_size = body_scope.frame_size
+
+    def lookup(self, name: str, scope: Scope) -> List[Tuple[int, int, bool, bool]]:
+        # Candidate (depth, slot, constant, definite) bindings, innermost first.
+        if name in scope.declared:
+            return [(0, scope.layout[name], name in scope.constants, True)]
+
+        candidates = []
+        depth = 1
+        current = scope.parent
+        while current is not None:
+            if name in current.layout:
+                definite = name in scope.snapshots[depth - 1]
+                candidates.append((depth, current.layout[name], name in current.constants, definite))
+                if definite:
+                    break
+            current = current.parent
+            depth += 1
+        return candidates
+
+    def resolve_name(self, node: Stmt, name: str, scope: Scope):
+        candidates = self.lookup(name, scope)
+        if not candidates:
+            node.depth = None
+            node.slot = None
+            node.definite = False
+            node.constant = False
+            node.fallbacks = ()
+            return
+
+        depth, slot, constant, definite = candidates[0]
+        node.depth = depth
+        node.slot = slot
+        node.definite = definite
+        node.constant = constant
+        node.fallbacks = tuple((d, s, c) for d, s, c, _definite in candidates[1:])
+
+    def resolve_assignment(self, node: AssignmentExpr, scope: Scope):
+        if isinstance(node.assigne, MemberExpr):
+            self.resolve(node.assigne, scope)
+            self.resolve(node.value, scope)
+            return
+        # The runtime rejects other targets before evaluating anything.
+        if not isinstance(node.assigne, Identifier):
+            return
+
+        self.resolve(node.value, scope)
+        self.resolve_name(node, node.assigne.symbol, scope)
+
+
+def resolve_program(program: Program, env: Environment) -> Program:
+    return Resolver(env).resolve_program(program)
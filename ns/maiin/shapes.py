@@ -0,0 +1,168 @@
+from typing import Dict, List, Optional, Tuple
+from src.ast_1 import MemberExpr, ObjectLiteral
+from maiin.values import MK_OBJECT, NULL, NumberVal, ObjectVal, RuntimeVal, Shape, shape_for
+
+# Object literals and member access on shape based objects (see Shape in
+# maiin/values.py).
+#
+# An object literal site builds every object with the same keys, so it
+# keeps a LiteralSite holding their Shape: building an object allocates the
+# list of values and nothing else.
+#
+# Every `o.key` site keeps a MemberCache, its inline cache: the shapes the
+# site has seen and the index of key in each of them. An object of a shape
+# seen before is read by index without hashing key. A site starts out
+# monomorphic (one shape), turns polymorphic when a second shape shows up
+# and megamorphic past POLYMORPHIC_LIMIT shapes, after which new shapes are
+# looked up in Shape.slots every time and only the last one is remembered.
+#
+# Threads running one program (maiin/embedding.py) share its sites. A
+# MemberCache never changes a value other threads may be reading: the last
+# shape and its index are replaced together as one tuple, and the shapes of
+# a polymorphic site are copied into a new dict to add one. A thread racing
+# another may drop a shape the other added, it is looked up again later,
+# but it never pairs a shape with the index of another.
+#
+# Computed keys (`o[k]`) change between runs of the same site. They are
+# turned into a key by property_key and looked up in Shape.slots directly
+# (read_member).
+#
+# Reading a key the object does not have gives null, reading from anything
+# but an object raises.
+#
+# The backends keep the sites on the AST nodes (ObjectLiteral.site,
+# MemberExpr.site, never cached to disk) or in their compiled code. A
+# literal site never changes once made, so threads racing to make one only
+# build it twice.
+
+POLYMORPHIC_LIMIT = 4
+
+# Index MemberCache.lookup returns for a key the shape does not have.
+MISSING = -1
+
+_inline_caches = True
+
+
+# With enabled False, member sites created afterwards look every key up in
+# Shape.slots, which is what a dict backed object does.
+def set_inline_caches(enabled: bool = True):
+    global _inline_caches
+    _inline_caches = enabled
+
+
+class LiteralSite:
+    __slots__ = ("count", "shape", "slots")
+
+    def __init__(self, keys: List[str]):
+        # Properties of the literal, repeated keys included.
+        self.count = len(keys)
+        # A repeated key keeps its first position and its last value.
+        self.shape: Shape = shape_for(tuple(dict.fromkeys(keys)))
+        # Index of every property in the values, None when the keys are
+        # distinct and the values are already in order.
+        self.slots: Optional[List[int]] = None
+        if len(self.shape.keys) != len(keys):
+            self.slots = [self.shape.slots[key] for key in keys]
+
+    def __repr__(self):
+        return repr(self.shape)
+
+    # values: one per property of the literal, in source order.
+    def build(self, values: List[RuntimeVal]) -> ObjectVal:
+        if self.slots is not None:
+            ordered = [NULL] * len(self.shape.keys)
+            for slot, value in zip(self.slots, values):
+                ordered[slot] = value
+            values = ordered
+        return MK_OBJECT(self.shape, values)
+
+
+def literal_site(node: ObjectLiteral) -> LiteralSite:
+    return LiteralSite([prop.key for prop in node.properties])
+
+
+class MemberCache:
+    __slots__ = ("key", "entry", "shapes", "megamorphic", "enabled")
+
+    def __init__(self, key: str):
+        self.key = key
+        # (last shape seen, index of key in it). Callers check
+        # `obj.shape is cache.entry[0]` themselves before calling lookup.
+        self.entry: Tuple[Optional[Shape], int] = (None, MISSING)
+        # Every shape seen once the site is polymorphic, never changed
+        # once set.
+        self.shapes: Optional[Dict[Shape, int]] = None
+        self.megamorphic = False
+        self.enabled = _inline_caches
+
+    def __repr__(self):
+        return f"<member .{self.key} {self.state}>"
+
+    @property
+    def state(self) -> str:
+        if self.megamorphic:
+            return "megamorphic"
+        if self.shapes is not None:
+            return "polymorphic"
+        return "monomorphic" if self.entry[0] is not None else "uninitialized"
+
+    # The index of key in shape, for a shape other than the last one.
+    def lookup(self, shape: Shape) -> int:
+        shapes = self.shapes
+        if shapes is not None:
+            index = shapes.get(shape)
+            if index is not None:
+                self.entry = (shape, index)
+                return index
+
+        index = shape.slots.get(self.key, MISSING)
+        if not self.enabled:
+            return index
+
+        last, last_index = self.entry
+        if last is not None and not self.megamorphic:
+            if shapes is None:
+                self.shapes = {last: last_index, shape: index}
+            elif len(shapes) < POLYMORPHIC_LIMIT:
+                shapes = dict(shapes)
+                shapes[shape] = index
+                self.shapes = shapes
+            else:
+                self.megamorphic = True
+                self.shapes = None
+        self.entry = (shape, index)
+        return index
+
+    def read(self, target: RuntimeVal) -> RuntimeVal:
+        if type(target) is not ObjectVal:
+            raise not_an_object(self.key, target)
+        shape = target.shape
+        entry = self.entry
+        index = entry[1] if entry[0] is shape else self.lookup(shape)
+        return NULL if index == MISSING else target.values[index]
+
+
+def member_cache(node: MemberExpr) -> MemberCache:
+    return MemberCache(node.property.symbol)
+
+
+# The key a computed member access reads. Whole numbers drop the fraction,
+# so o[1] reads the key "1" of an object gather built.
+def property_key(value: RuntimeVal) -> str:
+    if type(value) is not NumberVal:
+        raise ValueError(f"Cannot use {value.type} as a property key.")
+    number = value.value
+    if type(number) is int or number.is_integer():
+        return str(int(number))
+    return str(number)
+
+
+def read_member(target: RuntimeVal, key: str) -> RuntimeVal:
+    if type(target) is not ObjectVal:
+        raise not_an_object(key, target)
+    index = target.shape.slots.get(key)
+    return NULL if index is None else target.values[index]
+
+
+def not_an_object(key: str, target: RuntimeVal) -> Exception:
+    return ValueError(f"Cannot read property {key} of {target.type}.")
@@ -0,0 +1,374 @@
+import math
+from typing import Dict, List, Optional, Set, TextIO
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    FunctionDeclaration,
+    Identifier,
+    MemberExpr,
+    NumericLiteral,
+    ObjectLiteral,
+    Stmt,
+    VarDeclaration,
+)
+from maiin.arrays import not_assignable, read_computed, write_computed
+from maiin.environment import Environment
+from maiin.shapes import literal_site, member_cache
+from maiin.vectors import vector_binary
+from maiin.values import MK_ARRAY, MK_NUMBER, NULL, FunctionValue, NativeFnValue, NumberVal
+
+# Tiered execution for the tree walker: hot functions are translated to
+# Python source and run as compiled Python functions. It is off unless
+# turned on, the tree walker stays the reference the other backends are
+# compared against (tools/differential.py).
+#
+#   set_tier_threshold(1000)   # None (the default) keeps functions interpreted
+#   set_tier_dump(sys.stderr)  # print the source of every tiered function
+#
+# With a threshold, call_function (maiin/eval/expressions.py) counts the
+# calls of every FunctionValue. On the call reaching the threshold the body
+# is translated, compiled with compile() and kept in fn.code, later calls
+# run it instead of walking the body.
+#
+# Bodies are straight-line code, so where a name resolves is known before
+# running them: parameters and the let/const declared by earlier statements
+# are Python locals, every other name is looked up in the defining
+# Environment when it is read, like the tree walker does. Every step goes
+# to its own temporary, which keeps the order of evaluation (arguments
+# before the callee, the left operand before the right one) and so the
+# errors raised. The scope of a call is only made when a native is called:
+# like from the tree walker the native gets an Environment holding the
+# parameters and the locals declared so far, as they are at the call.
+#
+# Functions the translator does not handle stay with the tree walker for
+# good (a bailout): bodies declaring functions (they would capture the
+# scope), variables in Cells (maiin/captures.py), repeated parameters and
+# nodes it does not know.
+
+# A threshold that pays off for most scripts, used by the benchmark.
+DEFAULT_THRESHOLD = 1000
+
+_threshold: Optional[int] = None
+_dump: Optional[TextIO] = None
+
+# fn.code of a function the translator gave up on.
+BAILED_OUT = "bailed out"
+
+
+# Calls before a function is translated, None to turn tiering off.
+# Functions already translated keep running translated.
+def set_tier_threshold(threshold: Optional[int] = None):
+    global _threshold
+    _threshold = threshold
+
+
+# Where the source of tiered functions is written, None for nowhere.
+def set_tier_dump(stream: Optional[TextIO] = None):
+    global _dump
+    _dump = stream
+
+
+# Counts a call of fn, an interpreted function. Returns its tiered code once
+# it has one, None while it stays interpreted.
+def count_call(fn: FunctionValue):
+    if _threshold is None:
+        return None
+    fn.calls += 1
+    if fn.calls < _threshold:
+        return None
+    fn.code = tier_up(fn)
+    return None if fn.code is BAILED_OUT else fn.code
+
+
+def tier_up(fn: FunctionValue):
+    try:
+        source, namespace = Translator(fn).translate()
+    except Bailout as bailout:
+        if _dump is not None:
+            print(f"# {fn.name} stays interpreted: {bailout}", file=_dump)
+        return BAILED_OUT
+
+    if _dump is not None:
+        print(source, file=_dump)
+    exec(compile(source, f"<tiered {fn.name}>", "exec"), namespace)
+    return namespace["make"](fn.declarationEnv)
+
+
+class Bailout(Exception):
+    pass
+
+
+# The scope a native called from a tiered function gets, see Translator.call.
+def call_scope(parent: Environment, variables: Dict[str, object], constants: frozenset) -> Environment:
+    scope = Environment(parent)
+    scope.variables = variables
+    scope.constants = set(constants)
+    return scope
+
+
+# Operators of eval_numeric_binary_expr, any other one is modulo.
+OPERATORS = {"+": "+", "-": "-", "*": "*", "/": "/"}
+
+
+class Translator:
+    def __init__(self, fn: FunctionValue):
+        self.fn = fn
+        self.lines: List[str] = []
+        self.namespace: Dict[str, object] = {
+            "NULL": NULL,
+            "NumberVal": NumberVal,
+            "MK_NUMBER": MK_NUMBER,
+            "MK_ARRAY": MK_ARRAY,
+            "vector_binary": vector_binary,
+            "read_computed": read_computed,
+            "write_computed": write_computed,
+            "not_assignable": not_assignable,
+            "NativeFnValue": NativeFnValue,
+            "call_scope": call_scope,
+        }
+        self.temps = 0
+        # Names declared in the scope so far, and which of them are const.
+        self.locals: Set[str] = set()
+        self.declared: List[str] = []  # the same, in the order they are declared.
+        self.constants: Set[str] = set()
+        # Locals the current statement assigns, reads of them are copied.
+        self.assigned: Set[str] = set()
+
+    def translate(self) -> tuple:
+        fn = self.fn
+        if fn.cells:
+            raise Bailout("parameters in cells")
+        if len(set(fn.parameters)) != len(fn.parameters):
+            raise Bailout("repeated parameters")
+
+        # Imported here, maiin.eval.expressions imports this module.
+        from maiin.eval.expressions import call_function
+        self.namespace["call_function"] = call_function
+
+        for i, name in enumerate(fn.parameters):
+            self.emit(f"v_{name} = args[{i}]")
+            self.locals.add(name)
+            self.declared.append(name)
+
+        result = "NULL"
+        for stmt in fn.body:
+            self.assigned = assigned_names(stmt) & self.locals
+            result = self.statement(stmt)
+        self.emit(f"return {result}")
+
+        header = [
+            f"# tiered {fn.name}({', '.join(fn.parameters)})",
+            "def make(parent):",
+            "    lookup = parent.lookupVar",
+            "    assign = parent.assignVar",
+            f"    def tiered_{fn.name}(args):",
+        ]
+        body = ["        " + line for line in self.lines]
+        return "\n".join(header + body + [f"    return tiered_{fn.name}", ""]), self.namespace
+
+    def emit(self, line: str):
+        self.lines.append(line)
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f"t{self.temps}"
+
+    def constant(self, value, prefix: str = "c") -> str:
+        name = f"{prefix}{len(self.namespace)}"
+        self.namespace[name] = value
+        return name
+
+    # STATEMENTS
+
+    def statement(self, stmt: Stmt) -> str:
+        if isinstance(stmt, VarDeclaration):
+            return self.declaration(stmt)
+        return self.expression(stmt)
+
+    def declaration(self, node: VarDeclaration) -> str:
+        if node.cell:
+            raise Bailout(f"variable {node.identifier} in a cell")
+        value = self.expression(node.value) if node.value else "NULL"
+        name = node.identifier
+        if name in self.locals:
+            self.emit(f"raise Exception({f'Cannot declare variable {name}. As it already is defined.'!r})")
+            return value
+        self.emit(f"v_{name} = {value}")
+        self.locals.add(name)
+        self.declared.append(name)
+        if node.constant:
+            self.constants.add(name)
+        return f"v_{name}"
+
+    # EXPRESSIONS
+    # Each returns a Python expression for the value that has no side
+    # effects and stays the same until the statement ends.
+
+    def expression(self, node: Stmt) -> str:
+        if isinstance(node, NumericLiteral):
+            return self.constant(MK_NUMBER(node.value))
+        if isinstance(node, Identifier):
+            return self.identifier(node)
+        if isinstance(node, BinaryExpr):
+            return self.binary(node)
+        if isinstance(node, CallExpr):
+            return self.call(node)
+        if isinstance(node, MemberExpr):
+            return self.member(node)
+        if isinstance(node, AssignmentExpr):
+            return self.assignment(node)
+        if isinstance(node, ObjectLiteral):
+            return self.object(node)
+        if isinstance(node, ArrayLiteral):
+            return self.array(node)
+        raise Bailout(f"{node.kind} is not translated")
+
+    def identifier(self, node: Identifier) -> str:
+        if node.cell:
+            raise Bailout(f"variable {node.symbol} in a cell")
+        return self.read(node.symbol)
+
+    def read(self, name: str) -> str:
+        if name in self.locals and name not in self.assigned:
+            return f"v_{name}"
+        t = self.temp()
+        if name in self.locals:
+            self.emit(f"{t} = v_{name}")
+        else:
+            self.emit(f"{t} = lookup({name!r})")
+        return t
+
+    def binary(self, node: BinaryExpr) -> str:
+        left = self.operand(node.left)
+        right = self.operand(node.right)
+        operator = OPERATORS.get(node.operator, "%")
+        # Literal operands are known numbers and used as they are.
+        checks = [f"type({value}) is NumberVal" for value, number in (left, right) if number is None]
+        if len(checks) == 2 and left[0] == right[0]:
+            checks.pop()
+        lhs = left[1] if left[1] is not None else f"{left[0]}.value"
+        rhs = right[1] if right[1] is not None else f"{right[0]}.value"
+
+        t = self.temp()
+        result = f"MK_NUMBER({lhs} {operator} {rhs})"
+        if checks:
+            result += f" if {' and '.join(checks)} else vector_binary({left[0]}, {right[0]}, {node.operator!r})"
+        self.emit(f"{t} = {result}")
+        return t
+
+    # (value, source of the number when it is a literal)
+    def operand(self, node: Stmt) -> tuple:
+        value = self.expression(node)
+        if not isinstance(node, NumericLiteral):
+            return value, None
+        number = node.value
+        if type(number) is float and not math.isfinite(number):
+            return value, self.constant(number, "n")
+        return value, f"({number!r})"
+
+    def call(self, node: CallExpr) -> str:
+        args = [self.expression(arg) for arg in node.args]
+        callee = self.expression(node.caller)
+        t = self.temp()
+        # Script functions ignore the scope they are called from.
+        variables = ", ".join(f"{name!r}: v_{name}" for name in self.declared)
+        constants = self.constant(frozenset(self.constants))
+        scope = f"call_scope(parent, {{{variables}}}, {constants})"
+        self.emit(
+            f"{t} = call_function({callee}, [{', '.join(args)}], "
+            f"{scope} if type({callee}) is NativeFnValue else parent)"
+        )
+        return t
+
+    def member(self, node: MemberExpr) -> str:
+        target = self.expression(node.object)
+        t = self.temp()
+        if node.computed:
+            key = self.expression(node.property)
+            self.emit(f"{t} = read_computed({target}, {key})")
+            return t
+
+        site = node.site
+        if site is None:
+            site = node.site = member_cache(node)
+        self.emit(f"{t} = {self.constant(site, 's')}.read({target})")
+        return t
+
+    def assignment(self, node: AssignmentExpr) -> str:
+        target = node.assigne
+        if isinstance(target, MemberExpr):
+            return self.member_assignment(node)
+        if not isinstance(target, Identifier):
+            raise Bailout("invalid assignment target")
+        if node.cell:
+            raise Bailout(f"variable {target.symbol} in a cell")
+
+        value = self.expression(node.value)
+        name = target.symbol
+        if name in self.constants:
+            self.emit(f"raise Exception({f'Cannot reassign to variable {name} as it was declared constant.'!r})")
+            return value
+        if name in self.locals:
+            # The value may be a read of another local assigned later on.
+            t = self.temp()
+            self.emit(f"{t} = v_{name} = {value}")
+            return t
+        t = self.temp()
+        self.emit(f"{t} = assign({name!r}, {value})")
+        return t
+
+    def member_assignment(self, node: AssignmentExpr) -> str:
+        member = node.assigne
+        target = self.expression(member.object)
+        if not member.computed:
+            self.expression(node.value)
+            self.emit(f"raise not_assignable({member.property.symbol!r}, {target})")
+            return "NULL"
+        key = self.expression(member.property)
+        value = self.expression(node.value)
+        t = self.temp()
+        self.emit(f"{t} = write_computed({target}, {key}, {value})")
+        return t
+
+    def object(self, node: ObjectLiteral) -> str:
+        site = node.site
+        if site is None:
+            site = node.site = literal_site(node)
+
+        values = []
+        for prop in node.properties:
+            if prop.value is not None:
+                values.append(self.expression(prop.value))
+            elif prop.cell:
+                raise Bailout(f"variable {prop.key} in a cell")
+            else:
+                values.append(self.read(prop.key))
+        t = self.temp()
+        self.emit(f"{t} = {self.constant(site, 's')}.build([{', '.join(values)}])")
+        return t
+
+    def array(self, node: ArrayLiteral) -> str:
+        elements = [self.expression(element) for element in node.elements]
+        t = self.temp()
+        self.emit(f"{t} = MK_ARRAY([{', '.join(elements)}])")
+        return t
+
+
+# Names stmt assigns with `name = ...`, anywhere inside it. Function
+# declarations are not translated, so they are not looked into.
+def assigned_names(node) -> Set[str]:
+    names: Set[str] = set()
+    todo = [node]
+    while todo:
+        node = todo.pop()
+        if isinstance(node, AssignmentExpr) and isinstance(node.assigne, Identifier):
+            names.add(node.assigne.symbol)
+        if isinstance(node, FunctionDeclaration):
+            continue
+        if isinstance(node, Stmt):
+            todo.extend(vars(node).values())
+        elif isinstance(node, list):
+            todo.extend(node)
+    return names
@@ -1,71 +1,234 @@
+from weakref import WeakValueDictionary
 from src.ast_1 import Stmt
-from maiin.environment import Environment
-from typing import List, Dict, Callable
+from typing import TYPE_CHECKING, List, Dict, Callable, Optional, Tuple
 
+if TYPE_CHECKING:
+    from maiin.environment import Environment
 
-class ValueType:
-    def __init__(self, type_name: str):
-        self.type_name = type_name
+
+# Type tags are plain strings, so `val.type == "number"` is a string compare.
+# Every value of a type shares the module level tag below.
+class ValueType(str):
+    __slots__ = ()
 
     def __repr__(self):
-        return self.type_name
+        return str.__str__(self)
+
+
+NULL_TYPE = ValueType("null")
+BOOLEAN_TYPE = ValueType("boolean")
+NUMBER_TYPE = ValueType("number")
+OBJECT_TYPE = ValueType("object")
+NATIVE_FN_TYPE = ValueType("native-fn")
+FUNCTION_TYPE = ValueType("function")
+VECTOR_TYPE = ValueType("vector")
+ARRAY_TYPE = ValueType("array")
 
 
+# Values other than arrays are immutable, so the same instance can be handed
+# out any number of times. Subclasses keep `type` as a class
+# attribute and declare __slots__ so instances carry no __dict__.
 class RuntimeVal:
-    def __init__(self, type: ValueType):
-        self.type = type
+    __slots__ = ()
+    type: ValueType
 
 
 class NullVal(RuntimeVal):
+    __slots__ = ("value",)
+    type = NULL_TYPE
+
     def __init__(self):
-        super().__init__(ValueType("null"))
         self.value = None
 
 
+NULL = NullVal()
+
+
 def MK_NULL() -> NullVal:
-    return NullVal()
+    return NULL
 
 
 class BooleanVal(RuntimeVal):
+    __slots__ = ("value",)
+    type = BOOLEAN_TYPE
+
     def __init__(self, value: bool):
-        super().__init__(ValueType("boolean"))
         self.value = value
 
 
+TRUE = BooleanVal(True)
+FALSE = BooleanVal(False)
+
+
 def MK_BOOL(b: bool = True) -> BooleanVal:
-    return BooleanVal(b)
+    return TRUE if b else FALSE
 
 
+# Numbers are exact ints until a float gets involved. Integer literals are
+# ints, `+ - * %` of two ints stay ints of any size, `/` and any operation
+# with a float operand give a float. That is how Python's own operators
+# behave, so every backend gets it from `lhs.value + rhs.value`.
 class NumberVal(RuntimeVal):
+    __slots__ = ("value",)
+    type = NUMBER_TYPE
+
     def __init__(self, value: float):
-        super().__init__(ValueType("number"))
+        # An int or a float.
         self.value = value
 
 
+# Small ints are interned, see set_number_cache.
+SMALL_NUMBERS = range(-5, 257)
+_number_cache: Dict[int, NumberVal] = {}
+
+
+def set_number_cache(enabled: bool = True):
+    _number_cache.clear()
+    if enabled:
+        for n in SMALL_NUMBERS:
+            _number_cache[n] = NumberVal(n)
+
+
+set_number_cache(True)
+
+
+# The interned NumberVal of an int, None when there is none. Lets hot code
+# inline MK_NUMBER as `(type(n) is int and interned_number(n)) or NumberVal(n)`.
+interned_number = _number_cache.get
+
+
 def MK_NUMBER(n: float = 0) -> NumberVal:
+    # Only ints are looked up: 2.0 == 2 but is a different number, and so
+    # is -0.0.
+    if type(n) is int:
+        cached = _number_cache.get(n)
+        if cached is not None:
+            return cached
     return NumberVal(n)
 
 
+# Whether value is one of the shared instances above, which MK_NULL, MK_BOOL
+# and MK_NUMBER return instead of allocating.
+def is_interned(value: RuntimeVal) -> bool:
+    if value is NULL or value is TRUE or value is FALSE:
+        return True
+    return type(value) is NumberVal and _number_cache.get(value.value) is value
+
+
+# Hidden class of an object: its keys in order and the index of every key in
+# ObjectVal.values. Objects with the same keys share one Shape, so the keys
+# are stored once per shape instead of once per object. An object never
+# gains or loses keys after it is built, so shapes are interned by their
+# keys rather than linked by transitions.
+class Shape:
+    __slots__ = ("keys", "slots", "__weakref__")
+
+    def __init__(self, keys: Tuple[str, ...]):
+        self.keys = keys
+        self.slots: Dict[str, int] = {key: i for i, key in enumerate(keys)}
+
+    def __repr__(self):
+        return f"<shape {', '.join(self.keys)}>"
+
+
+# Shapes live as long as an object or a literal site uses them.
+_shapes: "WeakValueDictionary[Tuple[str, ...], Shape]" = WeakValueDictionary()
+
+
+# keys must be distinct.
+def shape_for(keys: Tuple[str, ...]) -> Shape:
+    shape = _shapes.get(keys)
+    if shape is None:
+        shape = _shapes[keys] = Shape(keys)
+    return shape
+
+
 class ObjectVal(RuntimeVal):
+    __slots__ = ("shape", "values")
+    type = OBJECT_TYPE
+
     def __init__(self, properties: Dict[str, RuntimeVal]):
-        super().__init__(ValueType("object"))
-        self.properties = properties
+        self.shape = shape_for(tuple(properties))
+        self.values: List[RuntimeVal] = list(properties.values())
+
+    # A new dict of the keys and values, changing it leaves the object as
+    # it is.
+    @property
+    def properties(self) -> Dict[str, RuntimeVal]:
+        return dict(zip(self.shape.keys, self.values))
+
+    def get(self, key: str) -> Optional[RuntimeVal]:
+        index = self.shape.slots.get(key)
+        return None if index is None else self.values[index]
+
+
+_new_object = object.__new__
+
+
+# values: one per key of shape, in the same order.
+def MK_OBJECT(shape: Shape, values: List[RuntimeVal]) -> ObjectVal:
+    object_val = _new_object(ObjectVal)
+    object_val.shape = shape
+    object_val.values = values
+    return object_val
 
 
 class NativeFnValue(RuntimeVal):
-    def __init__(self, call: Callable[[List[RuntimeVal], Environment], RuntimeVal]):
-        super().__init__(ValueType("native-fn"))
+    __slots__ = ("call",)
+    type = NATIVE_FN_TYPE
+
+    def __init__(self, call: Callable[[List[RuntimeVal], "Environment"], RuntimeVal]):
         self.call = call
 
 
-def MK_NATIVE_FN(call: Callable[[List[RuntimeVal], Environment], RuntimeVal]) -> NativeFnValue:
+def MK_NATIVE_FN(call: Callable[[List[RuntimeVal], "Environment"], RuntimeVal]) -> NativeFnValue:
     return NativeFnValue(call)
 
 
 class FunctionValue(RuntimeVal):
-    def __init__(self, name: str, parameters: List[str], declarationEnv: Environment, body: List[Stmt]):
-        super().__init__(ValueType("function"))
+    __slots__ = ("name", "parameters", "declarationEnv", "body", "code", "memo", "cells", "calls")
+    type = FUNCTION_TYPE
+
+    def __init__(self, name: str, parameters: List[str], declarationEnv: "Environment", body: List[Stmt]):
         self.name = name
         self.parameters = parameters
         self.declarationEnv = declarationEnv
         self.body = body
+        # Backend specific compiled form of body, filled in lazily.
+        self.code = None
+        # LRUCache of results by arguments (maiin/memo.py), None when the
+        # function is not memoized.
+        self.memo = None
+        # Parameters kept in Cells (maiin/captures.py).
+        self.cells = ()
+        # Calls the tree walker counted before tiering it, see
+        # maiin/tiering.py.
+        self.calls = 0
+
+
+class VectorVal(RuntimeVal):
+    __slots__ = ("data",)
+    type = VECTOR_TYPE
+
+    def __init__(self, data):
+        # A float64 numpy array or an array("d"), see maiin/vectors.py.
+        self.data = data
+
+    # The elements as a list of floats.
+    @property
+    def value(self) -> List[float]:
+        return [float(x) for x in self.data]
+
+
+class ArrayVal(RuntimeVal):
+    __slots__ = ("items",)
+    type = ARRAY_TYPE
+
+    def __init__(self, items: List[RuntimeVal]):
+        # Changed in place by index assignment and the array builtins, see
+        # maiin/arrays.py.
+        self.items = items
+
+
+def MK_ARRAY(items: List[RuntimeVal]) -> ArrayVal:
+    return ArrayVal(items)
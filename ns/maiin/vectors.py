@@ -0,0 +1,288 @@
+import math
+import operator
+from array import array
+from contextvars import ContextVar
+from itertools import repeat
+from typing import Callable, List, Optional
+
+from maiin.values import (
+    MK_NATIVE_FN,
+    MK_NULL,
+    MK_NUMBER,
+    NumberVal,
+    ObjectVal,
+    RuntimeVal,
+    VectorVal,
+)
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Vectors of float64 numbers, so batch arithmetic takes one interpreter
+# dispatch per vector instead of one per element.
+#
+#   let prices = vec.of(10, 20, 30);
+#   let taxed = prices * 1.2 + 1
+#   vec.sum(taxed)
+#
+# `+ - * / %` between two vectors of the same length, or a vector and a
+# number, work element by element and return a new vector. Vectors never
+# change after they are made. Division by zero follows IEEE 754 (inf or
+# nan) instead of raising like numbers do.
+#
+# The data is a numpy array when NumPy is installed and an array("d")
+# otherwise. Reductions (sum, dot) may differ in the last bits between the
+# two: NumPy sums pairwise, the fallback with the builtin sum.
+#
+# Scripts reach the builtins through the global `vec` object:
+#   vec.of(a, b, ...)      a vector of the numbers (and vectors) given
+#   vec.range(n)           0, 1, ... n - 1, vec.range(a, b) is a ... b - 1
+#   vec.fill(n, x)         n times x
+#   vec.len(v), vec.at(v, i)
+#   vec.sum(v), vec.min(v), vec.max(v), vec.dot(a, b)
+#
+# A builtin making a vector of more than MAX_LENGTH numbers raises instead
+# of running out of memory. Evaluators limiting memory (maiin/limits.py)
+# set ALLOCATION_CHECK while they run, the builtins call it with the length
+# of a vector before making it, so a vector over the limit is refused
+# before it exists.
+
+_numpy = numpy
+
+MAX_LENGTH = 1 << 27  # 1 GiB of numbers.
+
+AllocationCheck = Callable[[int], None]
+ALLOCATION_CHECK: "ContextVar[Optional[AllocationCheck]]" = ContextVar("vector_allocation_check", default=None)
+
+
+# Whether new vectors use NumPy, when it is installed.
+def set_numpy(enabled: bool = True):
+    global _numpy
+    _numpy = numpy if enabled else None
+
+
+def uses_numpy() -> bool:
+    return _numpy is not None
+
+
+# data: any iterable of numbers, copied.
+def make_vector(data) -> VectorVal:
+    if _numpy is not None:
+        return VectorVal(_numpy.array(data, dtype=_numpy.float64))
+    return VectorVal(array("d", data))
+
+
+# ARITHMETIC
+
+def _divide(a: float, b: float) -> float:
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+
+
+def _modulo(a: float, b: float) -> float:
+    try:
+        return a % b
+    except ZeroDivisionError:
+        return math.nan
+
+
+# Any other operator is treated as modulo, see eval_numeric_binary_expr.
+OPERATIONS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": _divide,
+}
+
+if numpy is not None:
+    NUMPY_OPERATIONS = {
+        "+": numpy.add,
+        "-": numpy.subtract,
+        "*": numpy.multiply,
+        "/": numpy.true_divide,
+    }
+
+
+def _operand(value: RuntimeVal):
+    # The data of a vector, the float of a number, None for anything else.
+    if type(value) is VectorVal:
+        return value.data
+    if type(value) is NumberVal:
+        return value.value
+    return None
+
+
+# lhs <operator> rhs for the operands numbers do not handle: null unless one
+# is a vector and the other a vector or a number.
+def vector_binary(lhs: RuntimeVal, rhs: RuntimeVal, operator: str) -> RuntimeVal:
+    if type(lhs) is not VectorVal and type(rhs) is not VectorVal:
+        return MK_NULL()
+    left = _operand(lhs)
+    right = _operand(rhs)
+    if left is None or right is None:
+        return MK_NULL()
+
+    both = type(lhs) is type(rhs)
+    if both and len(left) != len(right):
+        raise ValueError(f"Cannot combine vectors of length {len(left)} and {len(right)}.")
+
+    if _numpy is not None:
+        op = NUMPY_OPERATIONS.get(operator, _numpy.remainder)
+        with _numpy.errstate(all="ignore"):
+            return VectorVal(op(left, right))
+
+    op = OPERATIONS.get(operator, _modulo)
+    if both:
+        return VectorVal(array("d", map(op, left, right)))
+    if type(lhs) is VectorVal:
+        return VectorVal(array("d", map(op, left, repeat(right))))
+    return VectorVal(array("d", map(op, repeat(left), right)))
+
+
+# BUILTINS
+
+def _number(value: RuntimeVal, what: str) -> float:
+    if type(value) is not NumberVal:
+        raise ValueError(f"{what} must be a number, got {value.type}.")
+    return value.value
+
+
+def _vector(value: RuntimeVal, what: str):
+    if type(value) is not VectorVal:
+        raise ValueError(f"{what} must be a vector, got {value.type}.")
+    return value.data
+
+
+def _arguments(args: List[RuntimeVal], name: str, count: int):
+    if len(args) < count:
+        raise ValueError(f"vec.{name} expects {count} arguments, got {len(args)}.")
+
+
+def _whole(value: RuntimeVal, what: str) -> int:
+    n = _number(value, what)
+    if type(n) is float and not n.is_integer():
+        raise ValueError(f"{what} must be a whole number, got {n}.")
+    return int(n)
+
+
+def _count(value: RuntimeVal, what: str) -> int:
+    n = _whole(value, what)
+    if n < 0:
+        raise ValueError(f"{what} must be at least 0, got {n}.")
+    return n
+
+
+# Raises when a vector of n numbers is too large to make.
+def _allocation(n: int, what: str):
+    if n > MAX_LENGTH:
+        raise ValueError(f"{what} must be at most {MAX_LENGTH}, got {n}.")
+    check = ALLOCATION_CHECK.get()
+    if check is not None:
+        check(n)
+
+
+def vec_of(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _allocation(sum(len(arg.data) if type(arg) is VectorVal else 1 for arg in args), "vec.of length")
+    items = []
+    for arg in args:
+        if type(arg) is VectorVal:
+            items.extend(arg.data)
+        else:
+            items.append(_number(arg, "vec.of arguments"))
+    return make_vector(items)
+
+
+def vec_range(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "range", 1)
+    if len(args) == 1:
+        start, stop = 0, _count(args[0], "vec.range length")
+    else:
+        start = _whole(args[0], "vec.range start")
+        stop = max(start, _whole(args[1], "vec.range end"))
+    _allocation(stop - start, "vec.range length")
+    if _numpy is not None:
+        return VectorVal(_numpy.arange(start, stop, dtype=_numpy.float64))
+    return VectorVal(array("d", range(start, stop)))
+
+
+def vec_fill(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "fill", 2)
+    n = _count(args[0], "vec.fill length")
+    value = _number(args[1], "vec.fill value")
+    _allocation(n, "vec.fill length")
+    if _numpy is not None:
+        return VectorVal(_numpy.full(n, value, dtype=_numpy.float64))
+    return VectorVal(array("d", [value]) * n)
+
+
+def vec_len(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "len", 1)
+    return MK_NUMBER(len(_vector(args[0], "vec.len argument")))
+
+
+def vec_at(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "at", 2)
+    data = _vector(args[0], "vec.at vector")
+    index = _count(args[1], "vec.at index")
+    if index >= len(data):
+        raise ValueError(f"Index {index} is out of range for a vector of length {len(data)}.")
+    return MK_NUMBER(float(data[index]))
+
+
+def vec_sum(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "sum", 1)
+    data = _vector(args[0], "vec.sum argument")
+    if type(data) is array:
+        return MK_NUMBER(float(sum(data)))
+    return MK_NUMBER(float(data.sum()))
+
+
+def _extreme(args: List[RuntimeVal], name: str, pick) -> RuntimeVal:
+    _arguments(args, name, 1)
+    data = _vector(args[0], f"vec.{name} argument")
+    if not len(data):
+        raise ValueError(f"vec.{name} of an empty vector.")
+    if type(data) is not array:
+        return MK_NUMBER(float(data.min() if pick is min else data.max()))
+    # nan wins, like in NumPy.
+    if any(x != x for x in data):
+        return MK_NUMBER(math.nan)
+    return MK_NUMBER(pick(data))
+
+
+def vec_min(args: List[RuntimeVal], _env) -> RuntimeVal:
+    return _extreme(args, "min", min)
+
+
+def vec_max(args: List[RuntimeVal], _env) -> RuntimeVal:
+    return _extreme(args, "max", max)
+
+
+def vec_dot(args: List[RuntimeVal], _env) -> RuntimeVal:
+    _arguments(args, "dot", 2)
+    left = _vector(args[0], "vec.dot arguments")
+    right = _vector(args[1], "vec.dot arguments")
+    if len(left) != len(right):
+        raise ValueError(f"Cannot combine vectors of length {len(left)} and {len(right)}.")
+    if type(left) is array and type(right) is array:
+        return MK_NUMBER(float(sum(map(operator.mul, left, right))))
+    return MK_NUMBER(float(numpy.dot(left, right)))
+
+
+VEC = ObjectVal({
+    "of": MK_NATIVE_FN(vec_of),
+    "range": MK_NATIVE_FN(vec_range),
+    "fill": MK_NATIVE_FN(vec_fill),
+    "len": MK_NATIVE_FN(vec_len),
+    "at": MK_NATIVE_FN(vec_at),
+    "sum": MK_NATIVE_FN(vec_sum),
+    "min": MK_NATIVE_FN(vec_min),
+    "max": MK_NATIVE_FN(vec_max),
+    "dot": MK_NATIVE_FN(vec_dot),
+})
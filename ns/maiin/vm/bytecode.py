@@ -0,0 +1,215 @@
+from typing import Dict, List, Tuple
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    FunctionDeclaration,
+    Identifier,
+    MemberExpr,
+    NumericLiteral,
+    ObjectLiteral,
+    Program,
+    Stmt,
+    VarDeclaration,
+)
+from src.parser_1 import is_unparsed
+from maiin.shapes import LiteralSite, member_cache
+from maiin.values import MK_NUMBER
+
+# OPCODES
+# Every instruction is two slots wide: [opcode, argument].
+LOAD_CONST = 0  # push consts[arg], a NumberVal
+LOAD_NULL = 1  # push null
+LOAD_NAME = 2  # push env.lookupVar(names[arg])
+STORE_NAME = 3  # pop value, push env.assignVar(names[arg], value)
+DECLARE_LET = 4  # pop value, push env.declareVar(names[arg], value, False)
+DECLARE_CONST = 5  # pop value, push env.declareVar(names[arg], value, True)
+BINARY_ADD = 6  # pop rhs, pop lhs, push lhs + rhs
+BINARY_SUB = 7
+BINARY_MUL = 8
+BINARY_DIV = 9
+BINARY_MOD = 10
+MAKE_OBJECT = 11  # pop one value per key of consts[arg] (a LiteralSite), push the object
+MAKE_FUNCTION = 12  # declare a FunctionValue for consts[arg] (a CodeObject or FunctionDeclaration)
+CALL = 13  # pop callee, pop arg values, push the call result
+POP = 14  # discard the top of the stack
+RETURN = 15  # pop the result and leave the current frame
+RAISE_INVALID = 16  # raise for an unsupported construct, node in consts[arg]
+UNSUPPORTED = 17  # report an AST node the interpreter cannot evaluate
+LOAD_MEMBER = 18  # pop an object, push the member consts[arg] (a MemberCache) reads
+LOAD_COMPUTED = 19  # pop a key, pop an object, push the member
+MAKE_ARRAY = 20  # pop arg values, push an array of them
+STORE_COMPUTED = 21  # pop value, pop key, pop target, push target[key] = value
+STORE_MEMBER = 22  # pop value, pop target, raise: properties named consts[arg] cannot be assigned
+
+OPCODE_NAMES = {
+    value: name for name, value in globals().items()
+    if name.isupper() and isinstance(value, int)
+}
+
+BINARY_OPCODES: Dict[str, int] = {
+    "+": BINARY_ADD,
+    "-": BINARY_SUB,
+    "*": BINARY_MUL,
+    "/": BINARY_DIV,
+}
+
+
+# A compiled Program or function body.
+class CodeObject:
+    __slots__ = ("name", "parameters", "body", "instructions", "consts", "names")
+
+    def __init__(self, name: str, parameters: List[str], body: List[Stmt]):
+        self.name = name
+        self.parameters = parameters
+        self.body = body  # the statements this code was compiled from.
+        # Flat instruction stream, see the OPCODES above.
+        self.instructions: List[int] = []
+        self.consts: list = []
+        self.names: List[str] = []
+
+    def __repr__(self):
+        return f"<code {self.name}>"
+
+    def disassemble(self) -> str:
+        lines = []
+        code = self.instructions
+        for ip in range(0, len(code), 2):
+            op, arg = code[ip], code[ip + 1]
+            detail = ""
+            if op in (LOAD_NAME, STORE_NAME, DECLARE_LET, DECLARE_CONST):
+                detail = self.names[arg]
+            elif op == LOAD_CONST:
+                detail = repr(self.consts[arg].value)
+            elif op in (MAKE_OBJECT, MAKE_FUNCTION, LOAD_MEMBER, STORE_MEMBER):
+                detail = repr(self.consts[arg])
+            elif op == CALL:
+                detail = f"{arg} args"
+            elif op == MAKE_ARRAY:
+                detail = f"{arg} items"
+            lines.append(f"{ip:>6} {OPCODE_NAMES[op]:<14} {arg:>4} {detail}")
+        return "\n".join(lines)
+
+
+class BytecodeCompiler:
+    def __init__(self, code: CodeObject):
+        self.code = code
+        self.const_index: Dict[Tuple[type, str], int] = {}
+        self.name_index: Dict[str, int] = {}
+
+    def emit(self, op: int, arg: int = 0):
+        self.code.instructions.append(op)
+        self.code.instructions.append(arg)
+
+    def add_const(self, value) -> int:
+        # Numbers are shared, stored as ready made NumberVals. Nodes, sites
+        # and code objects get one entry per use.
+        if isinstance(value, (float, int)):
+            # repr keeps 0.0 and -0.0 apart.
+            key = (type(value), repr(value))
+            index = self.const_index.get(key)
+            if index is None:
+                index = self.const_index[key] = len(self.code.consts)
+                self.code.consts.append(MK_NUMBER(value))
+            return index
+
+        self.code.consts.append(value)
+        return len(self.code.consts) - 1
+
+    def add_name(self, name: str) -> int:
+        index = self.name_index.get(name)
+        if index is None:
+            index = self.name_index[name] = len(self.code.names)
+            self.code.names.append(name)
+        return index
+
+    # Compiles statements so that the value of the last one is left on the
+    # stack, the same value evaluate returns for a Program or function body.
+    def compile_body(self, body: List[Stmt]):
+        if not body:
+            self.emit(LOAD_NULL)
+        for i, stmt in enumerate(body):
+            if i:
+                self.emit(POP)
+            self.compile_node(stmt)
+        self.emit(RETURN)
+
+    def compile_node(self, node: Stmt):
+        if isinstance(node, NumericLiteral):
+            self.emit(LOAD_CONST, self.add_const(node.value))
+        elif isinstance(node, Identifier):
+            self.emit(LOAD_NAME, self.add_name(node.symbol))
+        elif isinstance(node, ObjectLiteral):
+            keys = []
+            for prop in node.properties:
+                keys.append(prop.key)
+                if prop.value is None:
+                    self.emit(LOAD_NAME, self.add_name(prop.key))
+                else:
+                    self.compile_node(prop.value)
+            self.emit(MAKE_OBJECT, self.add_const(LiteralSite(keys)))
+        elif isinstance(node, ArrayLiteral):
+            for element in node.elements:
+                self.compile_node(element)
+            self.emit(MAKE_ARRAY, len(node.elements))
+        elif isinstance(node, MemberExpr):
+            self.compile_node(node.object)
+            if node.computed:
+                self.compile_node(node.property)
+                self.emit(LOAD_COMPUTED)
+            else:
+                self.emit(LOAD_MEMBER, self.add_const(member_cache(node)))
+        elif isinstance(node, CallExpr):
+            for arg in node.args:
+                self.compile_node(arg)
+            self.compile_node(node.caller)
+            self.emit(CALL, len(node.args))
+        elif isinstance(node, AssignmentExpr):
+            if isinstance(node.assigne, MemberExpr):
+                member = node.assigne
+                self.compile_node(member.object)
+                if member.computed:
+                    self.compile_node(member.property)
+                    self.compile_node(node.value)
+                    self.emit(STORE_COMPUTED)
+                else:
+                    self.compile_node(node.value)
+                    self.emit(STORE_MEMBER, self.add_const(member.property.symbol))
+                return
+            if not isinstance(node.assigne, Identifier):
+                self.emit(RAISE_INVALID, self.add_const(node.assigne))
+                return
+            self.compile_node(node.value)
+            self.emit(STORE_NAME, self.add_name(node.assigne.symbol))
+        elif isinstance(node, BinaryExpr):
+            self.compile_node(node.left)
+            self.compile_node(node.right)
+            # Any other operator is treated as modulo, see eval_numeric_binary_expr.
+            self.emit(BINARY_OPCODES.get(node.operator, BINARY_MOD))
+        elif isinstance(node, VarDeclaration):
+            if node.value is None:
+                self.emit(LOAD_NULL)
+            else:
+                self.compile_node(node.value)
+            op = DECLARE_CONST if node.constant else DECLARE_LET
+            self.emit(op, self.add_name(node.identifier))
+        elif isinstance(node, FunctionDeclaration):
+            # A body the lazy parser skipped stays a declaration until the
+            # function is called.
+            function = node if is_unparsed(node.body) else compile_function(node)
+            self.emit(MAKE_FUNCTION, self.add_const(function))
+        else:
+            self.emit(UNSUPPORTED, self.add_const(node))
+
+
+def compile_function(declaration: FunctionDeclaration) -> CodeObject:
+    code = CodeObject(declaration.name, declaration.parameters, declaration.body)
+    BytecodeCompiler(code).compile_body(declaration.body)
+    return code
+
+
+def compile_program(program: Program) -> CodeObject:
+    code = CodeObject("<program>", [], program.body)
+    BytecodeCompiler(code).compile_body(program.body)
+    return code
@@ -0,0 +1,235 @@
+from typing import List
+from src.ast_1 import FunctionDeclaration, Program
+from src.parser_1 import is_unparsed
+from maiin.environment import Environment
+from maiin.arrays import not_assignable, read_computed, write_computed
+from maiin.shapes import MISSING, not_an_object
+from maiin.vectors import vector_binary
+from maiin.values import (
+    FunctionValue,
+    MK_ARRAY,
+    MK_NULL,
+    MK_NUMBER,
+    NULL,
+    NativeFnValue,
+    NumberVal,
+    ObjectVal,
+    RuntimeVal,
+)
+from maiin.vm.bytecode import (
+    BINARY_ADD,
+    BINARY_DIV,
+    BINARY_MOD,
+    BINARY_MUL,
+    BINARY_OPCODES,
+    BINARY_SUB,
+    CALL,
+    CodeObject,
+    DECLARE_CONST,
+    DECLARE_LET,
+    LOAD_COMPUTED,
+    LOAD_CONST,
+    LOAD_MEMBER,
+    LOAD_NAME,
+    LOAD_NULL,
+    MAKE_ARRAY,
+    MAKE_FUNCTION,
+    MAKE_OBJECT,
+    POP,
+    RAISE_INVALID,
+    RETURN,
+    STORE_COMPUTED,
+    STORE_MEMBER,
+    STORE_NAME,
+    UNSUPPORTED,
+    compile_function,
+    compile_program,
+)
+
+# Upper bound for nested NiScript calls. Frames live on the heap, so this
+# only guards against runaway recursion exhausting memory.
+MAX_FRAMES = 100_000
+
+
+# A suspended caller: the code, instruction pointer, scope and operand stack
+# to resume with once the callee returns.
+class Frame:
+    __slots__ = ("code", "ip", "env", "stack")
+
+    def __init__(self, code: CodeObject, ip: int, env: Environment, stack: List[RuntimeVal]):
+        self.code = code
+        self.ip = ip
+        self.env = env
+        self.stack = stack
+
+
+# Operator of every binary opcode, BINARY_MOD stands for any other.
+BINARY_OPERATORS = {op: operator for operator, op in BINARY_OPCODES.items()}
+
+
+def _binary(op: int, lhs: RuntimeVal, rhs: RuntimeVal) -> RuntimeVal:
+    if type(lhs) is not NumberVal or type(rhs) is not NumberVal:
+        # Vectors, anything else gives null.
+        return vector_binary(lhs, rhs, BINARY_OPERATORS.get(op, "%"))
+    if op == BINARY_ADD:
+        return MK_NUMBER(lhs.value + rhs.value)
+    elif op == BINARY_SUB:
+        return MK_NUMBER(lhs.value - rhs.value)
+    elif op == BINARY_MUL:
+        return MK_NUMBER(lhs.value * rhs.value)
+    elif op == BINARY_DIV:
+        return MK_NUMBER(lhs.value / rhs.value)
+    return MK_NUMBER(lhs.value % rhs.value)
+
+
+def execute(code: CodeObject, env: Environment, max_frames: int = MAX_FRAMES) -> RuntimeVal:
+    frames: List[Frame] = []
+    instructions = code.instructions
+    consts = code.consts
+    names = code.names
+    stack: List[RuntimeVal] = []
+    push = stack.append
+    pop = stack.pop
+    ip = 0
+
+    while True:
+        op = instructions[ip]
+        arg = instructions[ip + 1]
+        ip += 2
+
+        if op == LOAD_NAME:
+            push(env.lookupVar(names[arg]))
+        elif op == LOAD_CONST:
+            push(consts[arg])
+        elif BINARY_ADD <= op <= BINARY_MOD:
+            rhs = pop()
+            push(_binary(op, pop(), rhs))
+        elif op == CALL:
+            fn = pop()
+            if arg:
+                args = stack[-arg:]
+                del stack[-arg:]
+            else:
+                args = []
+
+            if type(fn) is NativeFnValue:
+                push(fn.call(args, env))
+            elif type(fn) is FunctionValue:
+                if len(frames) >= max_frames:
+                    raise RecursionError("maximum NiScript call depth exceeded")
+
+                callee = fn.code
+                if type(callee) is not CodeObject:
+                    callee = fn.code = compile_function_value(fn)
+
+                scope = Environment(fn.declarationEnv)
+                parameters = fn.parameters
+                for i in range(len(parameters)):
+                    scope.declareVar(parameters[i], args[i], False)
+
+                frames.append(Frame(code, ip, env, stack))
+                code = callee
+                instructions = code.instructions
+                consts = code.consts
+                names = code.names
+                env = scope
+                stack = []
+                push = stack.append
+                pop = stack.pop
+                ip = 0
+            else:
+                raise ValueError("Cannot call value that is not a function: " + str(fn))
+        elif op == POP:
+            pop()
+        elif op == RETURN:
+            result = pop()
+            if not frames:
+                return result
+
+            frame = frames.pop()
+            code = frame.code
+            instructions = code.instructions
+            consts = code.consts
+            names = code.names
+            env = frame.env
+            stack = frame.stack
+            push = stack.append
+            pop = stack.pop
+            ip = frame.ip
+            push(result)
+        elif op == STORE_NAME:
+            push(env.assignVar(names[arg], pop()))
+        elif op == DECLARE_LET:
+            push(env.declareVar(names[arg], pop(), False))
+        elif op == DECLARE_CONST:
+            push(env.declareVar(names[arg], pop(), True))
+        elif op == LOAD_NULL:
+            push(MK_NULL())
+        elif op == LOAD_MEMBER:
+            cache = consts[arg]
+            obj = pop()
+            if type(obj) is not ObjectVal:
+                raise not_an_object(cache.key, obj)
+            shape = obj.shape
+            entry = cache.entry
+            index = entry[1] if entry[0] is shape else cache.lookup(shape)
+            push(NULL if index == MISSING else obj.values[index])
+        elif op == LOAD_COMPUTED:
+            key = pop()
+            push(read_computed(pop(), key))
+        elif op == MAKE_ARRAY:
+            if arg:
+                items = stack[-arg:]
+                del stack[-arg:]
+            else:
+                items = []
+            push(MK_ARRAY(items))
+        elif op == STORE_COMPUTED:
+            value = pop()
+            key = pop()
+            push(write_computed(pop(), key, value))
+        elif op == STORE_MEMBER:
+            pop()
+            raise not_assignable(consts[arg], pop())
+        elif op == MAKE_OBJECT:
+            site = consts[arg]
+            count = site.count
+            if count:
+                values = stack[-count:]
+                del stack[-count:]
+            else:
+                values = []
+            push(site.build(values))
+        elif op == MAKE_FUNCTION:
+            fn_code = consts[arg]
+            if type(fn_code) is not CodeObject and not is_unparsed(fn_code.body):
+                # A lazily parsed body got parsed by an earlier call.
+                fn_code = consts[arg] = compile_function(fn_code)
+            fn = FunctionValue(
+                name=fn_code.name,
+                parameters=fn_code.parameters,
+                declarationEnv=env,
+                body=fn_code.body,
+            )
+            if type(fn_code) is CodeObject:
+                fn.code = fn_code
+            push(env.declareVar(fn_code.name, fn, True))
+        elif op == RAISE_INVALID:
+            raise ValueError(f"Invalid LHS inside assignment expr: {consts[arg]}")
+        elif op == UNSUPPORTED:
+            print(
+                "This AST Node has not yet been set up for interpretation.\n",
+                consts[arg]
+            )
+            exit(0)
+        else:
+            raise ValueError(f"Unknown opcode {op} at {ip - 2} in {code}")
+
+
+# FunctionValues created by another backend only carry their AST body.
+def compile_function_value(fn: FunctionValue) -> CodeObject:
+    return compile_function(FunctionDeclaration(fn.parameters, fn.name, fn.body))
+
+
+def run_program(program: Program, env: Environment) -> RuntimeVal:
+    return execute(compile_program(program), env)
@@ -1,19 +1,421 @@
-from src.parser_1 import Parser
-from maiin.environment import createGlobalEnv
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, List, Optional, Sequence
+from src.parser_1 import PARSER_ENGINES, Parser
+from src.ast_1 import Program
+from src.lexer import tokenize_stream
+from maiin.environment import Environment, createGlobalEnv
 from maiin.interpreter import evaluate
+from maiin.iterative import evaluate_iterative
+from maiin.async_interpreter import evaluate_async
+from maiin.compiler import compile_program, compile_resolved_program
+from maiin.instrument import AllocationCounter, CallProfile, Interpreter
+from maiin.profiler import SamplingProfiler
+from maiin.limits import LimitedInterpreter, Limits, parse_size
+from maiin.memo import DEFAULT_SIZE as DEFAULT_MEMO_SIZE, memo_report, memo_stats
+from maiin.resolver import resolve_program
+from maiin.captures import analyze_captures
+from maiin.tiering import set_tier_dump, set_tier_threshold
+from maiin.vm.machine import run_program
+from src.optimizer import PASS_NAMES, Optimizer
+from src.purity import PurityAnalysis
+from src.cache import DEFAULT_DIRECTORY as DEFAULT_CACHE_DIRECTORY, ProgramCache
+from maiin.values import MK_NULL, RuntimeVal
+import argparse
 import asyncio
+import contextlib
+import fnmatch
+import io
+import os
+import sys
+import time
 
-async def run(filename: str):
-    parser = Parser()
-    env = createGlobalEnv()
+# Execution backends for a parsed program.
+# - tree: walks the AST with `evaluate`. With --tier-threshold, functions
+#   called often enough are translated to Python, see maiin/tiering.py.
+# - closure: compiles the AST to Python closures once, then runs them.
+# - slots: resolves variables to frame slots, then compiles to closures.
+# - vm: compiles the AST to bytecode for the stack machine in maiin/vm.
+# - async: like tree, but awaits natives returning awaitables, see
+#   maiin/async_interpreter.py. Tiers functions making no calls.
+# - iterative: like tree, but without Python recursion and with proper tail
+#   calls, see maiin/iterative.py.
+BACKENDS = ("tree", "closure", "slots", "vm", "async", "iterative")
+
+# Reads and parses (or loads from cache) one script file.
+# cache: a ProgramCache to load the parsed (optimized, resolved) program
+# from instead of parsing it again.
+# lazy: parse function bodies on their first call. The optimizer, the
+# purity analysis, the resolver (slots backend) and the cache still need
+# every body.
+# memoize: cache up to this many results per function the purity analysis
+# proves pure (tree, closure and async backends), 0 to leave functions
+# alone.
+# captures: closures keep only the variables they use (tree, closure and
+# async backends), see maiin/captures.py.
+# optimize_report: print what each optimizer pass did to stderr, unless the
+# program came from the cache.
+# disabled_passes: names of the optimizer passes to skip, see PASS_NAMES.
+def load_file(
+    filename: str,
+    env: Environment,
+    backend: str = "tree",
+    optimize: bool = False,
+    cache: ProgramCache = None,
+    lazy: bool = False,
+    engine: str = "descent",
+    memoize: int = 0,
+    captures: bool = False,
+    optimize_report: bool = False,
+    disabled_passes: Sequence[str] = (),
+) -> Program:
+    parser = Parser(engine, lazy=lazy)
 
     with open(filename, "r") as file:
         input_code = file.read()
 
-    program = parser.produceAST(input_code)
+    stages = []
+    if optimize:
+        stages.append("optimize" + "".join(f" no-{name}" for name in sorted(disabled_passes)))
+    if memoize:
+        stages.append(f"memoize={memoize}")
+    if captures:
+        stages.append("captures")
+    if backend == "slots":
+        stages.append("resolve")
+    # The stages depend on the names the global environment declares.
+    context = list(env.variables) if stages else []
+
+    program = cache.load(filename, input_code, stages, context) if cache else None
+    if program is None:
+        program = parser.produceAST(input_code)
+
+        if optimize:
+            optimizer = Optimizer(builtins=env.variables, disabled=disabled_passes)
+            optimizer.optimize(program)
+            if optimize_report:
+                print(f"--- {filename}\n{optimizer.report()}", file=sys.stderr)
+        if memoize:
+            PurityAnalysis(builtins=env.variables).mark(program, memoize)
+        if captures:
+            analyze_captures(program)
+        if backend == "slots":
+            resolve_program(program, env)
+
+        if cache:
+            cache.store(filename, input_code, program, stages, context)
+    return program
+
+
+# Backends that can run a script while it is being parsed.
+STREAM_BACKENDS = ("tree", "closure", "vm")
+
+
+# Runs one script file a top level statement at a time: each statement is
+# parsed, run and dropped before the next one is read (see
+# Parser.parse_stream), so memory grows with the largest statement and with
+# the values the script keeps, not with the size of the file. Output starts
+# as soon as the first statement has run, and a syntax error stops the
+# script only once the statements before it have run. Nothing is done that
+# needs the whole program first (optimizer, purity analysis, captures,
+# resolver, cache).
+def stream_file(filename: str, backend: str = "tree", engine: str = "descent") -> RuntimeVal:
+    if backend not in STREAM_BACKENDS:
+        raise ValueError(f"Backend '{backend}' cannot stream. Expected one of {STREAM_BACKENDS}.")
+    env = createGlobalEnv()
+    last_evaluated = MK_NULL()
+    with open(filename, "r") as file:
+        for statement in Parser(engine).parse_stream(tokenize_stream(file)):
+            if backend == "closure":
+                last_evaluated = compile_program(Program(body=[statement]))(env)
+            elif backend == "vm":
+                last_evaluated = run_program(Program(body=[statement]), env)
+            else:
+                last_evaluated = evaluate(statement, env)
+    return last_evaluated
+
+
+# Runs one script file and returns the value of its last statement.
+# stats: print per-function call counts and times, the values allocated and
+# the memoization caches to stderr afterwards (tree backend).
+# limits: stop the script with ResourceLimitExceeded when it goes over these
+# Limits (tree and iterative backends, iterative does not track memory).
+# stream: run the script with stream_file, the other options must be left
+# out.
+def execute_file(
+    filename: str,
+    backend: str = "tree",
+    stats: bool = False,
+    limits: Optional[Limits] = None,
+    stream: bool = False,
+    **options,
+) -> RuntimeVal:
+    if stream:
+        return stream_file(filename, backend, options.get("engine", "descent"))
+    if backend == "async":
+        return asyncio.run(run(filename, backend, **options))
+
+    env = createGlobalEnv()
+    program = load_file(filename, env, backend, **options)
+
+    if backend == "iterative":
+        return evaluate_iterative(program, env, limits=limits)
+
+    if stats or limits:
+        instruments = [CallProfile(), AllocationCounter()] if stats else []
+        interpreter = LimitedInterpreter(limits, instruments) if limits else Interpreter(instruments)
+        try:
+            return interpreter.run(program, env)
+        finally:
+            if stats:
+                profile, allocations = instruments
+                print(f"--- {filename}\n{profile.report()}\n{allocations.report()}", file=sys.stderr)
+                if memo_stats(env):
+                    print(memo_report(env), file=sys.stderr)
+
+    if backend == "closure":
+        return compile_program(program)(env)
+    elif backend == "slots":
+        return compile_resolved_program(program)(env)
+    elif backend == "vm":
+        return run_program(program, env)
+    return evaluate(program, env)
+
+
+# Like execute_file, but the async backend runs on the current event loop,
+# so many scripts can run concurrently.
+async def run(filename: str, backend: str = "tree", **options) -> RuntimeVal:
+    if backend != "async":
+        return execute_file(filename, backend, **options)
+
+    env = createGlobalEnv()
+    program = load_file(filename, env, backend, **options)
+    return await evaluate_async(program, env)
+
+
+# BATCH MODE
+
+class ScriptResult:
+    def __init__(self, filename: str, status: int, output: Optional[str], error: str, seconds: float):
+        self.filename = filename
+        self.status = status  # 0 when the script ran to completion.
+        self.output = output  # captured stdout, None when it was not captured.
+        self.error = error
+        self.seconds = seconds
+
+
+# Options every worker runs scripts with, set up by _init_worker.
+_worker_options: dict = {}
+
+
+def _init_worker(options: dict):
+    global _worker_options
+    _worker_options = dict(options)
+    set_tier_threshold(_worker_options.pop("tier_threshold"))
+    set_tier_dump(sys.stderr if _worker_options.pop("dump_tiered") else None)
+    cache_dir = _worker_options.pop("cache_dir")
+    _worker_options["cache"] = ProgramCache(cache_dir) if _worker_options.pop("use_cache") else None
+
+
+def run_script(filename: str, capture: bool = True) -> ScriptResult:
+    # Runs one script with the options of this worker, every script gets a
+    # fresh global environment.
+    output = io.StringIO() if capture else None
+    status = 0
+    error = ""
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output) if capture else contextlib.nullcontext():
+            execute_file(filename, **_worker_options)
+    except SystemExit as exit_error:
+        # The parser and unsupported nodes stop the script through exit().
+        code = exit_error.code
+        status = code if isinstance(code, int) else (0 if code is None else 1)
+    except Exception as exception:
+        status = 1
+        error = f"{type(exception).__name__}: {exception}"
+    seconds = time.perf_counter() - start
+
+    return ScriptResult(filename, status, output.getvalue() if capture else None, error, seconds)
+
+
+def _run_captured(filename: str) -> ScriptResult:
+    return run_script(filename)
+
+
+def collect_scripts(paths: List[str], pattern: str) -> List[str]:
+    # Files are taken as given, directories are searched recursively for
+    # files matching pattern, in a stable order.
+    scripts = []
+    for path in paths:
+        if not os.path.isdir(path):
+            scripts.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if d != DEFAULT_CACHE_DIRECTORY and not d.startswith("."))
+            for name in sorted(files):
+                if fnmatch.fnmatch(name, pattern):
+                    scripts.append(os.path.join(root, name))
+    return scripts
+
+
+def run_batch(scripts: List[str], options: dict, jobs: int) -> Iterator[ScriptResult]:
+    # Yields results in the order of scripts. With more than one job the
+    # scripts are spread over a pool of worker processes, otherwise they
+    # run in this process and print directly.
+    if jobs <= 1:
+        _init_worker(options)
+        for filename in scripts:
+            yield run_script(filename, capture=False)
+        return
+
+    # Large chunks keep the pool busy without a round trip per script.
+    chunksize = max(1, min(64, len(scripts) // (jobs * 4)))
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(options,)) as pool:
+        yield from pool.map(_run_captured, scripts, chunksize=chunksize)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="niscript", description="Run NiScript programs.")
+    parser.add_argument("paths", nargs="*", default=["./test.txt"], help="script files or directories (default ./test.txt)")
+    parser.add_argument("--backend", choices=BACKENDS, default="tree", help="execution backend")
+    parser.add_argument("--engine", choices=PARSER_ENGINES, default="descent", help="expression parser")
+    parser.add_argument("--optimize", action="store_true", help="run the AST optimizer before executing")
+    parser.add_argument("--optimize-report", action="store_true",
+                        help="print the rounds, time and changes of every optimizer pass to stderr")
+    parser.add_argument("--no-pass", metavar="NAME", action="append", choices=PASS_NAMES, default=[],
+                        help=f"skip an optimizer pass, can be repeated ({', '.join(PASS_NAMES)})")
+    parser.add_argument("--lazy", action="store_true", help="parse function bodies on their first call")
+    parser.add_argument("--cache", dest="cache", action="store_true", default=None,
+                        help="cache parsed programs on disk (default with --jobs)")
+    parser.add_argument("--no-cache", dest="cache", action="store_false", help="never use the program cache")
+    parser.add_argument("--cache-dir", default=None,
+                        help=f"cache directory (default $NISCRIPT_CACHE_DIR or {DEFAULT_CACHE_DIRECTORY} next to each script)")
+    parser.add_argument("--glob", default="*.ns", help="file pattern used inside directories (default *.ns)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="worker processes for running many scripts")
+    parser.add_argument("--report", action="store_true", help="print per-script wall time and throughput to stderr")
+    parser.add_argument("--stats", action="store_true",
+                        help="print call counts, call times and allocations of each script to stderr (tree backend)")
+    parser.add_argument("--profile", metavar="FILE", default=None,
+                        help="sample the NiScript call stack (tree backend) and write collapsed stacks to FILE, "
+                             "or a flame graph when FILE ends in .svg or .html")
+    parser.add_argument("--profile-interval", metavar="MS", type=float, default=5.0,
+                        help="milliseconds between profile samples (default 5)")
+    parser.add_argument("--max-steps", type=int, default=None, help="stop a script after this many evaluated nodes")
+    parser.add_argument("--max-depth", type=int, default=None, help="stop a script nesting more function calls")
+    parser.add_argument("--max-memory", type=parse_size, default=None,
+                        help="stop a script allocating more than this estimate, e.g. 64MB")
+    parser.add_argument("--timeout", type=float, default=None, help="stop a script after this many seconds")
+    parser.add_argument("--memoize", action="store_true",
+                        help="cache the results of functions proven pure (tree, closure and async backends)")
+    parser.add_argument("--captures", action="store_true",
+                        help="closures keep only the variables they use (tree, closure and async backends)")
+    parser.add_argument("--memo-size", type=int, default=DEFAULT_MEMO_SIZE,
+                        help=f"results cached per function with --memoize (default {DEFAULT_MEMO_SIZE})")
+    parser.add_argument("--stream", action="store_true",
+                        help="parse and run one top level statement at a time (tree, closure and vm backends)")
+    parser.add_argument("--tier-threshold", metavar="N", type=int, default=0,
+                        help="calls before the tree and async backends translate a function to Python "
+                             "(default 0, never)")
+    parser.add_argument("--dump-tiered", action="store_true",
+                        help="print the Python source of every translated function to stderr")
+    args = parser.parse_args(argv)
+    if args.stats and args.backend != "tree":
+        parser.error("--stats needs --backend tree")
+
+    limits = None
+    if any(value is not None for value in (args.max_steps, args.max_depth, args.max_memory, args.timeout)):
+        if args.backend not in ("tree", "iterative"):
+            parser.error("--max-steps, --max-depth, --max-memory and --timeout need --backend tree or iterative")
+        if args.backend == "iterative" and args.max_memory is not None:
+            parser.error("--max-memory needs --backend tree")
+        limits = Limits(args.max_steps, args.max_depth, args.max_memory, args.timeout)
+    if args.memoize and args.backend not in ("tree", "closure", "async"):
+        parser.error("--memoize needs --backend tree, closure or async")
+    if args.captures and args.backend not in ("tree", "closure", "async"):
+        parser.error("--captures needs --backend tree, closure or async")
+    if (args.optimize_report or args.no_pass) and not args.optimize:
+        parser.error("--optimize-report and --no-pass need --optimize")
+    if args.memo_size < 1:
+        parser.error("--memo-size needs at least 1")
+    if args.stream:
+        if args.backend not in STREAM_BACKENDS:
+            parser.error("--stream needs --backend tree, closure or vm")
+        if args.optimize or args.lazy or args.memoize or args.captures or args.cache or args.stats or limits:
+            parser.error("--stream cannot be used with --optimize, --lazy, --memoize, --captures, --cache, "
+                         "--stats or limits")
+    if args.tier_threshold < 0:
+        parser.error("--tier-threshold needs 0 or more")
+    if args.tier_threshold and args.backend not in ("tree", "async"):
+        parser.error("--tier-threshold needs --backend tree or async")
+    # The profiler attributes samples to eval_call_expr frames, tiered
+    # functions call each other without them.
+    if args.tier_threshold and args.profile:
+        parser.error("--tier-threshold cannot be used with --profile")
+    if args.profile and (args.backend != "tree" or args.jobs > 1):
+        parser.error("--profile needs --backend tree and a single job")
+
+    scripts = collect_scripts(args.paths, args.glob)
+    missing = [path for path in scripts if not os.path.isfile(path)]
+    if missing:
+        parser.error("no such file: " + ", ".join(missing))
+
+    # Workers share parsed programs through the on disk cache.
+    use_cache = args.cache if args.cache is not None else args.jobs > 1 and not args.stream
+    options = {
+        "backend": args.backend,
+        "optimize": args.optimize,
+        "optimize_report": args.optimize_report,
+        "disabled_passes": tuple(args.no_pass),
+        "lazy": args.lazy,
+        "engine": args.engine,
+        "stats": args.stats,
+        "limits": limits,
+        "memoize": args.memo_size if args.memoize else 0,
+        "captures": args.captures,
+        "use_cache": use_cache,
+        "cache_dir": args.cache_dir,
+        "stream": args.stream,
+        "tier_threshold": args.tier_threshold or None,
+        "dump_tiered": args.dump_tiered,
+    }
+
+    profiler = SamplingProfiler(args.profile_interval / 1000) if args.profile else None
+    if profiler:
+        profiler.start()
+
+    failed = 0
+    results: List[ScriptResult] = []
+    start = time.perf_counter()
+    for result in run_batch(scripts, options, args.jobs):
+        if result.output is not None:
+            if len(scripts) > 1:
+                sys.stdout.write(f"==> {result.filename} <==\n")
+            sys.stdout.write(result.output)
+        sys.stdout.flush()
+        if result.error:
+            print(f"{result.filename}: {result.error}", file=sys.stderr)
+        if result.status:
+            failed += 1
+        results.append(result)
+    elapsed = time.perf_counter() - start
+
+    if profiler:
+        profiler.stop()
+        profiler.write(args.profile, title=" ".join(scripts))
+        print(f"{profiler.total} samples written to {args.profile}", file=sys.stderr)
+
+    if args.report:
+        for result in results:
+            print(f"{result.seconds * 1000:10.2f} ms  exit {result.status:<3} {result.filename}", file=sys.stderr)
+        rate = len(results) / elapsed if elapsed else float("inf")
+        print(
+            f"{len(results)} scripts, {failed} failed, {elapsed:.3f}s total, "
+            f"{rate:.1f} scripts/s with {max(args.jobs, 1)} job(s)",
+            file=sys.stderr,
+        )
+
+    return 1 if failed else 0
 
-    _result = evaluate(program, env)
-    # print(result)
 
-# Call the run function with the filename
-asyncio.run(run("./test.txt"))
+if __name__ == "__main__":
+    sys.exit(main())
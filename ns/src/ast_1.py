@@ -1,4 +1,7 @@
-from typing import List, Union, Optional
+from typing import TYPE_CHECKING, List, Union, Optional
+
+if TYPE_CHECKING:
+    from src.lexer import Token
 
 NodeType = Union[
     # STATEMENTS
@@ -12,21 +15,40 @@ NodeType = Union[
     # Literals
     "Property",
     "ObjectLiteral",
+    "ArrayLiteral",
     "NumericLiteral",
     "Identifier",
     "BinaryExpr"
 ]
 
 class Stmt:
+    # Source position of the node, set by the parser on calls and function
+    # declarations. 0 when unknown.
+    line = 0
+    column = 0
+    # Whether the async evaluator has to await inside the node, see
+    # maiin/async_interpreter.py. Filled in at runtime and never cached.
+    awaits = None
+
     def __init__(self, kind: NodeType):
         self.kind = kind
 
+# Gives node the position of token and returns it.
+def located(node: Stmt, token: "Token") -> Stmt:
+    node.line = token.line
+    node.column = token.column
+    return node
+
 class Program(Stmt):
     def __init__(self, body: List[Stmt]):
         super().__init__("Program")
         self.body = body
 
 class VarDeclaration(Stmt):
+    # Set by maiin/captures.py: the variable lives in a Cell shared with
+    # the closures capturing it.
+    cell = False
+
     def __init__(self, constant: bool, identifier: str, value: Optional["Expr"] = None):
         super().__init__("VarDeclaration")
         self.constant = constant
@@ -34,6 +56,17 @@ class VarDeclaration(Stmt):
         self.value = value
 
 class FunctionDeclaration(Stmt):
+    # Results cached per function value, set by src/purity.py on pure
+    # declarations. 0 disables the cache.
+    memoize = 0
+    # Set by maiin/captures.py. captures: names the function copies from
+    # its defining scopes, None to keep the whole defining Environment.
+    # cells: parameters living in Cells. program_depth: parent hops from
+    # the defining scope to the program scope.
+    captures = None
+    cells = ()
+    program_depth = 0
+
     def __init__(self, parameters: List[str], name: str, body: List[Stmt]):
         super().__init__("FunctionDeclaration")
         self.parameters = parameters
@@ -44,6 +77,9 @@ class Expr(Stmt):
     pass
 
 class AssignmentExpr(Expr):
+    # Set by maiin/captures.py when the target may be a Cell.
+    cell = False
+
     def __init__(self, assigne: "Expr", value: "Expr"):
         super().__init__("AssignmentExpr")
         self.assigne = assigne
@@ -63,6 +99,10 @@ class CallExpr(Expr):
         self.caller = caller
 
 class MemberExpr(Expr):
+    # Inline cache of the site, see maiin/shapes.py. Filled in at runtime
+    # and never cached.
+    site = None
+
     def __init__(self, object: "Expr", property: "Expr", computed: bool):
         super().__init__("MemberExpr")
         self.object = object
@@ -72,6 +112,9 @@ class MemberExpr(Expr):
 # LITERAL / PRIMARY EXPRESSION TYPES
 
 class Identifier(Expr):
+    # Set by maiin/captures.py when the variable read may be a Cell.
+    cell = False
+
     def __init__(self, symbol: str):
         super().__init__("Identifier")
         self.symbol = symbol
@@ -79,15 +122,37 @@ class Identifier(Expr):
 class NumericLiteral(Expr):
     def __init__(self, value: float):
         super().__init__("NumericLiteral")
+        # An int when parsed, constant folding may leave a float.
         self.value = value
 
+# The value of a number token. Python refuses to convert more digits than
+# sys.get_int_max_str_digits() to an int, such a literal becomes a float
+# (inf) instead.
+def number_value(text: str) -> float:
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
 class Property(Expr):
+    # Set by maiin/captures.py when the shorthand variable may be a Cell.
+    cell = False
+
     def __init__(self, key: str, value: Optional["Expr"] = None):
         super().__init__("Property")
         self.key = key
         self.value = value
 
 class ObjectLiteral(Expr):
+    # Shape of the objects the site builds, see maiin/shapes.py. Filled in
+    # at runtime and never cached.
+    site = None
+
     def __init__(self, properties: List[Property]):
         super().__init__("ObjectLiteral")
         self.properties = properties
+
+class ArrayLiteral(Expr):
+    def __init__(self, elements: List[Expr]):
+        super().__init__("ArrayLiteral")
+        self.elements = elements
@@ -0,0 +1,177 @@
+import hashlib
+import marshal
+import mmap
+import os
+import tempfile
+from typing import Dict, Iterable, Optional, Tuple
+from src import ast_1
+from src.ast_1 import Program, Stmt
+
+# On disk cache of parsed programs, in the spirit of __pycache__/*.pyc.
+#
+# Every source file gets one cache file per set of stages applied after
+# parsing (e.g. optimize, resolve). The file starts with MAGIC and the
+# sha256 of (VERSION, stages, context, source), followed by the marshalled
+# tree.
+# A cache file whose digest does not match the current source is stale and
+# gets replaced on the next store.
+#
+# The tree is stored generically so annotations added by later stages
+# (resolver slots, frame sizes, ...) are kept as well. A node becomes a tuple
+# (layout, *attribute values), where layout indexes a table of
+# (class name, kind, attribute names) stored in front of the tree. Plain
+# tuples inside the tree are tagged with DATA_TUPLE instead of a layout.
+
+# Bump when the AST or any stage annotating it changes.
+VERSION = "niscript-0.1.7"
+MAGIC = b"NSC\x01"
+HEADER_SIZE = len(MAGIC) + 32
+DATA_TUPLE = -1
+# Runtime state the backends keep on nodes, left out of the cache.
+RUNTIME_ATTRIBUTES = ("site", "awaits")
+
+# Used when NISCRIPT_CACHE_DIR is not set: next to the source file.
+DEFAULT_DIRECTORY = "__nscache__"
+
+NODE_CLASSES = {
+    name: cls for name, cls in vars(ast_1).items()
+    if isinstance(cls, type) and issubclass(cls, Stmt)
+}
+
+
+class Encoder:
+    def __init__(self):
+        self.layouts: Dict[Tuple[str, str, Tuple[str, ...]], int] = {}
+
+    def encode(self, value):
+        if isinstance(value, Stmt):
+            attributes = vars(value)
+            fields = tuple(name for name in attributes if name != "kind" and name not in RUNTIME_ATTRIBUTES)
+            key = (type(value).__name__, value.kind, fields)
+            layout = self.layouts.get(key)
+            if layout is None:
+                layout = self.layouts[key] = len(self.layouts)
+            return (layout,) + tuple(self.encode(attributes[name]) for name in fields)
+        if isinstance(value, list):
+            return [self.encode(item) for item in value]
+        if isinstance(value, tuple):
+            return (DATA_TUPLE,) + tuple(self.encode(item) for item in value)
+        return value
+
+
+def encode(program: Program) -> tuple:
+    encoder = Encoder()
+    tree = encoder.encode(program)
+    return tuple(encoder.layouts), tree
+
+
+def decode(data: tuple) -> Program:
+    layouts = [(NODE_CLASSES[name], kind, fields) for name, kind, fields in data[0]]
+    new = object.__new__
+    containers = (tuple, list)
+
+    def decode_value(value):
+        if type(value) is list:
+            return [decode_value(item) if type(item) in containers else item for item in value]
+
+        items = [decode_value(item) if type(item) in containers else item for item in value]
+        layout = items.pop(0)
+        if layout == DATA_TUPLE:
+            return tuple(items)
+        cls, kind, fields = layouts[layout]
+        node = new(cls)
+        attributes = dict(zip(fields, items))
+        attributes["kind"] = kind
+        node.__dict__ = attributes
+        return node
+
+    return decode_value(data[1])
+
+
+class ProgramCache:
+    def __init__(self, directory: Optional[str] = None):
+        # directory: where cache files go, defaults to $NISCRIPT_CACHE_DIR
+        # and then to __nscache__ next to every source file.
+        self.directory = directory or os.environ.get("NISCRIPT_CACHE_DIR") or None
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, filename: str, stages: Tuple[str, ...]) -> str:
+        filename = os.path.abspath(filename)
+        name = os.path.basename(filename)
+        if stages:
+            name += "." + ".".join(stages)
+
+        if self.directory is None:
+            return os.path.join(os.path.dirname(filename), DEFAULT_DIRECTORY, name + ".nsc")
+
+        # A shared directory serves files from everywhere.
+        location = hashlib.sha256(filename.encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f"{name}.{location}.nsc")
+
+    # context: anything else the cached tree depends on, e.g. the global
+    # names the resolver assigned slots to.
+    @staticmethod
+    def digest(source: str, stages: Tuple[str, ...], context: Tuple[str, ...]) -> bytes:
+        key = hashlib.sha256()
+        for part in (VERSION,) + stages + ("",) + context + ("",):
+            key.update(part.encode() + b"\0")
+        key.update(source.encode())
+        return key.digest()
+
+    def load(
+        self,
+        filename: str,
+        source: str,
+        stages: Iterable[str] = (),
+        context: Iterable[str] = (),
+    ) -> Optional[Program]:
+        stages = tuple(stages)
+        try:
+            with open(self.path(filename, stages), "rb") as file:
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    if data[:HEADER_SIZE] != MAGIC + self.digest(source, stages, tuple(context)):
+                        self.misses += 1
+                        return None
+                    with memoryview(data) as view:
+                        tree = marshal.loads(view[HEADER_SIZE:])
+        except (OSError, ValueError, EOFError, TypeError):
+            # Missing, empty or unreadable: same as a stale cache.
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return decode(tree)
+
+    def store(
+        self,
+        filename: str,
+        source: str,
+        program: Program,
+        stages: Iterable[str] = (),
+        context: Iterable[str] = (),
+    ) -> bool:
+        stages = tuple(stages)
+        path = self.path(filename, stages)
+        try:
+            data = MAGIC + self.digest(source, stages, tuple(context)) + marshal.dumps(encode(program))
+        except (ValueError, RecursionError):
+            # Too deeply nested for marshal, run uncached.
+            return False
+
+        # Concurrent writers each write their own temporary file and the
+        # last rename wins, readers never see a partial file.
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    file.write(data)
+                os.replace(temporary, path)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+        except OSError:
+            # A read-only location just means no caching.
+            return False
+        return True
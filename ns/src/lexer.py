@@ -1,4 +1,4 @@
-from typing import List, Dict
+from typing import Dict, Iterator, List, TextIO
 
 # Represents tokens that our language understands in parsing.
 class TokenType:
@@ -33,10 +33,28 @@ KEYWORDS: Dict[str, TokenType] = {
 }
 
 # Represents a single token from the source code.
+# Tokens are created once per lexeme, so they use __slots__ to stay compact.
 class Token:
-    def __init__(self, value: str, type: TokenType):
+    __slots__ = ("value", "type", "start", "end", "line", "column")
+
+    def __init__(
+        self,
+        value: str,
+        type: TokenType,
+        start: int = 0,
+        end: int = 0,
+        line: int = 1,
+        column: int = 1,
+    ):
         self.value = value  # contains the raw value as seen inside the source code.
         self.type = type  # tagged structure.
+        self.start = start  # offset of the first character inside the source.
+        self.end = end  # offset one past the last character.
+        self.line = line  # 1-based line of the first character.
+        self.column = column  # 1-based column of the first character.
+
+    def __repr__(self):
+        return f"Token({self.value!r}, {self.type}, {self.line}:{self.column})"
 
 # Returns a token of a given type and value
 def token(value="", type: TokenType = TokenType.EOF) -> Token:
@@ -46,84 +64,213 @@ def token(value="", type: TokenType = TokenType.EOF) -> Token:
 def isalpha(src: str) -> bool:
     return src.isalpha()
 
+# Whitespace characters which separate tokens.
+SKIPPABLE = frozenset((" ", "\n", "\t", "\r"))
+
 # Returns true if the character is whitespace like -> [\s, \t, \n]
 def isskippable(str: str) -> bool:
-    return str in [" ", "\n", "\t", "\r"]
+    return str in SKIPPABLE
 
 # Return whether the character is a valid integer -> [0-9]
 def isint(str: str) -> bool:
     return str.isdigit()
 
+# Characters which always form a token on their own.
+SINGLE_CHAR_TOKENS: Dict[str, TokenType] = {
+    "(": TokenType.OpenParen,
+    ")": TokenType.CloseParen,
+    "{": TokenType.OpenBrace,
+    "}": TokenType.CloseBrace,
+    "[": TokenType.OpenBracket,
+    "]": TokenType.CloseBracket,
+    "+": TokenType.BinaryOperator,
+    "-": TokenType.BinaryOperator,
+    "*": TokenType.BinaryOperator,
+    "/": TokenType.BinaryOperator,
+    "%": TokenType.BinaryOperator,
+    "=": TokenType.Equals,
+    ";": TokenType.Semicolon,
+    ":": TokenType.Colon,
+    ",": TokenType.Comma,
+    ".": TokenType.Dot,
+}
+
 # Given a string representing source code: Produce tokens and handles
 # possible unidentified characters.
 # - Returns an array of tokens.
 # - Does not modify the incoming string.
-def tokenize(sourceCode: str) -> List[Token]:
-    tokens = []
-    src = list(sourceCode)
+# - Walks the source once with an index cursor, so the cost is linear
+#   in the size of the input.
+# - start/end, line and line_start select a part of the source, positions
+#   stay relative to the whole source.
+# - skip_bodies: leave the inside of every `fn name(...) { ... }` body
+#   untokenized, so `{` is directly followed by its closing `}`. Used by the
+#   lazy parser, which tokenizes a body once it is needed.
+def tokenize(
+    sourceCode: str,
+    start: int = 0,
+    end: int = None,
+    line: int = 1,
+    line_start: int = 0,
+    skip_bodies: bool = False,
+) -> List[Token]:
+    tokens: List[Token] = []
+    append = tokens.append
+    single_char_tokens = SINGLE_CHAR_TOKENS
+    src = sourceCode
+    length = len(src) if end is None else end
+    pos = start
+    # Index of the last `fn` token whose body has not been seen yet.
+    fn_index = -1
 
     # Produce tokens until the EOF is reached.
-    while src:
+    while pos < length:
+        char = src[pos]
+
         # BEGIN PARSING ONE CHARACTER TOKENS
-        if src[0] == "(":
-            tokens.append(token(src.pop(0), TokenType.OpenParen))
-        elif src[0] == ")":
-            tokens.append(token(src.pop(0), TokenType.CloseParen))
-        elif src[0] == "{":
-            tokens.append(token(src.pop(0), TokenType.OpenBrace))
-        elif src[0] == "}":
-            tokens.append(token(src.pop(0), TokenType.CloseBrace))
-        elif src[0] == "[":
-            tokens.append(token(src.pop(0), TokenType.OpenBracket))
-        elif src[0] == "]":
-            tokens.append(token(src.pop(0), TokenType.CloseBracket))
-        # HANDLE BINARY OPERATORS
-        elif src[0] in "+-*/%":
-            tokens.append(token(src.pop(0), TokenType.BinaryOperator))
-        # Handle Conditional & Assignment Tokens
-        elif src[0] == "=":
-            tokens.append(token(src.pop(0), TokenType.Equals))
-        elif src[0] == ";":
-            tokens.append(token(src.pop(0), TokenType.Semicolon))
-        elif src[0] == ":":
-            tokens.append(token(src.pop(0), TokenType.Colon))
-        elif src[0] == ",":
-            tokens.append(token(src.pop(0), TokenType.Comma))
-        elif src[0] == ".":
-            tokens.append(token(src.pop(0), TokenType.Dot))
+        single = single_char_tokens.get(char)
+        if single is not None:
+            append(Token(char, single, pos, pos + 1, line, pos - line_start + 1))
+            pos += 1
+            if single == TokenType.OpenBrace and fn_index >= 0 and is_fn_body(tokens, fn_index):
+                fn_index = -1
+                close, lines, last_newline = match_brace(src, pos, length)
+                if close >= 0:
+                    pos = close
+                    line += lines
+                    if lines:
+                        line_start = last_newline + 1
         # HANDLE MULTICHARACTER KEYWORDS, TOKENS, IDENTIFIERS, ETC...
+        # Handle numeric literals -> Integers
+        elif char.isdigit():
+            stop = pos + 1
+            while stop < length and src[stop].isdigit():
+                stop += 1
+
+            # append new numeric token.
+            append(Token(src[pos:stop], TokenType.Number, pos, stop, line, pos - line_start + 1))
+            pos = stop
+        # Handle Identifier & Keyword Tokens.
+        elif char.isalpha():
+            stop = pos + 1
+            while stop < length and src[stop].isalpha():
+                stop += 1
+
+            ident = src[pos:stop]
+            # CHECK FOR RESERVED KEYWORDS
+            # If the identifier is a recognized keyword use its token type,
+            # an unrecognized name must mean a user-defined symbol.
+            kind = KEYWORDS.get(ident, TokenType.Identifier)
+            if kind == TokenType.Fn and skip_bodies:
+                fn_index = len(tokens)
+            append(Token(ident, kind, pos, stop, line, pos - line_start + 1))
+            pos = stop
+        elif char in SKIPPABLE:
+            # Skip uneeded chars, keeping track of line starts for positions.
+            if char == "\n":
+                line += 1
+                line_start = pos + 1
+            pos += 1
+        # Handle unrecognized characters.
+        # TODO: Implement better errors and error recovery.
         else:
-            # Handle numeric literals -> Integers
-            if isint(src[0]):
-                num = ""
-                while src and isint(src[0]):
-                    num += src.pop(0)
-
-                # append new numeric token.
-                tokens.append(token(num, TokenType.Number))
-            # Handle Identifier & Keyword Tokens.
-            elif isalpha(src[0]):
-                ident = ""
-                while src and isalpha(src[0]):
-                    ident += src.pop(0)
-
-                # CHECK FOR RESERVED KEYWORDS
-                reserved = KEYWORDS.get(ident)
-                # If value is not None, then the identifier is
-                # recognized keyword.
-                if reserved is not None:
-                    tokens.append(token(ident, reserved))
-                else:
-                    # Unrecognized name must mean a user-defined symbol.
-                    tokens.append(token(ident, TokenType.Identifier))
-            elif isskippable(src[0]):
-                # Skip uneeded chars.
-                src.pop(0)
-            # Handle unrecognized characters.
-            # TODO: Implement better errors and error recovery.
-            else:
-                print("Unrecognized character found in source:", ord(src[0]), src[0])
-                exit(1)
-
-    tokens.append(token(type=TokenType.EOF, value="EndOfFile"))
+            print("Unrecognized character found in source:", ord(char), char)
+            exit(1)
+
+    tokens.append(Token("EndOfFile", TokenType.EOF, length, length, line, length - line_start + 1))
     return tokens
+
+
+# Whether the `{` just appended opens the body of the function declared by
+# tokens[fn_index]: `fn name ( ... ) {` with balanced parentheses.
+def is_fn_body(tokens: List[Token], fn_index: int) -> bool:
+    last = len(tokens) - 2  # the token before `{`
+    if (
+        last < fn_index + 3
+        or tokens[fn_index + 1].type != TokenType.Identifier
+        or tokens[fn_index + 2].type != TokenType.OpenParen
+        or tokens[last].type != TokenType.CloseParen
+    ):
+        return False
+
+    depth = 0
+    for i in range(fn_index + 2, last):
+        type = tokens[i].type
+        if type == TokenType.OpenParen:
+            depth += 1
+        elif type == TokenType.CloseParen:
+            depth -= 1
+            if not depth:
+                # Closed before the last `)`.
+                return False
+    return depth == 1
+
+
+# Finds the `}` closing a block whose `{` ends right before pos. Braces only
+# ever come from single character tokens, so this works on the characters.
+# Returns (index or -1, newlines skipped, index of the last newline).
+def match_brace(src: str, pos: int, length: int):
+    depth = 0
+    lines = 0
+    last_newline = -1
+    while pos < length:
+        char = src[pos]
+        if char == "}":
+            if not depth:
+                return pos, lines, last_newline
+            depth -= 1
+        elif char == "{":
+            depth += 1
+        elif char == "\n":
+            lines += 1
+            last_newline = pos
+        pos += 1
+    return -1, 0, -1
+
+
+# Characters read from a file at a time by tokenize_stream.
+CHUNK_SIZE = 1 << 16
+
+# Like tokenize, but reads the source from file a chunk at a time and yields
+# the tokens as it goes, so only the current chunk is ever held in memory.
+# Positions are the same as tokenize gives for the whole file.
+# - A chunk is tokenized up to its last character that cannot be inside an
+#   identifier or number. The rest is carried over in pieces, only the new
+#   chunk is searched for its end, so a name or number spanning many chunks
+#   is still read in linear time.
+# - Ends with the EOF token.
+def tokenize_stream(file: TextIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Token]:
+    partial: List[str] = []  # pieces of a name or number cut by a chunk end.
+    base = 0  # offset of the first piece inside the file.
+    line = 1
+    line_start = 0
+
+    while True:
+        chunk = file.read(chunk_size)
+        cut = len(chunk)
+        while cut and chunk[cut - 1].isalnum():
+            cut -= 1
+        if chunk and not cut:
+            partial.append(chunk)
+            continue
+
+        partial.append(chunk[:cut])
+        text = "".join(partial)
+        partial = [chunk[cut:]]
+
+        tokens = tokenize(text, 0, len(text), line, line_start - base)
+        tokens.pop()  # the EOF of the chunk.
+        for tk in tokens:
+            tk.start += base
+            tk.end += base
+        yield from tokens
+
+        newlines = text.count("\n")
+        if newlines:
+            line += newlines
+            line_start = base + text.rindex("\n") + 1
+        base += len(text)
+        if not chunk:
+            break
+
+    yield Token("EndOfFile", TokenType.EOF, base, base, line, base - line_start + 1)
@@ -0,0 +1,415 @@
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    Expr,
+    FunctionDeclaration,
+    Identifier,
+    MemberExpr,
+    NumericLiteral,
+    ObjectLiteral,
+    Program,
+    Property,
+    Stmt,
+    VarDeclaration,
+)
+
+# Optional optimization stage between Parser.produceAST and evaluation.
+# Every pass rewrites the tree in place and counts what it changed; the
+# Optimizer runs the enabled passes until none of them changes anything.
+#
+#   optimizer = Optimizer(builtins=env.variables, disabled={"dead-store"})
+#   program = optimizer.optimize(program)
+#   print(optimizer.report())
+
+
+class OptimizationPass:
+    name = ""
+
+    def __init__(self):
+        self.stats: Dict[str, int] = {}
+        self.elapsed = 0.0
+
+    def count(self, what: str, amount: int = 1):
+        self.stats[what] = self.stats.get(what, 0) + amount
+
+    # Returns the number of rewrites done on program.
+    def run(self, program: Program) -> int:
+        raise NotImplementedError
+
+
+class ExpressionPass(OptimizationPass):
+    # Rewrites every expression bottom-up through rewrite().
+    def run(self, program: Program) -> int:
+        before = sum(self.stats.values())
+        program.body = self.visit_body(program.body)
+        return sum(self.stats.values()) - before
+
+    def visit_body(self, body: List[Stmt]) -> List[Stmt]:
+        return [self.visit(stmt) for stmt in body]
+
+    def visit(self, node: Stmt) -> Stmt:
+        if isinstance(node, BinaryExpr):
+            node.left = self.visit(node.left)
+            node.right = self.visit(node.right)
+        elif isinstance(node, CallExpr):
+            node.args = [self.visit(arg) for arg in node.args]
+            node.caller = self.visit(node.caller)
+        elif isinstance(node, AssignmentExpr):
+            if isinstance(node.assigne, MemberExpr):
+                node.assigne = self.visit(node.assigne)
+            node.value = self.visit(node.value)
+        elif isinstance(node, ObjectLiteral):
+            for prop in node.properties:
+                if prop.value is not None:
+                    prop.value = self.visit(prop.value)
+        elif isinstance(node, ArrayLiteral):
+            node.elements = [self.visit(element) for element in node.elements]
+        elif isinstance(node, MemberExpr):
+            node.object = self.visit(node.object)
+            if node.computed:
+                node.property = self.visit(node.property)
+        elif isinstance(node, VarDeclaration):
+            if node.value is not None:
+                node.value = self.visit(node.value)
+        elif isinstance(node, FunctionDeclaration):
+            node.body = self.visit_body(node.body)
+        return self.rewrite(node)
+
+    def rewrite(self, node: Stmt) -> Stmt:
+        return node
+
+
+# Numeric results of the binary operators, mirrors eval_numeric_binary_expr.
+def apply_operator(operator: str, lhs: float, rhs: float) -> float:
+    if operator == "+":
+        return lhs + rhs
+    elif operator == "-":
+        return lhs - rhs
+    elif operator == "*":
+        return lhs * rhs
+    elif operator == "/":
+        return lhs / rhs
+    return lhs % rhs
+
+
+class ConstantFolding(ExpressionPass):
+    # 2 * 3 + 1 -> 7
+    name = "fold"
+
+    def rewrite(self, node: Stmt) -> Stmt:
+        if (
+            isinstance(node, BinaryExpr)
+            and isinstance(node.left, NumericLiteral)
+            and isinstance(node.right, NumericLiteral)
+        ):
+            try:
+                value = apply_operator(node.operator, node.left.value, node.right.value)
+            except ArithmeticError:
+                # Keep the error (division by zero, an int too large for
+                # `/`) for runtime.
+                return node
+            self.count("folded")
+            return NumericLiteral(value=value)
+        return node
+
+
+class IdentitySimplification(ExpressionPass):
+    # x * 1 -> x, 1 * x -> x, x - 0 -> x
+    #
+    # Binary expressions on anything but numbers and vectors evaluate to
+    # null, so an operand can only be returned as is when it already is a
+    # number, a vector or null: a numeric literal or another binary
+    # expression. `x + 0` is left alone because -0.0 + 0 is 0.0. Only the
+    # int literals 1 and 0 qualify, x * 1.0 turns an int x into a float,
+    # and so does x / 1.
+    name = "simplify"
+
+    def rewrite(self, node: Stmt) -> Stmt:
+        if not isinstance(node, BinaryExpr):
+            return node
+
+        left, right = node.left, node.right
+        if is_literal(right, 1) and node.operator == "*" and is_number_or_null(left):
+            self.count("simplified")
+            return left
+        if is_literal(left, 1) and node.operator == "*" and is_number_or_null(right):
+            self.count("simplified")
+            return right
+        if is_literal(right, 0) and node.operator == "-" and is_number_or_null(left):
+            self.count("simplified")
+            return left
+        return node
+
+
+def is_literal(node: Stmt, value: int) -> bool:
+    return isinstance(node, NumericLiteral) and type(node.value) is int and node.value == value
+
+
+def is_number_or_null(node: Stmt) -> bool:
+    return isinstance(node, (NumericLiteral, BinaryExpr))
+
+
+class PropagationScope:
+    def __init__(self, parent: Optional["PropagationScope"], names: Set[str]):
+        self.parent = parent
+        # Every name declared anywhere in the scope.
+        self.names = names
+        # Names declared so far, in statement order.
+        self.declared: Set[str] = set()
+        # Values of the const numeric bindings declared so far.
+        self.constants: Dict[str, float] = {}
+        # What the enclosing scopes had declared when this function was
+        # created, index 0 is the parent.
+        self.snapshots: List[Set[str]] = []
+
+
+class ConstantPropagation(OptimizationPass):
+    # const rate = 3; rate * 2 -> const rate = 3; 3 * 2
+    #
+    # Names are bound at runtime in statement order and function bodies see
+    # their enclosing scopes as they are at call time. A use is only replaced
+    # when the const is certainly the binding it reads: declared earlier in
+    # the same scope, or declared before the function containing the use and
+    # not shadowed by any scope in between.
+    name = "propagate"
+
+    def run(self, program: Program) -> int:
+        before = sum(self.stats.values())
+        scope = PropagationScope(None, declared_names(program.body))
+        self.visit_body(program.body, scope)
+        return sum(self.stats.values()) - before
+
+    def visit_body(self, body: List[Stmt], scope: PropagationScope):
+        for i, stmt in enumerate(body):
+            body[i] = self.visit(stmt, scope)
+
+    def lookup(self, name: str, scope: PropagationScope) -> Optional[float]:
+        if name in scope.declared:
+            return scope.constants.get(name)
+
+        current = scope.parent
+        depth = 0
+        while current is not None:
+            if name in scope.snapshots[depth]:
+                return current.constants.get(name)
+            if name in current.names:
+                # May or may not be declared when the use runs.
+                return None
+            current = current.parent
+            depth += 1
+        return None
+
+    def visit(self, node: Stmt, scope: PropagationScope) -> Stmt:
+        if isinstance(node, Identifier):
+            value = self.lookup(node.symbol, scope)
+            if value is not None:
+                self.count("propagated")
+                return NumericLiteral(value=value)
+        elif isinstance(node, BinaryExpr):
+            node.left = self.visit(node.left, scope)
+            node.right = self.visit(node.right, scope)
+        elif isinstance(node, CallExpr):
+            node.args = [self.visit(arg, scope) for arg in node.args]
+            node.caller = self.visit(node.caller, scope)
+        elif isinstance(node, AssignmentExpr):
+            if isinstance(node.assigne, MemberExpr):
+                node.assigne = self.visit(node.assigne, scope)
+            node.value = self.visit(node.value, scope)
+        elif isinstance(node, ArrayLiteral):
+            node.elements = [self.visit(element, scope) for element in node.elements]
+        elif isinstance(node, ObjectLiteral):
+            for prop in node.properties:
+                if prop.value is not None:
+                    prop.value = self.visit(prop.value, scope)
+                else:
+                    value = self.lookup(prop.key, scope)
+                    if value is not None:
+                        self.count("propagated")
+                        prop.value = NumericLiteral(value=value)
+        elif isinstance(node, MemberExpr):
+            node.object = self.visit(node.object, scope)
+            if node.computed:
+                node.property = self.visit(node.property, scope)
+        elif isinstance(node, VarDeclaration):
+            if node.value is not None:
+                node.value = self.visit(node.value, scope)
+            scope.declared.add(node.identifier)
+            if node.constant and isinstance(node.value, NumericLiteral):
+                scope.constants[node.identifier] = node.value.value
+        elif isinstance(node, FunctionDeclaration):
+            scope.declared.add(node.name)
+            body_scope = PropagationScope(scope, set(node.parameters) | declared_names(node.body))
+            body_scope.declared.update(node.parameters)
+            body_scope.snapshots = [set(scope.declared)] + scope.snapshots
+            self.visit_body(node.body, body_scope)
+        return node
+
+
+def declared_names(body: List[Stmt]) -> Set[str]:
+    names = set()
+    for stmt in body:
+        if isinstance(stmt, VarDeclaration):
+            names.add(stmt.identifier)
+        elif isinstance(stmt, FunctionDeclaration):
+            names.add(stmt.name)
+    return names
+
+
+class DeadStoreElimination(OptimizationPass):
+    # Removes `let x = <value without side effects>;` (or const) when x is
+    # never used anywhere in the program.
+    #
+    # A declaration is kept when it is the last statement of its body (its
+    # value is the result), when the name is declared again in the same body
+    # or is a builtin (declaring it raises), or when evaluating the value
+    # could fail.
+    name = "dead-store"
+
+    def __init__(self, builtins: Iterable[str] = ()):
+        super().__init__()
+        self.builtins = set(builtins)
+        self.used: Set[str] = set()
+
+    def run(self, program: Program) -> int:
+        before = sum(self.stats.values())
+        self.used = set()
+        for stmt in program.body:
+            collect_used_names(stmt, self.used)
+        program.body = self.visit_body(program.body, self.builtins)
+        return sum(self.stats.values()) - before
+
+    def visit_body(self, body: List[Stmt], reserved: Set[str]) -> List[Stmt]:
+        declarations: Dict[str, int] = {}
+        for stmt in body:
+            if isinstance(stmt, VarDeclaration):
+                declarations[stmt.identifier] = declarations.get(stmt.identifier, 0) + 1
+            elif isinstance(stmt, FunctionDeclaration):
+                declarations[stmt.name] = declarations.get(stmt.name, 0) + 1
+
+        result = []
+        for i, stmt in enumerate(body):
+            if isinstance(stmt, FunctionDeclaration):
+                stmt.body = self.visit_body(stmt.body, set(stmt.parameters))
+            elif (
+                isinstance(stmt, VarDeclaration)
+                and i != len(body) - 1
+                and stmt.identifier not in self.used
+                and stmt.identifier not in reserved
+                and declarations[stmt.identifier] == 1
+                and (stmt.value is None or is_pure(stmt.value))
+            ):
+                self.count("removed")
+                continue
+            result.append(stmt)
+        return result
+
+
+def collect_used_names(node: Stmt, used: Set[str]):
+    if isinstance(node, Identifier):
+        used.add(node.symbol)
+    elif isinstance(node, BinaryExpr):
+        collect_used_names(node.left, used)
+        collect_used_names(node.right, used)
+    elif isinstance(node, CallExpr):
+        for arg in node.args:
+            collect_used_names(arg, used)
+        collect_used_names(node.caller, used)
+    elif isinstance(node, AssignmentExpr):
+        collect_used_names(node.assigne, used)
+        collect_used_names(node.value, used)
+    elif isinstance(node, ObjectLiteral):
+        for prop in node.properties:
+            if prop.value is None:
+                used.add(prop.key)
+            else:
+                collect_used_names(prop.value, used)
+    elif isinstance(node, ArrayLiteral):
+        for element in node.elements:
+            collect_used_names(element, used)
+    elif isinstance(node, MemberExpr):
+        collect_used_names(node.object, used)
+        collect_used_names(node.property, used)
+    elif isinstance(node, VarDeclaration):
+        if node.value is not None:
+            collect_used_names(node.value, used)
+    elif isinstance(node, FunctionDeclaration):
+        for stmt in node.body:
+            collect_used_names(stmt, used)
+
+
+# Whether evaluating node can neither fail nor have side effects.
+def is_pure(node: Expr) -> bool:
+    if isinstance(node, NumericLiteral):
+        return True
+    if isinstance(node, BinaryExpr):
+        if node.operator not in ("+", "-", "*"):
+            # Division and modulo fail on a zero divisor.
+            if not isinstance(node.right, NumericLiteral) or node.right.value == 0:
+                return False
+        return is_pure(node.left) and is_pure(node.right)
+    if isinstance(node, ObjectLiteral):
+        return all(prop.value is not None and is_pure(prop.value) for prop in node.properties)
+    if isinstance(node, ArrayLiteral):
+        return all(is_pure(element) for element in node.elements)
+    return False
+
+
+PASS_NAMES = ("fold", "propagate", "simplify", "dead-store")
+
+
+class Optimizer:
+    def __init__(
+        self,
+        builtins: Iterable[str] = (),
+        disabled: Iterable[str] = (),
+        max_rounds: int = 10,
+    ):
+        # builtins: names already declared in the global environment.
+        # disabled: names of passes to skip, see PASS_NAMES.
+        disabled = set(disabled)
+        unknown = disabled - set(PASS_NAMES)
+        if unknown:
+            raise ValueError(f"Unknown optimization passes {sorted(unknown)}. Expected some of {PASS_NAMES}.")
+
+        passes = [
+            ConstantFolding(),
+            ConstantPropagation(),
+            IdentitySimplification(),
+            DeadStoreElimination(builtins),
+        ]
+        self.passes: List[OptimizationPass] = [p for p in passes if p.name not in disabled]
+        self.max_rounds = max_rounds
+        self.rounds = 0
+
+    def optimize(self, program: Program) -> Program:
+        for _ in range(self.max_rounds):
+            self.rounds += 1
+            changes = 0
+            for optimization in self.passes:
+                start = time.perf_counter()
+                changes += optimization.run(program)
+                optimization.elapsed += time.perf_counter() - start
+            if not changes:
+                break
+        return program
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            optimization.name: dict(optimization.stats, seconds=optimization.elapsed)
+            for optimization in self.passes
+        }
+
+    def report(self) -> str:
+        lines = [f"optimizer: {self.rounds} round(s)"]
+        for optimization in self.passes:
+            counts = ", ".join(f"{what}={n}" for what, n in sorted(optimization.stats.items())) or "no changes"
+            lines.append(f"  {optimization.name:<11} {optimization.elapsed * 1000:8.2f} ms  {counts}")
+        return "\n".join(lines)
+
+
+def optimize(program: Program, builtins: Iterable[str] = (), disabled: Iterable[str] = ()) -> Program:
+    return Optimizer(builtins, disabled).optimize(program)
@@ -1,5 +1,6 @@
-from typing import List
+from typing import Iterable, Iterator, List
 from src.ast_1 import (
+    ArrayLiteral,
     AssignmentExpr,
     BinaryExpr,
     CallExpr,
@@ -13,39 +14,176 @@ from src.ast_1 import (
     Stmt,
     VarDeclaration,
     FunctionDeclaration,
+    located,
+    number_value,
 )
 from src.lexer import Token, tokenize, TokenType
+from src.pratt import parse_expression
+
+# Available expression parsing engines.
+# - descent: one method per precedence level (the original parser).
+# - pratt: iterative operator-precedence parser, see src/pratt.py.
+PARSER_ENGINES = ("descent", "pratt")
+
+# Statements of a function body parsed in lazy mode. The lexer skips the
+# characters of the body and the parser records where they are, they are
+# tokenized and parsed the first time the body is used.
+class LazyBody(list):
+    def __init__(self, source: str, open_brace: Token, close_brace: Token, engine: str):
+        super().__init__()
+        self.source = source
+        self.start = open_brace.end  # first character of the body.
+        self.end = close_brace.start  # the closing brace.
+        self.line = open_brace.line
+        self.line_start = open_brace.start - open_brace.column + 1
+        self.engine = engine
+        self.parsed = False
+
+    def parse(self) -> "LazyBody":
+        if not self.parsed:
+            parser = Parser(self.engine, lazy=True)
+            parser.source = self.source
+            # Up to and including the closing brace, so errors report the
+            # same tokens as an eager parse.
+            parser.tokens = tokenize(
+                self.source, self.start, self.end + 1, self.line, self.line_start, skip_bodies=True
+            )
+            list.extend(self, parser.parse_block())
+            self.parsed = True
+            self.source = None
+        return self
+
+    def __iter__(self):
+        return list.__iter__(self.parse())
+
+    def __reversed__(self):
+        return list.__reversed__(self.parse())
+
+    def __len__(self):
+        return list.__len__(self.parse())
+
+    def __getitem__(self, index):
+        return list.__getitem__(self.parse(), index)
+
+    def __setitem__(self, index, value):
+        list.__setitem__(self.parse(), index, value)
+
+    def __contains__(self, value):
+        return list.__contains__(self.parse(), value)
+
+    def __repr__(self):
+        if not self.parsed:
+            return f"<unparsed body, characters {self.start}-{self.end}>"
+        return list.__repr__(self)
+
+
+def is_unparsed(body: List[Stmt]) -> bool:
+    return isinstance(body, LazyBody) and not body.parsed
+
+
+# The tokens of a stream (tokenize_stream) the parser has looked at and
+# not released yet. Indexed like the list produceAST parses, tokens are
+# taken from the stream only when the parser reaches them, so it never
+# reads more than the token after the statement it is parsing.
+class TokenWindow:
+    def __init__(self, tokens: Iterable[Token]):
+        self.stream = iter(tokens)
+        self.buffer: List[Token] = []
+        self.offset = 0  # index of buffer[0] in the stream.
+
+    def __getitem__(self, index: int) -> Token:
+        try:
+            return self.buffer[index - self.offset]
+        except IndexError:
+            return self.fill(index)
+
+    def fill(self, index: int) -> Token:
+        buffer = self.buffer
+        while index - self.offset >= len(buffer):
+            if buffer and buffer[-1].type == TokenType.EOF:
+                # Nothing follows the end, it is read again.
+                return buffer[-1]
+            buffer.append(next(self.stream))
+        return buffer[index - self.offset]
+
+    # Drops the tokens before index, the parser is done with them.
+    def release(self, index: int):
+        del self.buffer[:index - self.offset]
+        self.offset = index
+
 
 class Parser:
-    def __init__(self):
+    def __init__(self, engine: str = "descent", lazy: bool = False):
+        # lazy: leave function bodies unparsed until they are used, see
+        # LazyBody. Parser.validate parses whatever is left.
+        if engine not in PARSER_ENGINES:
+            raise ValueError(f"Unknown parser engine '{engine}'. Expected one of {PARSER_ENGINES}.")
+        self.engine = engine
+        self.lazy = lazy
+        self.source = ""
         self.tokens: List[Token] = []
+        self.pos = 0  # index of the current token.
 
     def not_eof(self) -> bool:
-        return self.tokens[0].type != TokenType.EOF
+        return self.tokens[self.pos].type != TokenType.EOF
 
     def at(self) -> Token:
-        return self.tokens[0]
+        return self.tokens[self.pos]
 
     def eat(self) -> Token:
-        prev = self.tokens.pop(0)
+        prev = self.tokens[self.pos]
+        self.pos += 1
         return prev
 
     def expect(self, type: TokenType, err: str) -> Token:
-        prev = self.tokens.pop(0)
+        prev = self.tokens[self.pos]
+        self.pos += 1
         if not prev or prev.type != type:
             print("Parser Error:\n", err, prev, " - Expecting: ", type)
             exit(1)
         return prev
 
     def produceAST(self, sourceCode: str) -> Program:
-        self.tokens = tokenize(sourceCode)
-        program: Program = Program(kind="Program", body=[])
+        self.source = sourceCode
+        self.tokens = tokenize(sourceCode, skip_bodies=self.lazy)
+        self.pos = 0
+        program: Program = Program(body=[])
 
         while self.not_eof():
             program.body.append(self.parse_stmt())
 
         return program
 
+    # Parses the top level statements of a token stream (tokenize_stream)
+    # one at a time and yields each one as soon as it is parsed. Tokens are
+    # read as the parser reaches them (see TokenWindow) and dropped with
+    # the statement, so memory grows with the largest statement, whatever
+    # kind of statements the stream holds. Errors are reported at the same
+    # tokens produceAST reports them. Not available in lazy mode, which
+    # needs the whole source.
+    def parse_stream(self, tokens: Iterable[Token]) -> Iterator[Stmt]:
+        if self.lazy:
+            raise ValueError("A lazy parser cannot parse a token stream.")
+        window = TokenWindow(tokens)
+        self.tokens = window
+        self.pos = 0
+        while self.not_eof():
+            stmt = self.parse_stmt()
+            window.release(self.pos)
+            yield stmt
+        self.tokens = []
+
+    # Parses every function body a lazy parse skipped, reporting syntax
+    # errors the same way produceAST does.
+    @staticmethod
+    def validate(program: Program) -> Program:
+        pending = [program.body]
+        while pending:
+            for stmt in pending.pop():
+                if isinstance(stmt, FunctionDeclaration):
+                    pending.append(stmt.body)
+        return program
+
     def parse_stmt(self) -> Stmt:
         if self.at().type in (TokenType.Let, TokenType.Const):
             return self.parse_var_declaration()
@@ -55,7 +193,7 @@ class Parser:
             return self.parse_expr()
 
     def parse_fn_declaration(self) -> Stmt:
-        self.eat()  # eat fn keyword
+        keyword = self.eat()  # eat fn keyword
         name = self.expect(
             TokenType.Identifier,
             "Expected function name following fn keyword"
@@ -64,14 +202,11 @@ class Parser:
         args = self.parse_args()
         params: List[str] = [arg.symbol for arg in args if isinstance(arg, Identifier)]
 
-        self.expect(
+        open_brace = self.expect(
             TokenType.OpenBrace,
             "Expected function body following declaration"
         )
-        body: List[Stmt] = []
-
-        while self.at().type not in (TokenType.EOF, TokenType.CloseBrace):
-            body.append(self.parse_stmt())
+        body = self.skip_block(open_brace) if self.lazy else self.parse_block()
 
         self.expect(
             TokenType.CloseBrace,
@@ -81,11 +216,44 @@ class Parser:
         fn = FunctionDeclaration(
             body=body,
             name=name,
-            parameters=params,
-            kind="FunctionDeclaration"
+            parameters=params
         )
 
-        return fn
+        return located(fn, keyword)
+
+    # Statements up to the closing brace of the current block.
+    def parse_block(self) -> List[Stmt]:
+        body: List[Stmt] = []
+
+        while self.at().type not in (TokenType.EOF, TokenType.CloseBrace):
+            body.append(self.parse_stmt())
+
+        return body
+
+    # Moves to the brace closing the current block without parsing it.
+    # The lexer already skipped the inside of function bodies, other blocks
+    # are matched here. Every brace the parser accepts is balanced, so for
+    # valid code this is where parse_block stops too.
+    def skip_block(self, open_brace: Token) -> List[Stmt]:
+        tokens = self.tokens
+        pos = self.pos
+        depth = 0
+        while True:
+            type = tokens[pos].type
+            if type == TokenType.CloseBrace:
+                if not depth:
+                    break
+                depth -= 1
+            elif type == TokenType.OpenBrace:
+                depth += 1
+            elif type == TokenType.EOF:
+                # Let expect report the missing brace.
+                self.pos = pos
+                return []
+            pos += 1
+
+        self.pos = pos
+        return LazyBody(self.source, open_brace, tokens[pos], self.engine)
 
     def parse_var_declaration(self) -> Stmt:
         is_constant = self.eat().type == TokenType.Const
@@ -100,8 +268,7 @@ class Parser:
                 raise ValueError("Must assign value to constant expression. No value provided.")
             return VarDeclaration(
                 identifier=identifier,
-                constant=False,
-                kind="VarDeclaration"
+                constant=False
             )
 
         self.expect(
@@ -118,11 +285,12 @@ class Parser:
         return VarDeclaration(
             value=value,
             identifier=identifier,
-            constant=is_constant,
-            kind="VarDeclaration"
+            constant=is_constant
         )
 
     def parse_expr(self) -> Expr:
+        if self.engine == "pratt":
+            return parse_expression(self)
         return self.parse_assignment_expr()
 
     def parse_assignment_expr(self) -> Expr:
@@ -133,8 +301,7 @@ class Parser:
             value = self.parse_assignment_expr()
             return AssignmentExpr(
                 value=value,
-                assigne=left,
-                kind="AssignmentExpr"
+                assigne=left
             )
 
         return left
@@ -154,10 +321,10 @@ class Parser:
 
             if self.at().type == TokenType.Comma:
                 self.eat()
-                properties.append(Property(key=key, kind="Property"))
+                properties.append(Property(key=key))
                 continue
             elif self.at().type == TokenType.CloseBrace:
-                properties.append(Property(key=key, kind="Property"))
+                properties.append(Property(key=key))
                 continue
 
             self.expect(
@@ -166,7 +333,7 @@ class Parser:
             )
             value = self.parse_expr()
 
-            properties.append(Property(value=value, key=key, kind="Property"))
+            properties.append(Property(value=value, key=key))
             if self.at().type != TokenType.CloseBrace:
                 self.expect(
                     TokenType.Comma,
@@ -174,7 +341,7 @@ class Parser:
                 )
 
         self.expect(TokenType.CloseBrace, "Object literal missing closing brace.")
-        return ObjectLiteral(properties=properties, kind="ObjectLiteral")
+        return ObjectLiteral(properties=properties)
 
     def parse_additive_expr(self) -> Expr:
         left = self.parse_multiplicitave_expr()
@@ -182,7 +349,7 @@ class Parser:
         while self.at().value in ["+", "-"]:
             operator = self.eat().value
             right = self.parse_multiplicitave_expr()
-            left = BinaryExpr(left=left, right=right, operator=operator, kind="BinaryExpr")
+            left = BinaryExpr(left=left, right=right, operator=operator)
 
         return left
 
@@ -192,7 +359,7 @@ class Parser:
         while self.at().value in ["/", "*", "%"]:
             operator = self.eat().value
             right = self.parse_call_member_expr()
-            left = BinaryExpr(left=left, right=right, operator=operator, kind="BinaryExpr")
+            left = BinaryExpr(left=left, right=right, operator=operator)
 
         return left
 
@@ -205,7 +372,8 @@ class Parser:
         return member
 
     def parse_call_expr(self, caller: Expr) -> Expr:
-        call_expr = CallExpr(caller=caller, args=self.parse_args(), kind="CallExpr")
+        open_paren = self.at()
+        call_expr = located(CallExpr(caller=caller, args=self.parse_args()), open_paren)
 
         if self.at().type == TokenType.OpenParen:
             call_expr = self.parse_call_expr(call_expr)
@@ -247,7 +415,7 @@ class Parser:
                     "Missing closing bracket in computed value."
                 )
 
-            object = MemberExpr(object=object, property=property, computed=computed, kind="MemberExpr")
+            object = MemberExpr(object=object, property=property, computed=computed)
 
         return object
 
@@ -255,9 +423,9 @@ class Parser:
         tk = self.at().type
 
         if tk == TokenType.Identifier:
-            return Identifier(symbol=self.eat().value, kind="Identifier")
+            return Identifier(symbol=self.eat().value)
         elif tk == TokenType.Number:
-            return NumericLiteral(value=float(self.eat().value), kind="NumericLiteral")
+            return NumericLiteral(value=number_value(self.eat().value))
         elif tk == TokenType.OpenParen:
             self.eat()
             value = self.parse_expr()
@@ -266,6 +434,23 @@ class Parser:
                 "Unexpected token found inside parenthesized expression. Expected closing parenthesis."
             )
             return value
+        elif tk == TokenType.OpenBracket:
+            return self.parse_array_expr()
         else:
             print("Unexpected token found during parsing!", self.at())
             exit(1)
+
+    def parse_array_expr(self) -> Expr:
+        self.eat()  # eat the opening bracket
+        elements: List[Expr] = []
+
+        while self.not_eof() and self.at().type != TokenType.CloseBracket:
+            elements.append(self.parse_assignment_expr())
+            if self.at().type != TokenType.CloseBracket:
+                self.expect(
+                    TokenType.Comma,
+                    "Expected comma or closing bracket following array element"
+                )
+
+        self.expect(TokenType.CloseBracket, "Array literal missing closing bracket.")
+        return ArrayLiteral(elements=elements)
@@ -0,0 +1,296 @@
+from typing import TYPE_CHECKING, List, Optional
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    Expr,
+    Identifier,
+    MemberExpr,
+    NumericLiteral,
+    ObjectLiteral,
+    Property,
+    located,
+    number_value,
+)
+from src.lexer import Token, TokenType
+
+if TYPE_CHECKING:
+    from src.parser_1 import Parser
+
+# Binding power of every binary operator. Higher binds tighter.
+# Assignment (`=`) binds looser than all of them and is right associative.
+BINDING_POWER = {
+    "+": 2,
+    "-": 2,
+    "*": 3,
+    "/": 3,
+    "%": 3,
+}
+
+# Parser states inside the main loop.
+OPERAND = 0  # expecting the start of an operand.
+MEMBER = 1  # applying `.prop` / `[prop]` to the current operand.
+CALL = 2  # applying `(args)` to the current operand.
+INFIX = 3  # expecting an infix operator or the end of the expression.
+
+
+# Owners describe what a nested expression belongs to. When a nested
+# expression ends, the parser resumes its owner instead of returning
+# from a Python call, so nesting depth never touches the Python stack.
+class _Paren:
+    __slots__ = ()
+
+
+class _Index:
+    __slots__ = ("object",)
+
+    def __init__(self, object: Expr):
+        self.object = object
+
+
+class _Call:
+    __slots__ = ("caller", "args", "open_paren")
+
+    def __init__(self, caller: Expr, open_paren: Token):
+        self.caller = caller
+        self.args: List[Expr] = []
+        self.open_paren = open_paren
+
+
+class _Array:
+    __slots__ = ("elements",)
+
+    def __init__(self):
+        self.elements: List[Expr] = []
+
+
+class _Object:
+    __slots__ = ("properties", "key")
+
+    def __init__(self):
+        self.properties: List[Property] = []
+        self.key = ""
+
+
+def _parse_object_keys(parser: "Parser", obj: _Object) -> bool:
+    # Consume object literal properties up to the next property value.
+    # Returns True when a value expression has to be parsed for obj.key and
+    # False once the closing brace was consumed.
+    while parser.not_eof() and parser.at().type != TokenType.CloseBrace:
+        key = parser.expect(
+            TokenType.Identifier,
+            "Object literal key expected"
+        ).value
+
+        if parser.at().type == TokenType.Comma:
+            parser.eat()
+            obj.properties.append(Property(key=key))
+            continue
+        elif parser.at().type == TokenType.CloseBrace:
+            obj.properties.append(Property(key=key))
+            continue
+
+        parser.expect(
+            TokenType.Colon,
+            "Missing colon following identifier in ObjectExpr"
+        )
+        obj.key = key
+        return True
+
+    parser.expect(TokenType.CloseBrace, "Object literal missing closing brace.")
+    return False
+
+
+def _reduce(operands: List[Expr], operators: List[str]):
+    operator = operators.pop()
+    right = operands.pop()
+    left = operands.pop()
+    if operator == "=":
+        operands.append(AssignmentExpr(assigne=left, value=right))
+    else:
+        operands.append(BinaryExpr(left=left, right=right, operator=operator))
+
+
+# Parses a full expression (the same grammar as Parser.parse_assignment_expr)
+# starting at parser.pos, using the BINDING_POWER table and an explicit
+# stack of suspended expressions instead of recursion.
+def parse_expression(parser: "Parser") -> Expr:
+    tokens = parser.tokens
+    binding_power = BINDING_POWER
+
+    # Expressions waiting for a nested expression to finish.
+    suspended = []
+    operands: List[Expr] = []
+    operators: List[str] = []
+    owner = None
+    value: Optional[Expr] = None
+    is_object = False
+    state = OPERAND
+
+    while True:
+        if state == OPERAND:
+            tk = tokens[parser.pos]
+            is_object = False
+
+            if tk.type == TokenType.Identifier:
+                parser.pos += 1
+                value = Identifier(symbol=tk.value)
+                state = MEMBER
+            elif tk.type == TokenType.Number:
+                parser.pos += 1
+                value = NumericLiteral(value=number_value(tk.value))
+                state = MEMBER
+            elif tk.type == TokenType.OpenParen:
+                parser.pos += 1
+                suspended.append((operands, operators, owner))
+                operands, operators, owner = [], [], _Paren()
+            elif tk.type == TokenType.OpenBracket:
+                parser.pos += 1
+                if tokens[parser.pos].type in (TokenType.CloseBracket, TokenType.EOF):
+                    parser.expect(TokenType.CloseBracket, "Array literal missing closing bracket.")
+                    value = ArrayLiteral(elements=[])
+                    state = MEMBER
+                else:
+                    suspended.append((operands, operators, owner))
+                    operands, operators, owner = [], [], _Array()
+            # Object literals are only allowed where an assignment
+            # expression starts: first operand or right after `=`.
+            elif tk.type == TokenType.OpenBrace and (not operators or operators[-1] == "="):
+                parser.pos += 1
+                obj = _Object()
+                if _parse_object_keys(parser, obj):
+                    suspended.append((operands, operators, owner))
+                    operands, operators, owner = [], [], obj
+                else:
+                    value = ObjectLiteral(properties=obj.properties)
+                    is_object = True
+                    state = INFIX
+            else:
+                # Reports the unexpected token.
+                parser.parse_primary_expr()
+
+        elif state == MEMBER:
+            tk = tokens[parser.pos]
+            if tk.type == TokenType.Dot:
+                parser.pos += 1
+                property = parser.parse_primary_expr()
+                if not isinstance(property, Identifier):
+                    raise ValueError("Cannot use dot operator without right-hand side being an identifier.")
+                value = MemberExpr(object=value, property=property, computed=False)
+            elif tk.type == TokenType.OpenBracket:
+                parser.pos += 1
+                suspended.append((operands, operators, owner))
+                operands, operators, owner = [], [], _Index(value)
+                state = OPERAND
+            else:
+                state = CALL
+
+        elif state == CALL:
+            open_paren = tokens[parser.pos]
+            if open_paren.type == TokenType.OpenParen:
+                parser.pos += 1
+                if tokens[parser.pos].type == TokenType.CloseParen:
+                    parser.pos += 1
+                    value = located(CallExpr(args=[], caller=value), open_paren)
+                else:
+                    suspended.append((operands, operators, owner))
+                    operands, operators, owner = [], [], _Call(value, open_paren)
+                    state = OPERAND
+            else:
+                state = INFIX
+
+        else:
+            tk = tokens[parser.pos]
+            operands.append(value)
+
+            power = binding_power.get(tk.value) if tk.type == TokenType.BinaryOperator else None
+            if power is not None and not is_object:
+                parser.pos += 1
+                while operators and operators[-1] != "=" and binding_power[operators[-1]] >= power:
+                    _reduce(operands, operators)
+                operators.append(tk.value)
+                state = OPERAND
+                continue
+
+            if tk.type == TokenType.Equals:
+                parser.pos += 1
+                while operators and operators[-1] != "=":
+                    _reduce(operands, operators)
+                operators.append("=")
+                state = OPERAND
+                continue
+
+            # End of the current expression.
+            while operators:
+                _reduce(operands, operators)
+            result = operands.pop()
+            is_object = False
+
+            if owner is None:
+                return result
+
+            if isinstance(owner, _Call):
+                owner.args.append(result)
+                if tokens[parser.pos].type == TokenType.Comma:
+                    parser.pos += 1
+                    operands, operators = [], []
+                    state = OPERAND
+                    continue
+
+                parser.expect(
+                    TokenType.CloseParen,
+                    "Missing closing parenthesis inside arguments list"
+                )
+                value = located(CallExpr(args=owner.args, caller=owner.caller), owner.open_paren)
+                operands, operators, owner = suspended.pop()
+                state = CALL
+            elif isinstance(owner, _Object):
+                owner.properties.append(Property(value=result, key=owner.key))
+                if parser.at().type != TokenType.CloseBrace:
+                    parser.expect(
+                        TokenType.Comma,
+                        "Expected comma or closing bracket following property"
+                    )
+
+                if _parse_object_keys(parser, owner):
+                    operands, operators = [], []
+                    state = OPERAND
+                    continue
+
+                value = ObjectLiteral(properties=owner.properties)
+                operands, operators, owner = suspended.pop()
+                is_object = True
+                state = INFIX
+            elif isinstance(owner, _Array):
+                owner.elements.append(result)
+                if tokens[parser.pos].type != TokenType.CloseBracket:
+                    parser.expect(
+                        TokenType.Comma,
+                        "Expected comma or closing bracket following array element"
+                    )
+                    if tokens[parser.pos].type not in (TokenType.CloseBracket, TokenType.EOF):
+                        operands, operators = [], []
+                        state = OPERAND
+                        continue
+
+                parser.expect(TokenType.CloseBracket, "Array literal missing closing bracket.")
+                value = ArrayLiteral(elements=owner.elements)
+                operands, operators, owner = suspended.pop()
+                state = MEMBER
+            elif isinstance(owner, _Index):
+                parser.expect(
+                    TokenType.CloseBracket,
+                    "Missing closing bracket in computed value."
+                )
+                value = MemberExpr(object=owner.object, property=result, computed=True)
+                operands, operators, owner = suspended.pop()
+                state = MEMBER
+            else:
+                parser.expect(
+                    TokenType.CloseParen,
+                    "Unexpected token found inside parenthesized expression. Expected closing parenthesis."
+                )
+                value = result
+                operands, operators, owner = suspended.pop()
+                state = MEMBER
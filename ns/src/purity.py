@@ -0,0 +1,236 @@
+from typing import Dict, Iterable, List, Optional, Set
+from src.ast_1 import (
+    ArrayLiteral,
+    AssignmentExpr,
+    BinaryExpr,
+    CallExpr,
+    FunctionDeclaration,
+    Identifier,
+    MemberExpr,
+    ObjectLiteral,
+    Program,
+    Stmt,
+    VarDeclaration,
+)
+
+# Purity analysis for memoization, run between parsing and evaluation:
+#
+#   PurityAnalysis(builtins=env.variables).mark(program, size=1024)
+#
+# A function declaration is pure when a call depends only on its arguments
+# and does nothing but return a value:
+# - it assigns only its own variables,
+# - it reads its own variables and, from enclosing scopes, functions,
+#   consts and variables nothing in the program assigns. Each name must
+#   have one possible binding: declared before the function, or declared
+#   later with no other declaration further out to read in the meantime,
+# - it calls pure functions only, by name. Natives are not pure: print and
+#   time have effects, gather builds an object,
+# - it builds no objects, arrays or functions, every call has to return a
+#   new one. An inner function may keep variables of its call alive and
+#   change them, two calls returning one cached closure would share them.
+#
+# mark() sets `memoize` on the pure declarations, the functions evaluated
+# from them cache their results (see maiin/memo.py). Functions the analysis
+# cannot prove pure can still opt in at runtime with the `memo` native.
+
+# Bindings of a scope: the declaring node, None for parameters.
+PARAMETER = None
+# resolve() results for names without a certain binding.
+UNCERTAIN = "uncertain"
+BUILTIN = "builtin"
+
+
+class PurityScope:
+    def __init__(self, parent: Optional["PurityScope"], bindings: Dict[str, Optional[Stmt]]):
+        self.parent = parent
+        # Every name declared anywhere in the scope.
+        self.bindings = bindings
+        # Names declared so far, in statement order.
+        self.declared: Set[str] = set()
+        # What the enclosing scopes had declared when this function was
+        # created, index 0 is the parent.
+        self.snapshots: List[Set[str]] = []
+
+
+class FunctionFacts:
+    def __init__(self, declaration: FunctionDeclaration):
+        self.declaration = declaration
+        # Impure on its own, whatever it calls.
+        self.impure = False
+        # Declarations it calls, pure only if they all are.
+        self.callees: List[FunctionDeclaration] = []
+
+
+class PurityAnalysis:
+    def __init__(self, builtins: Iterable[str] = ()):
+        # builtins: names already declared in the global environment.
+        self.builtins = set(builtins)
+        self.assigned: Set[str] = set()
+        self.facts: Dict[int, FunctionFacts] = {}
+
+    # Returns the pure function declarations of program.
+    def analyze(self, program: Program) -> List[FunctionDeclaration]:
+        self.assigned = set()
+        self.facts = {}
+        for stmt in program.body:
+            collect_assigned_names(stmt, self.assigned)
+        self.visit_body(program.body, PurityScope(None, declarations(program.body)), None)
+
+        # Recursive functions are pure unless something in the cycle is not,
+        # so start from every function and drop the impure ones until
+        # nothing changes.
+        pure = {key for key, facts in self.facts.items() if not facts.impure}
+        changed = True
+        while changed:
+            changed = False
+            for key in list(pure):
+                if any(id(callee) not in pure for callee in self.facts[key].callees):
+                    pure.discard(key)
+                    changed = True
+        return [facts.declaration for key, facts in self.facts.items() if key in pure]
+
+    # Marks the pure declarations of program to cache up to size results per
+    # function and returns them.
+    def mark(self, program: Program, size: int) -> List[FunctionDeclaration]:
+        if size < 1:
+            raise ValueError(f"Memoization needs a cache size of at least 1, got {size}.")
+        pure = self.analyze(program)
+        for declaration in pure:
+            declaration.memoize = size
+        return pure
+
+    def visit_body(self, body: List[Stmt], scope: PurityScope, facts: Optional[FunctionFacts]):
+        for stmt in body:
+            self.visit(stmt, scope, facts)
+
+    def resolve(self, name: str, scope: PurityScope):
+        # (binding, depth): the node declaring the binding name certainly
+        # reads and how many functions out it is, or UNCERTAIN/BUILTIN.
+        if name in scope.declared:
+            return scope.bindings[name], 0
+        if name in scope.bindings:
+            return self.declared_later(name, scope), 0
+
+        current = scope.parent
+        depth = 0
+        while current is not None:
+            if name in scope.snapshots[depth]:
+                return current.bindings[name], depth + 1
+            if name in current.bindings:
+                return self.declared_later(name, current), depth + 1
+            current = current.parent
+            depth += 1
+        return (BUILTIN if name in self.builtins else UNCERTAIN), depth
+
+    def declared_later(self, name: str, scope: PurityScope):
+        # name is declared in scope, maybe after the use runs. Before that
+        # the lookup fails unless a scope further out has the name too.
+        current = scope.parent
+        while current is not None:
+            if name in current.bindings:
+                return UNCERTAIN
+            current = current.parent
+        return UNCERTAIN if name in self.builtins else scope.bindings[name]
+
+    def read(self, name: str, scope: PurityScope, facts: Optional[FunctionFacts]):
+        if facts is None:
+            return
+        binding, depth = self.resolve(name, scope)
+        if depth == 0 and binding is not UNCERTAIN:
+            return
+        if binding is UNCERTAIN:
+            facts.impure = True
+        elif isinstance(binding, FunctionDeclaration):
+            return
+        elif isinstance(binding, VarDeclaration) and binding.constant:
+            return
+        elif name in self.assigned:
+            # An outer variable that changes between calls.
+            facts.impure = True
+
+    def visit(self, node: Stmt, scope: PurityScope, facts: Optional[FunctionFacts]):
+        if isinstance(node, Identifier):
+            self.read(node.symbol, scope, facts)
+        elif isinstance(node, BinaryExpr):
+            self.visit(node.left, scope, facts)
+            self.visit(node.right, scope, facts)
+        elif isinstance(node, CallExpr):
+            for arg in node.args:
+                self.visit(arg, scope, facts)
+            if facts is not None:
+                binding = None
+                if isinstance(node.caller, Identifier):
+                    binding, _depth = self.resolve(node.caller.symbol, scope)
+                if isinstance(binding, FunctionDeclaration):
+                    facts.callees.append(binding)
+                else:
+                    facts.impure = True
+            self.visit(node.caller, scope, facts)
+        elif isinstance(node, AssignmentExpr):
+            if facts is not None:
+                target = node.assigne
+                binding, depth = self.resolve(target.symbol, scope) if isinstance(target, Identifier) else (UNCERTAIN, 0)
+                if binding is UNCERTAIN or depth != 0:
+                    facts.impure = True
+            self.visit(node.value, scope, facts)
+        elif isinstance(node, (ObjectLiteral, ArrayLiteral, MemberExpr)):
+            if facts is not None:
+                facts.impure = True
+        elif isinstance(node, VarDeclaration):
+            if node.value is not None:
+                self.visit(node.value, scope, facts)
+            scope.declared.add(node.identifier)
+        elif isinstance(node, FunctionDeclaration):
+            if facts is not None:
+                facts.impure = True
+            scope.declared.add(node.name)
+            bindings = dict.fromkeys(node.parameters, PARAMETER)
+            bindings.update(declarations(node.body))
+            body_scope = PurityScope(scope, bindings)
+            body_scope.declared.update(node.parameters)
+            body_scope.snapshots = [set(scope.declared)] + scope.snapshots
+            inner = self.facts[id(node)] = FunctionFacts(node)
+            self.visit_body(node.body, body_scope, inner)
+
+
+def declarations(body: List[Stmt]) -> Dict[str, Stmt]:
+    names = {}
+    for stmt in body:
+        if isinstance(stmt, VarDeclaration):
+            names[stmt.identifier] = stmt
+        elif isinstance(stmt, FunctionDeclaration):
+            names[stmt.name] = stmt
+    return names
+
+
+def collect_assigned_names(node: Stmt, assigned: Set[str]):
+    if isinstance(node, AssignmentExpr):
+        if isinstance(node.assigne, Identifier):
+            assigned.add(node.assigne.symbol)
+        else:
+            collect_assigned_names(node.assigne, assigned)
+        collect_assigned_names(node.value, assigned)
+    elif isinstance(node, BinaryExpr):
+        collect_assigned_names(node.left, assigned)
+        collect_assigned_names(node.right, assigned)
+    elif isinstance(node, CallExpr):
+        for arg in node.args:
+            collect_assigned_names(arg, assigned)
+        collect_assigned_names(node.caller, assigned)
+    elif isinstance(node, ObjectLiteral):
+        for prop in node.properties:
+            if prop.value is not None:
+                collect_assigned_names(prop.value, assigned)
+    elif isinstance(node, ArrayLiteral):
+        for element in node.elements:
+            collect_assigned_names(element, assigned)
+    elif isinstance(node, MemberExpr):
+        collect_assigned_names(node.object, assigned)
+        collect_assigned_names(node.property, assigned)
+    elif isinstance(node, VarDeclaration):
+        if node.value is not None:
+            collect_assigned_names(node.value, assigned)
+    elif isinstance(node, FunctionDeclaration):
+        for stmt in node.body:
+            collect_assigned_names(stmt, assigned)
@@ -0,0 +1,395 @@
+# Runs the same NiScript programs on every execution backend and reports
+# any difference in result, printed output or raised error. Exits with
+# status 1 when a program behaves differently on some backend, so it is
+# the check to run after every change: a new backend or evaluator mode
+# gets an entry in BACKENDS, a new language feature gets CORPUS programs.
+#
+# Usage (from the ns directory):
+#   python -m tools.differential [script or directory ...] [--fuzz 100] [--seed 0]
+# Without arguments the built-in CORPUS is used. Either way 100 random
+# programs (random_program) from seed 0 are checked as well, --fuzz sets
+# how many and --seed picks other ones, -1 for a random seed.
+#
+# Every program is also parsed with each parser engine (PARSER_ENGINES),
+# which must build equal ASTs or fail with the same error. --ast only
+# checks that and runs nothing.
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import re
+import sys
+from typing import Callable, Dict, List, Tuple
+
+from src.lexer import tokenize_stream
+from src.optimizer import Optimizer
+from src.parser_1 import PARSER_ENGINES, Parser
+from src.ast_1 import Stmt
+from src.cache import RUNTIME_ATTRIBUTES
+from src.purity import PurityAnalysis
+from maiin.environment import createGlobalEnv
+from maiin.interpreter import evaluate
+from maiin.iterative import evaluate_iterative
+from maiin.async_interpreter import evaluate_async
+from maiin.instrument import AllocationCounter, CallProfile, Interpreter, NodeTimer
+from maiin.limits import LimitedInterpreter, Limits, ResourceLimitExceeded
+from maiin.memo import DEFAULT_SIZE as DEFAULT_MEMO_SIZE
+from maiin.captures import analyze_captures
+from maiin.compiler import compile_program, compile_resolved_program
+from maiin.resolver import resolve_program
+from maiin.tiering import set_tier_threshold
+from maiin.values import MK_NULL, RuntimeVal
+from maiin.vm.machine import run_program
+
+def run_memoized(program, env, run=evaluate):
+    # Tree walker (or run) caching the results of the functions proven pure.
+    PurityAnalysis(builtins=env.variables).mark(program, DEFAULT_MEMO_SIZE)
+    return run(program, env)
+
+
+def run_tiered(program, env, run=evaluate):
+    # Tree walker (or run) translating every function on its first call.
+    set_tier_threshold(1)
+    try:
+        return run(program, env)
+    finally:
+        set_tier_threshold(None)
+
+
+def run_async(program, env):
+    return asyncio.run(evaluate_async(program, env))
+
+
+def run_streamed(source: str, env):
+    # Tree walker running each statement as soon as it is parsed, like
+    # main.py --stream. Tiny chunks put names and numbers across chunk ends.
+    # Statements before a syntax error run, so such programs differ.
+    last_evaluated = MK_NULL()
+    for statement in Parser().parse_stream(tokenize_stream(io.StringIO(source), 5)):
+        last_evaluated = evaluate(statement, env)
+    return last_evaluated
+
+
+# Backends given the source instead of the parsed program.
+SOURCE_BACKENDS = {run_streamed}
+
+BACKENDS: Dict[str, Callable] = {
+    "tree": evaluate,
+    "closure": lambda program, env: compile_program(program)(env),
+    "slots": lambda program, env: compile_resolved_program(resolve_program(program, env))(env),
+    "vm": run_program,
+    "async": run_async,
+    "instrumented": lambda program, env: Interpreter([CallProfile(), NodeTimer(), AllocationCounter()]).run(program, env),
+    "limited": lambda program, env: LimitedInterpreter(Limits(steps=10 ** 9, memory=2 ** 40, seconds=3600)).run(program, env),
+    # Tail calls do not grow its stack, the step limit stops endless ones.
+    "iterative": lambda program, env: evaluate_iterative(program, env, max_depth=sys.getrecursionlimit() // 4,
+                                                         limits=Limits(steps=10 ** 6)),
+    "memoized": run_memoized,
+    "captures": lambda program, env: evaluate(analyze_captures(program), env),
+    "closure captures": lambda program, env: compile_program(analyze_captures(program))(env),
+    "tiered": run_tiered,
+    "tiered captures": lambda program, env: run_tiered(analyze_captures(program), env),
+    "instrumented captures": lambda program, env: BACKENDS["instrumented"](analyze_captures(program), env),
+    "limited captures": lambda program, env: BACKENDS["limited"](analyze_captures(program), env),
+    "async captures": lambda program, env: run_async(analyze_captures(program), env),
+    "async memoized": lambda program, env: run_memoized(program, env, run_async),
+    "async tiered": lambda program, env: run_tiered(program, env, run_async),
+    "optimized": lambda program, env: evaluate(Optimizer().optimize(program), env),
+    "streamed": run_streamed,
+}
+
+CORPUS: List[str] = [
+    "1 + 2 * 3",
+    "let x = 45;\nconst y = x * 2 + 1;\nx = x - y % 7\nx / 4",
+    "let a;\na",
+    "fn add(a, b) {\n    a + b\n}\nadd(1, add(2, 3))",
+    "fn outer(a) {\n    fn inner(b) {\n        a * b\n    }\n    inner(a + 1)\n}\nouter(3)",
+    "let n = 1;\nfn bump() {\n    n = n * 2\n}\nbump()\nbump()\nn",
+    "fn empty() {}\nempty()",
+    "let x = 2;\nlet o = { x, y: x * 3, z: { w: 1 } };\no",
+    "print(1, 2 + 3)\nprint()",
+    "let t = time();\nt - t",
+    "1 + true",
+    "null * 3",
+    "print",
+    "const c = 1;\nc = 2",
+    "let v = 1;\nlet v = 2;",
+    "missing + 1",
+    "fn f(a) { a }\nf()",
+    "3(4)",
+    "1 + 2 = 3",
+    "let q = 7;\nfn scoped() {\n    let q = 1;\n    q\n}\nscoped() + q",
+    "fn rec(n) { rec(n) }\nrec(1)",
+    "fn sq(n) { n * n }\nfn sum(a, b) { sq(a) + sq(b) }\nsum(3, 4) + sum(3, 4) + sum(4, 3)",
+    "fn counter() {\n    let n = 0;\n    fn bump() {\n        n = n + 1\n    }\n    bump\n}\nlet c = counter();\nc()\nc()",
+    "fn outer(a) {\n    let big = { a };\n    fn inner(b) { a + b }\n    inner\n}\nlet f = outer(10);\nf(5)",
+    "let calls = 0;\nfn counted(n) {\n    calls = calls + 1\n    n\n}\ncounted(1) + counted(1)\ncalls",
+    "1 / 0",
+    "let g = gather(1 + 2, print(3), { a: 4 });\ng",
+    "let p = { x: 1, y: 2, x: 3 };\nlet q = { y: p.y * 10, z: p };\nq.z.x + q.y",
+    "fn getx(o) { o.x }\nlet a = { x: 1 };\nlet b = { y: 2, x: 3 };\nlet c = { z: 4 };\n"
+    "let d = { w: 5, x: 6 };\nlet e = { v: 7, x: 8 };\nlet f = { u: 9, x: 10 };\n"
+    "gather(getx(a), getx(b), getx(c), getx(d), getx(e), getx(f), getx(a), getx(b))",
+    "let g = gather(10, 20, 30);\ngather(g[1] + g[4 / 2] * g[0], g[1 / 2], g[2 - 2])",
+    "let o = { a: 1 };\no.missing",
+    "let n = 3;\nn.x",
+    "let o = { a: 1 };\no[o]",
+    "let o = { a: 1 };\no.a = 2",
+    "let v = vec.of(1, 2, 3);\nlet w = vec.range(3);\n"
+    "gather(v + w, v * 2, 10 - v, v / 0, 0 / w, v % 2, vec.sum(v * w), vec.dot(v, w), vec.min(v), vec.max(w))",
+    "let v = vec.of(vec.fill(2, 7), 1);\nlet o = { a: 1 };\ngather(vec.len(v), vec.at(v, 2), v + null, v * o, vec.range(2, 5))",
+    "vec.of(1, 2) + vec.of(1, 2, 3)",
+    "vec.at(vec.of(1), 1)",
+    "vec.sum(3)",
+    "let a = [1, 2 + 3, [4], { b: 5 }, ];\na[1] = a[0] * 10\na[4] = a[3].b\n"
+    "gather(a, a[2][0], a[3 / 2], a[9], a[0 - 1], array.len(a), array.push(a, 7, 8), array.pop(a), array.pop([]))",
+    "fn double(x) { x * 2 }\nfn odd(x, i) { x % 2 }\nfn add(acc, x) { acc + x }\nfn desc(a, b) { b - a }\n"
+    "let xs = [5, 3, 8, 1];\nlet ys = array.map(xs, double);\n"
+    "gather(ys, array.filter(xs, odd), array.reduce(xs, add), array.reduce([], add, 10), "
+    "array.sort(ys, desc), array.sort([3, vec.at(vec.of(0) / 0, 0), 1, 0 - 2]), xs)",
+    "fn outer(k) {\n    fn scale(x, i) { x * k + i }\n    array.map([1, 2, 3], scale)\n}\n"
+    "fn sum(acc, x) {\n    let doubled = x * 2;\n    acc + doubled\n}\n"
+    "gather(outer(10), array.reduce([1, 2, 3], sum, 0), array.map([1, 2], print))",
+    "let a = [1];\na[3] = 2",
+    "let a = [1];\na.x = 2",
+    "array.map([1, 2], 3)",
+    "array.sort([1, null])",
+    "array.reduce([], array.len)",
+    "fn more(a, b, c) { c }\narray.map([1], more)",
+    "let big = 9007199254740993;\nconst m = 1000000007;\n"
+    "fn mix(h, x) { (h * 31 + x) % m }\n"
+    "gather(big + 1, big * big, big / 1, big - 0, 1 * big, big * 1, big + 2 / 2, 7 % 3, 7 / 2, 6 / 3, "
+    "mix(mix(big, 12345678901), 98765432109), 0 - 7 % 3, vec.sum(vec.of(big)))",
+    "fn twice(n) { n * 2 }\nlet t = memo(twice);\ngather(t(2), t(4 / 2), t(2) + 1, twice(4 / 2))",
+    "let a = [1, 2, 3];\nlet o = { x: 1 };\ngather(a[4 / 2], a[6 / 4], array.len(a) * 2, o[1], vec.at(vec.range(3), 4 / 2))",
+    "7 % 0",
+    "print(1)\nprint(22 + 333, [4444])\ngather(5, print(6))\n(7 + 8) * 9\nprint(abcdefghij)",
+    "fn same(x) { x * 1 }\nlet m = memo(same);\ngather(m(0 / 1), m(0 / (0 - 1)), m(0), m(0 / (0 - 1)), same(0 / (0 - 1)))",
+    "vec.fill(200000000, 1)",
+    "let n = 1;\nvec.range(n, n + 200000000)",
+    "print(1)\n" + "7" * 400 + " / 3",
+    "print(1)\nconst huge = 1" + "0" * 320 + ";\nhuge / 7 + 1 / 0",
+    "print(1)\n" + "9" * 5000 + " - 1",
+    "fn mk(n) {\n    let c = n;\n    fn inc() { c = c + 1 }\n    inc\n}\nlet a = mk(1);\nlet b = mk(1);\na()\na()\nb()",
+]
+
+
+# RANDOM PROGRAMS
+# Global variables, functions over parameters, locals, inner functions and
+# earlier functions, and calls of them with printed results. A function
+# only calls the ones declared before it, so every program ends. Names that
+# do not exist, calls with too few arguments, redeclarations and values of
+# the wrong type are generated on purpose, their errors must match too.
+
+FUZZ_NAMES = "abcdexyz"
+FUZZ_GLOBALS = ("g", "h", "k", "missing", "null", "true")
+
+
+def random_expression(rng: random.Random, scope: List[str], functions: List[Tuple[str, int]], depth: int = 0) -> str:
+    def sub(extra: int = 1) -> str:
+        return random_expression(rng, scope, functions, depth + extra)
+
+    choice = rng.random()
+    if depth > 3 or choice < 0.25:
+        leaf = rng.random()
+        if leaf < 0.5 and scope:
+            return rng.choice(scope)
+        if leaf < 0.6:
+            return rng.choice(FUZZ_GLOBALS)
+        return str(rng.randint(0, 12))
+    if choice < 0.5:
+        return f"({sub()} {rng.choice('+-*/%')} {sub()})"
+    if choice < 0.62 and functions:
+        name, count = rng.choice(functions)
+        count = max(count + rng.choice((0, 0, 0, -1, 1)), 0)
+        return f"{name}({', '.join(sub() for _ in range(count))})"
+    if choice < 0.7:
+        target = rng.choice(scope) if scope and rng.random() < 0.7 else rng.choice(("g", "h"))
+        return f"({target} = {sub()})"
+    if choice < 0.76:
+        return "[" + ", ".join(sub() for _ in range(rng.randint(0, 3))) + "]"
+    if choice < 0.82:
+        keys = rng.sample("pqr", rng.randint(1, 2))
+        return "{ " + ", ".join(f"{key}: {sub()}" for key in keys) + " }"
+    if choice < 0.88:
+        return f"{sub(2)}.{rng.choice('pqr')}"
+    if choice < 0.92:
+        return f"{sub(2)}[{sub()}]"
+    if choice < 0.96:
+        return f"vec.of({sub()}, {sub()}) * {sub()}"
+    return f"array.len({sub()})"
+
+
+def random_program(rng: random.Random) -> str:
+    lines = ["let g = 1;", "const k = 7;"]
+    functions: List[Tuple[str, int]] = []
+    for i in range(rng.randint(1, 4)):
+        name = "f" + "abcdefgh"[i]
+        parameters = rng.sample("abcde", rng.randint(0, 3))
+        scope = list(parameters)
+        body = []
+        for _ in range(rng.randint(0, 5)):
+            kind = rng.random()
+            if kind < 0.3:
+                local = rng.choice(FUZZ_NAMES)
+                body.append(f"{rng.choice(('let', 'const'))} {local} = {random_expression(rng, scope, functions)};")
+                if local not in scope:
+                    scope.append(local)
+            elif kind < 0.38:
+                # Returned or called, it keeps the scope of the call alive.
+                body.append(f"fn inner() {{ {random_expression(rng, scope, functions)} }}")
+                body.append(rng.choice(("inner", "inner()")))
+            else:
+                body.append(random_expression(rng, scope, functions))
+        lines.append(f"fn {name}({', '.join(parameters)}) {{\n    " + "\n    ".join(body) + "\n}")
+        functions.append((name, len(parameters)))
+    lines.append("let h = 2;")
+    for _ in range(rng.randint(1, 4)):
+        name, count = rng.choice(functions)
+        lines.append(f"print({name}({', '.join(str(rng.randint(0, 9)) for _ in range(count))}))")
+    lines.append("g")
+    return "\n".join(lines)
+
+
+def describe(value: RuntimeVal):
+    if hasattr(value, "properties"):
+        return ("object", {key: describe(prop) for key, prop in value.properties.items()})
+    if hasattr(value, "items"):
+        return ("array", [describe(item) for item in value.items])
+    if hasattr(value, "parameters"):
+        return ("function", value.name, tuple(value.parameters))
+    if hasattr(value, "call"):
+        return ("native-fn",)
+    if str(value.type) == "number":
+        # repr tells 2 from 2.0.
+        return ("number", repr(value.value))
+    return (str(value.type), value.value)
+
+
+def run_backend(backend: Callable, source: str) -> Tuple:
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            program = source if backend in SOURCE_BACKENDS else Parser().produceAST(source)
+            result = ("result", describe(backend(program, createGlobalEnv())))
+    except SystemExit as e:
+        result = ("exit", e.code)
+    except (RecursionError, ResourceLimitExceeded):
+        # Running out of stack or of steps are both runaway recursion.
+        result = ("recursion",)
+    except Exception as e:
+        result = ("error", type(e).__name__, str(e))
+
+    # Object addresses differ between runs and are not part of the semantics.
+    normalize = lambda text: re.sub(r" at 0x[0-9a-fA-F]+", "", text)
+    return (normalize(repr(result)), normalize(output.getvalue()))
+
+
+def compare(source: str, backends: Dict[str, Callable]) -> List[str]:
+    outcomes = {name: run_backend(backend, source) for name, backend in backends.items()}
+    reference_name = next(iter(outcomes))
+    reference = outcomes[reference_name]
+
+    problems = []
+    for name, outcome in outcomes.items():
+        if outcome != reference:
+            problems.append(f"{name} differs from {reference_name}:\n  {reference}\n  {outcome}")
+    return problems
+
+
+# Nested (class name, fields) of an AST, positions included and the state
+# the backends keep on nodes left out.
+def describe_ast(node):
+    if isinstance(node, Stmt):
+        fields = {name: describe_ast(value) for name, value in vars(node).items() if name not in RUNTIME_ATTRIBUTES}
+        return (type(node).__name__, fields)
+    if isinstance(node, (list, tuple)):
+        return [describe_ast(item) for item in node]
+    # The type tells 2 from 2.0.
+    return (type(node).__name__, node)
+
+
+def parse_outcome(engine: str, source: str) -> Tuple:
+    try:
+        # The lexer prints unrecognized characters.
+        with contextlib.redirect_stdout(io.StringIO()):
+            return ("ast", describe_ast(Parser(engine).produceAST(source)))
+    except SystemExit as e:
+        return ("exit", e.code)
+    except RecursionError:
+        return ("recursion",)
+    except Exception as e:
+        return ("error", type(e).__name__, str(e))
+
+
+def compare_asts(source: str) -> List[str]:
+    outcomes = {engine: parse_outcome(engine, source) for engine in PARSER_ENGINES}
+    reference_name = PARSER_ENGINES[0]
+    reference = outcomes[reference_name]
+
+    problems = []
+    for engine, outcome in outcomes.items():
+        if outcome != reference:
+            problems.append(f"{engine} parser differs from {reference_name}:\n  {reference}\n  {outcome}")
+    return problems
+
+
+def collect_sources(paths: List[str]) -> List[Tuple[str, str]]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _dirs, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+
+    sources = []
+    for filename in files:
+        with open(filename, "r") as file:
+            sources.append((filename, file.read()))
+    return sources
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Differential test of the NiScript backends")
+    parser.add_argument("paths", nargs="*", help="scripts or directories, defaults to the built-in corpus")
+    parser.add_argument("--fuzz", type=int, default=100, help="random programs to check as well")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random programs, -1 for a random one")
+    parser.add_argument("--recursion-limit", type=int, default=2000)
+    parser.add_argument("--ast", action="store_true", help="only compare the ASTs of the parser engines")
+    args = parser.parse_args()
+
+    sys.setrecursionlimit(args.recursion_limit)
+    if args.paths:
+        sources = collect_sources(args.paths)
+    else:
+        sources = [(f"corpus[{i}]", source) for i, source in enumerate(CORPUS)]
+    seed = args.seed if args.seed >= 0 else random.randrange(2 ** 32)
+    rng = random.Random(seed)
+    sources += [(f"fuzz[{i}] seed {seed}", random_program(rng)) for i in range(args.fuzz)]
+
+    failures = 0
+    for name, source in sources:
+        problems = compare_asts(source)
+        if not args.ast:
+            problems += compare(source, BACKENDS)
+        if problems:
+            failures += 1
+            print(f"FAIL {name}")
+            if name.startswith("fuzz"):
+                print(source)
+            for problem in problems:
+                print("  " + problem)
+
+    if args.ast:
+        print(f"{len(sources) - failures}/{len(sources)} programs parse the same with {', '.join(PARSER_ENGINES)}")
+    else:
+        print(f"{len(sources) - failures}/{len(sources)} programs parse the same with {', '.join(PARSER_ENGINES)} "
+              f"and behave the same on {', '.join(BACKENDS)}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()